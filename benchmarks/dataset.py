@@ -0,0 +1,99 @@
+"""
+Boards sintéticos para os benchmarks.
+
+Os cards seguem o formato da resposta de `/boards/{id}/cards`, com campos que
+a sincronização não lê (como na API real) e os recursos aninhados (checklists, anexos e ações de comentário), e são determinísticos
+para uma mesma semente.
+"""
+import random
+
+BOARD_ID = 'bench-board'
+LIST_IDS = ['bench-list-todo', 'bench-list-doing', 'bench-list-done']
+PROJECT_KEY = 'BENCH'
+CUSTOMFIELD = 'customfield_10000'
+USER_MAPPING = {f'trello_user{i}': f'jira_user{i}' for i in range(20)}
+
+# Arquivos distintos sorteados para os anexos; o conteúdo do arquivo N é
+# gerado pelo servidor falso a partir do próprio N
+ATTACHMENT_POOL = 10
+
+WORDS = ('sync', 'board', 'issue', 'deploy', 'review', 'fix', 'api', 'cache', 'login', 'report', 'queue', 'design')
+
+
+def card_id(index: int) -> str:
+    """
+    ID de 24 caracteres hexadecimais, como os do Trello.
+    """
+    return f'{index:024x}'
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def synthetic_attachment(cid: str, number: int, size: int, rng: random.Random) -> dict:
+    """
+    Anexo enviado ao Trello; `url` é relativa ao servidor falso.
+    """
+    aid = f'{cid}-at{number}'
+    name = f'file{rng.randrange(ATTACHMENT_POOL)}.bin'
+    return {
+        'id': aid,
+        'name': name,
+        'url': f'/1/cards/{cid}/attachments/{aid}/download/{name}',
+        'bytes': size,
+        'isUpload': True,
+        'mimeType': 'application/octet-stream',
+    }
+
+
+def synthetic_card(index: int, comments: int, check_items: int, rng: random.Random, attachments: int = 0,
+                   attachment_size: int = 0) -> dict:
+    cid = card_id(index)
+    mention = f'@trello_user{rng.randrange(len(USER_MAPPING))}'
+    return {
+        'id': cid,
+        'name': f'Card {index}: {_sentence(rng, 4)}',
+        'desc': f'{_sentence(rng, 30)} {mention}',
+        'due': f'2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T12:00:00.000Z' if index % 3 == 0 else None,
+        'idList': LIST_IDS[index % len(LIST_IDS)],
+        'idBoard': BOARD_ID,
+        'closed': False,
+        'pos': index * 1024,
+        'url': f'https://trello.com/c/{cid[-8:]}/{index}-card-{index}',
+        'idMembers': [card_id(10 ** 6 + rng.randrange(20)) for _ in range(rng.randint(0, 3))],
+        'labels': [{'id': card_id(10 ** 7 + label), 'name': WORDS[label], 'color': 'green'}
+                   for label in range(rng.randint(0, 2))],
+        'badges': {'comments': comments, 'checkItems': check_items, 'checkItemsChecked': 0, 'attachments': 0,
+                   'votes': 0, 'subscribed': False, 'fogbugz': '', 'location': False},
+        'dateLastActivity': f'2024-01-01T{index // 3600 % 24:02d}:{index // 60 % 60:02d}:{index % 60:02d}.000Z',
+        'checklists': [{
+            'id': f'{cid}-cl',
+            'name': 'Checklist',
+            'checkItems': [
+                {'id': f'{cid}-ci{item}', 'name': _sentence(rng, 3), 'state': 'incomplete'}
+                for item in range(check_items)
+            ],
+        }] if check_items else [],
+        'attachments': [synthetic_attachment(cid, number, attachment_size, rng) for number in range(attachments)],
+        'actions': [
+            {'id': f'{cid}-a{comment}', 'type': 'commentCard',
+             'data': {'text': f'{_sentence(rng, 12)} @trello_user{rng.randrange(len(USER_MAPPING))}'}}
+            for comment in range(comments)
+        ],
+    }
+
+
+def synthetic_board(cards: int, comments: int = 2, check_items: int = 3, seed: int = 0, attachments: int = 0,
+                    attachment_size: int = 0) -> dict:
+    """
+    Board com `cards` cards, cada um com `comments` comentários, uma checklist
+    de `check_items` itens e `attachments` anexos de `attachment_size` bytes.
+    Retorna o dicionário card_id -> card.
+    """
+    rng = random.Random(seed)
+    board = {}
+    for index in range(cards):
+        card = synthetic_card(index, comments, check_items, rng, attachments, attachment_size)
+        board[card['id']] = card
+    return board
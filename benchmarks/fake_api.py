@@ -0,0 +1,394 @@
+"""
+Servidor local que imita as partes das APIs do Trello e do Jira usadas pela
+sincronização.
+
+Serve o board sintético de `dataset.py` em `/1/...` (com a paginação de
+cards por `limit`/`before`) e um projeto Jira em memória em
+`/rest/api/2/...`, com latência configurável, tamanho máximo de página na
+busca e respostas 429 injetadas. As requisições (e, à parte, as de
+escrita) e os bytes das respostas são contados por rota e expostos em
+`GET /__stats`. `POST /__edit`
+simula edições feitas pelos usuários entre duas passadas. Os anexos são
+servidos e recebidos em streaming, e os bytes enviados ao Jira também são
+contados. O usuário do Jira tem um fuso fora do UTC (configurável), usado
+para ler as datas da JQL e formatar o `updated`, como no Jira real.
+"""
+import argparse
+import asyncio
+import bisect
+import itertools
+import random
+import re
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from aiohttp import web
+
+from dataset import CUSTOMFIELD, PROJECT_KEY, synthetic_board
+
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_RETRY_AFTER = 1
+DEFAULT_ATTACHMENT_KB = 256
+# Fuso do usuário do Jira, em horas: a JQL lê as datas nele e o `updated`
+# volta nele. Fora do UTC por padrão, como America/Sao_Paulo
+DEFAULT_JIRA_UTC_OFFSET = -3.0
+STREAM_CHUNK = 64 * 1024
+
+IN_CLAUSE = re.compile(r'IN \(([^)]*)\)')
+UPDATED_CLAUSE = re.compile(r'updated >= "(\d{4}/\d{2}/\d{2} \d{2}:\d{2})"')
+
+
+def trello_now() -> str:
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+
+def jira_now(tz: timezone) -> str:
+    now = datetime.now(tz)
+    return now.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + now.strftime('%z')
+
+
+def parse_jira_time(value: str) -> datetime:
+    return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%f%z')
+
+
+class FakeApi:
+    """
+    Estado e rotas do servidor falso.
+    """
+    def __init__(self, cards: int, comments: int = 2, check_items: int = 3, linked: float = 0.0,
+                 latency: float = 0.0, jitter: float = 0.0, page_size: int = DEFAULT_PAGE_SIZE,
+                 throttle_every: int = 0, retry_after: float = DEFAULT_RETRY_AFTER, bulk: bool = True,
+                 attachments: int = 0, attachment_kb: int = DEFAULT_ATTACHMENT_KB, seed: int = 0,
+                 jira_utc_offset: float = DEFAULT_JIRA_UTC_OFFSET):
+        self.latency = latency
+        self.jira_tz = timezone(timedelta(hours=jira_utc_offset))
+        self.bulk = bulk
+        self.jitter = jitter
+        self.page_size = page_size
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.cards = synthetic_board(cards, comments, check_items, seed, attachments, attachment_kb * 1024)
+        # IDs em ordem, para a paginação por `before`
+        self.card_ids = sorted(self.cards)
+        self.issues = {}
+        self.by_card = {}
+        self.keys = itertools.count(1)
+        self.requests = 0
+        self.mutations = 0
+        self.throttled = 0
+        self.bytes = 0
+        self.uploaded_bytes = 0
+        self.routes = {}
+        for card in list(self.cards.values())[:int(cards * linked)]:
+            self._create_issue({'summary': card['name'], 'description': card['desc'], CUSTOMFIELD: card['id']})
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.middleware], client_max_size=16 * 1024 ** 2)
+        r = app.router
+        r.add_get('/__stats', self.stats)
+        r.add_post('/__edit', self.edit)
+        r.add_get('/1/boards/{board}/cards', self.board_cards, name='trello:board_cards')
+        r.add_get('/1/lists/{list}/cards', self.list_cards, name='trello:list_cards')
+        r.add_get('/1/cards/{card}', self.get_card, name='trello:card')
+        r.add_put('/1/cards/{card}', self.update_card, name='trello:update_card')
+        r.add_post('/1/cards', self.create_card, name='trello:create_card')
+        r.add_get('/1/cards/{card}/checklists', self.card_checklists, name='trello:checklists')
+        r.add_get('/1/cards/{card}/attachments', self.card_attachments, name='trello:attachments')
+        r.add_get('/1/cards/{card}/attachments/{attachment}/download/{name}', self.download_attachment,
+                  name='trello:download')
+        r.add_get('/1/cards/{card}/actions', self.card_actions, name='trello:actions')
+        r.add_post('/1/cards/{card}/actions/comments', self.add_card_comment, name='trello:add_comment')
+        r.add_get('/rest/api/2/search', self.search, name='jira:search')
+        r.add_post('/rest/api/2/issue', self.create_issue, name='jira:create_issue')
+        r.add_post('/rest/api/2/issue/bulk', self.create_issues, name='jira:create_issues')
+        r.add_get('/rest/api/2/issue/{key}', self.get_issue, name='jira:issue')
+        r.add_put('/rest/api/2/issue/{key}', self.update_issue, name='jira:update_issue')
+        r.add_get('/rest/api/2/issue/{key}/comment', self.issue_comments, name='jira:comments')
+        r.add_post('/rest/api/2/issue/{key}/comment', self.add_issue_comment, name='jira:add_comment')
+        r.add_post('/rest/api/2/issue/{key}/attachments', self.add_attachment, name='jira:add_attachment')
+        return app
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        if request.path.startswith('/__'):
+            return await handler(request)
+        self.requests += 1
+        if request.method != 'GET':
+            self.mutations += 1
+        route = request.match_info.route.name or request.path
+        self.routes[route] = self.routes.get(route, 0) + 1
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.throttle_every and self.requests % self.throttle_every == 0:
+            self.throttled += 1
+            return web.json_response({'message': 'Rate limit exceeded'}, status=429,
+                                     headers={'Retry-After': str(self.retry_after)})
+        response = await handler(request)
+        self.bytes += len(response.body or b'') if isinstance(response, web.Response) else 0
+        return response
+
+    async def stats(self, request):
+        return web.json_response({
+            'requests': self.requests,
+            'mutations': self.mutations,
+            'throttled': self.throttled,
+            'bytes': self.bytes,
+            'uploaded_bytes': self.uploaded_bytes,
+            'routes': self.routes,
+            'issues': len(self.issues),
+        })
+
+    async def edit(self, request):
+        """
+        Edita uma fração dos itens: o título e um comentário novo nos cards, e
+        a descrição das issues ligadas a eles.
+        """
+        fraction = float((await request.json()).get('fraction', 0.1))
+        cards = self.random.sample(list(self.cards.values()), int(len(self.cards) * fraction))
+        for card in cards:
+            card['name'] += ' (edited)'
+            card['actions'].insert(0, {'id': f"{card['id']}-c{len(card['actions'])}", 'type': 'commentCard',
+                                       'data': {'text': 'edited on Trello'}})
+            card['dateLastActivity'] = trello_now()
+            key = self.by_card.get(card['id'])
+            if key:
+                fields = self.issues[key]['fields']
+                fields['description'] = f"{fields.get('description') or ''}\nedited on Jira"
+                fields['updated'] = jira_now(self.jira_tz)
+        return web.json_response({'edited': len(cards)})
+
+    # Trello
+
+    def _card(self, request) -> dict:
+        card = self.cards.get(request.match_info['card'])
+        if card is None:
+            raise web.HTTPNotFound()
+        return card
+
+    def _render_attachments(self, card: dict, request) -> list:
+        origin = f'{request.scheme}://{request.host}'
+        return [{**attachment, 'url': origin + attachment['url']} for attachment in card['attachments']]
+
+    def _render_card(self, card: dict, request) -> dict:
+        query = request.query
+        fields = query.get('fields')
+        if fields and fields != 'all':
+            data = {key: card[key] for key in ['id', *fields.split(',')] if key in card}
+        else:
+            data = {key: value for key, value in card.items() if key not in ('checklists', 'attachments', 'actions')}
+        if query.get('checklists') == 'all':
+            data['checklists'] = card['checklists']
+        if query.get('attachments') == 'true':
+            data['attachments'] = self._render_attachments(card, request)
+        if query.get('actions'):
+            data['actions'] = card['actions']
+        return data
+
+    def _changed_cards(self, request, list_id: str = None) -> list:
+        """
+        Cards alterados desde `since`; com `limit`, paginados do ID mais alto
+        para o mais baixo, a partir de `before`.
+        """
+        since = request.query.get('since')
+        before = request.query.get('before')
+        limit = int(request.query.get('limit', 0)) or len(self.card_ids)
+        end = bisect.bisect_left(self.card_ids, before) if before else len(self.card_ids)
+        page = []
+        for index in range(end - 1, -1, -1):
+            card = self.cards[self.card_ids[index]]
+            if (not since or card['dateLastActivity'] >= since) and (list_id is None or card['idList'] == list_id):
+                page.append(self._render_card(card, request))
+                if len(page) == limit:
+                    break
+        return page
+
+    async def board_cards(self, request):
+        return web.json_response(self._changed_cards(request))
+
+    async def list_cards(self, request):
+        return web.json_response(self._changed_cards(request, request.match_info['list']))
+
+    async def get_card(self, request):
+        return web.json_response(self._render_card(self._card(request), request))
+
+    async def update_card(self, request):
+        card = self._card(request)
+        card.update(await request.json())
+        card['dateLastActivity'] = trello_now()
+        return web.json_response({'id': card['id']})
+
+    async def create_card(self, request):
+        raise web.HTTPNotImplemented()
+
+    async def card_checklists(self, request):
+        return web.json_response(self._card(request)['checklists'])
+
+    async def card_attachments(self, request):
+        return web.json_response(self._render_attachments(self._card(request), request))
+
+    async def download_attachment(self, request):
+        card = self._card(request)
+        attachment = next((a for a in card['attachments'] if a['id'] == request.match_info['attachment']), None)
+        if attachment is None or not request.headers.get('Authorization', '').startswith('OAuth '):
+            raise web.HTTPNotFound()
+        # Conteúdo determinístico por nome de arquivo, gerado em blocos
+        block = zlib.crc32(attachment['name'].encode()).to_bytes(4, 'big') * (STREAM_CHUNK // 4)
+        response = web.StreamResponse(headers={'Content-Type': attachment['mimeType']})
+        response.content_length = attachment['bytes']
+        await response.prepare(request)
+        remaining = attachment['bytes']
+        while remaining > 0:
+            await response.write(block[:remaining])
+            remaining -= len(block)
+        self.bytes += attachment['bytes']
+        return response
+
+    async def card_actions(self, request):
+        return web.json_response(self._card(request)['actions'])
+
+    async def add_card_comment(self, request):
+        card = self._card(request)
+        body = await request.json() if request.can_read_body else {}
+        action = {
+            'id': f"{card['id']}-c{len(card['actions'])}",
+            'type': 'commentCard',
+            'data': {'text': request.query.get('text', body.get('text', ''))},
+        }
+        card['actions'].insert(0, action)
+        card['dateLastActivity'] = trello_now()
+        return web.json_response(action)
+
+    # Jira
+
+    def _issue(self, request) -> dict:
+        issue = self.issues.get(request.match_info['key'])
+        if issue is None:
+            raise web.HTTPNotFound()
+        return issue
+
+    def _create_issue(self, fields: dict) -> dict:
+        key = f'{PROJECT_KEY}-{next(self.keys)}'
+        fields = {key_: value for key_, value in fields.items() if key_ not in ('project', 'issuetype')}
+        issue = {'key': key, 'fields': {**fields, 'updated': jira_now(self.jira_tz)}, 'comments': []}
+        self.issues[key] = issue
+        if 'parent' in fields:
+            parent = self.issues[fields['parent']['key']]['fields']
+            parent.setdefault('subtasks', []).append({'key': key, 'fields': {'summary': fields.get('summary')}})
+        elif fields.get(CUSTOMFIELD):
+            self.by_card[fields[CUSTOMFIELD]] = key
+        return issue
+
+    async def search(self, request):
+        jql = request.query.get('jql', '')
+        start_at = int(request.query.get('startAt', 0))
+        max_results = min(int(request.query.get('maxResults', 50)), self.page_size)
+
+        match = IN_CLAUSE.search(jql)
+        if match:
+            card_ids = [card_id.strip().strip('"') for card_id in match.group(1).split(',')]
+            keys = [self.by_card[card_id] for card_id in card_ids if card_id in self.by_card]
+        else:
+            keys = list(self.by_card.values())
+            match = UPDATED_CLAUSE.search(jql)
+            if match:
+                # Como no Jira, a data da JQL é lida no fuso do usuário
+                since = datetime.strptime(match.group(1), '%Y/%m/%d %H:%M').replace(tzinfo=self.jira_tz)
+                keys = [key for key in keys if parse_jira_time(self.issues[key]['fields']['updated']) >= since]
+            keys.sort(key=lambda key: self.issues[key]['fields']['updated'])
+
+        page = keys[start_at:start_at + max_results]
+        return web.json_response({
+            'startAt': start_at,
+            'maxResults': max_results,
+            'total': len(keys),
+            'issues': [{'key': key, 'fields': self.issues[key]['fields']} for key in page],
+        })
+
+    async def create_issue(self, request):
+        issue = self._create_issue((await request.json())['fields'])
+        return web.json_response({'id': issue['key'], 'key': issue['key']}, status=201)
+
+    async def create_issues(self, request):
+        if not self.bulk:
+            raise web.HTTPNotFound()
+        updates = (await request.json())['issueUpdates']
+        issues = [self._create_issue(update['fields']) for update in updates]
+        return web.json_response({
+            'issues': [{'id': issue['key'], 'key': issue['key']} for issue in issues],
+            'errors': [],
+        }, status=201)
+
+    async def get_issue(self, request):
+        issue = self._issue(request)
+        return web.json_response({'key': issue['key'], 'fields': issue['fields']})
+
+    async def update_issue(self, request):
+        issue = self._issue(request)
+        issue['fields'].update((await request.json())['fields'])
+        issue['fields']['updated'] = jira_now(self.jira_tz)
+        return web.Response(status=204)
+
+    async def add_attachment(self, request):
+        issue = self._issue(request)
+        if request.headers.get('X-Atlassian-Token') != 'no-check':
+            raise web.HTTPForbidden(text='XSRF check failed')
+        reader = await request.multipart()
+        part = await reader.next()
+        size = 0
+        while chunk := await part.read_chunk(STREAM_CHUNK):
+            size += len(chunk)
+        self.uploaded_bytes += size
+        attachment = {'id': f"{issue['key']}-at{len(issue.setdefault('attachments', []))}",
+                      'filename': part.filename, 'size': size}
+        issue['attachments'].append(attachment)
+        issue['fields']['updated'] = jira_now(self.jira_tz)
+        return web.json_response([attachment])
+
+    async def issue_comments(self, request):
+        comments = self._issue(request)['comments']
+        return web.json_response({'startAt': 0, 'total': len(comments), 'comments': comments})
+
+    async def add_issue_comment(self, request):
+        issue = self._issue(request)
+        comment = {'id': f"{issue['key']}-c{len(issue['comments'])}", 'body': (await request.json())['body']}
+        issue['comments'].append(comment)
+        issue['fields']['updated'] = jira_now(self.jira_tz)
+        return web.json_response(comment, status=201)
+
+
+def serve(port: int, **options):
+    """
+    Sobe o servidor em primeiro plano (usado pelo processo filho do benchmark).
+    """
+    web.run_app(FakeApi(**options).app(), host='127.0.0.1', port=port, print=None, access_log=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local Trello/Jira stand-in server')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on')
+    parser.add_argument('--cards', type=int, default=100, help='Number of cards on the synthetic board')
+    parser.add_argument('--comments', type=int, default=2, help='Comments per card')
+    parser.add_argument('--check-items', type=int, default=3, help='Checklist items per card')
+    parser.add_argument('--linked', type=float, default=0.0, help='Fraction of cards that already have an issue')
+    parser.add_argument('--latency', type=float, default=0.0, help='Latency added to every response, in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random extra latency, in seconds')
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE, help='Maximum Jira search page size')
+    parser.add_argument('--throttle-every', type=int, default=0, help='Answer every Nth request with 429')
+    parser.add_argument('--retry-after', type=float, default=DEFAULT_RETRY_AFTER, help='Retry-After of the 429s')
+    parser.add_argument('--no-bulk', action='store_true', help='Reject Jira bulk issue creation')
+    parser.add_argument('--attachments', type=int, default=0, help='Uploaded attachments per card')
+    parser.add_argument('--attachment-kb', type=int, default=DEFAULT_ATTACHMENT_KB, help='Size of each attachment')
+    parser.add_argument('--jira-utc-offset', type=float, default=DEFAULT_JIRA_UTC_OFFSET,
+                        help='UTC offset in hours of the Jira user, used for JQL dates and "updated" values')
+    args = parser.parse_args()
+
+    serve(args.port, cards=args.cards, comments=args.comments, check_items=args.check_items, linked=args.linked,
+          latency=args.latency, jitter=args.jitter, page_size=args.page_size,
+          throttle_every=args.throttle_every, retry_after=args.retry_after, bulk=not args.no_bulk,
+          attachments=args.attachments, attachment_kb=args.attachment_kb, jira_utc_offset=args.jira_utc_offset)
+
+
+if __name__ == '__main__':
+    main()
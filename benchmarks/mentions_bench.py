@@ -0,0 +1,78 @@
+"""
+Micro-benchmark da tradução de menções.
+
+Compara o tradutor pré-compilado de `src/core/mentions.py` com o laço de
+`str.replace` por usuário usado antes, variando o número de usuários
+mapeados e o tamanho do texto. O tempo do tradutor deve crescer apenas com
+o tamanho do texto.
+
+    python benchmarks/mentions_bench.py --users 10 100 1000 --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from core.mentions import MentionTranslator
+
+WORDS = ('sync', 'board', 'issue', 'deploy', 'review', 'fix', 'api', 'cache', 'login', 'report')
+
+
+def replace_loop(text: str, mapping: dict) -> str:
+    # Implementação anterior: uma passada completa no texto por usuário
+    for source, target in mapping.items():
+        text = text.replace(f'@{source}', f'@{target}')
+    return text
+
+
+def synthetic_text(size: int, users: list, rng: random.Random) -> str:
+    parts = []
+    length = 0
+    while length < size:
+        word = f'@{rng.choice(users)}' if rng.random() < 0.1 else rng.choice(WORDS)
+        parts.append(word)
+        length += len(word) + 1
+    return ' '.join(parts)[:size]
+
+
+def best_of(function, repeat: int) -> float:
+    number = 1
+    while timeit.timeit(function, number=number) < 0.05:
+        number *= 2
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark mention translation')
+    parser.add_argument('--users', type=int, nargs='+', default=[10, 100, 1000], help='Mapped user counts')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='Text sizes in characters')
+    parser.add_argument('--repeat', type=int, default=5, help='Repetitions per measurement (the best is kept)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic texts')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    header = ('users', 'chars', 'replace us', 'translator us', 'translator ns/char', 'speedup')
+    rows = [header]
+    for users in args.users:
+        mapping = {f'user{i}': f'jira.user{i}' for i in range(users)}
+        names = list(mapping)
+        build = best_of(lambda: MentionTranslator(mapping), args.repeat)
+        translator = MentionTranslator(mapping)
+        for size in args.sizes:
+            text = synthetic_text(size, names, rng)
+            old = best_of(lambda: replace_loop(text, mapping), args.repeat)
+            new = best_of(lambda: translator.translate(text), args.repeat)
+            rows.append((str(users), str(size), f'{old * 1e6:.0f}', f'{new * 1e6:.0f}',
+                         f'{new * 1e9 / size:.1f}', f'{old / new:.1f}x'))
+        print(f'{users} usuários: tradutor compilado em {build * 1e3:.2f} ms', file=sys.stderr)
+
+    widths = [max(len(row[column]) for row in rows) for column in range(len(header))]
+    for row in rows:
+        print('  '.join(cell.rjust(width) for cell, width in zip(row, widths)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,348 @@
+"""
+Benchmark da sincronização contra o servidor falso de `fake_api.py`.
+
+Cada cenário (motor x tamanho do board) roda em processos próprios: um para
+o servidor e outro para a sincronização, de modo que o pico de RSS medido é
+apenas o do motor. Para cada passada são reportados requisições emitidas,
+requisições por card, bytes recebidos e enviados em anexos, tempo total,
+latência por item (p50/p99) e pico de RSS. Com `--plan`, cada passada é
+precedida por uma simulação, e a tabela mostra as requisições de escrita que
+ela projetou ao lado das que a passada fez.
+
+    python benchmarks/sync_bench.py --cards 100 1000 10000 --engine both
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import resource
+import socket
+import sys
+import tempfile
+import time
+import urllib.request
+
+from dataset import BOARD_ID, CUSTOMFIELD, LIST_IDS, PROJECT_KEY, USER_MAPPING
+from fake_api import DEFAULT_ATTACHMENT_KB, DEFAULT_JIRA_UTC_OFFSET, DEFAULT_PAGE_SIZE, DEFAULT_RETRY_AFTER, serve
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENGINES = ('async', 'legacy')
+DEFAULT_SIZES = [100, 1000]
+DEFAULT_RATE = 1000.0
+# Mesmo padrão dos motores (card_fetch.DEFAULT_CARD_PAGE_SIZE)
+DEFAULT_CARD_PAGE_SIZE = 100
+READY_TIMEOUT = 120
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def fetch_stats(base_url: str) -> dict:
+    with urllib.request.urlopen(f'{base_url}/__stats') as resp:
+        return json.load(resp)
+
+
+def edit_items(base_url: str, fraction: float):
+    request = urllib.request.Request(f'{base_url}/__edit', data=json.dumps({'fraction': fraction}).encode(),
+                                     headers={'Content-Type': 'application/json'}, method='POST')
+    with urllib.request.urlopen(request) as resp:
+        return json.load(resp)
+
+
+def wait_ready(base_url: str, server):
+    deadline = time.monotonic() + READY_TIMEOUT
+    while time.monotonic() < deadline:
+        if not server.is_alive():
+            raise RuntimeError('O servidor falso terminou antes de ficar pronto')
+        try:
+            return fetch_stats(base_url)
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError('O servidor falso não respondeu a tempo')
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss é informado em KB no Linux e em bytes no macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+
+
+def attachment_limits(options: dict) -> dict:
+    # Limite folgado, para que todos os anexos sintéticos sejam copiados
+    return {'max_bytes': 2 * options['attachment_kb'] * 1024 + 1}
+
+
+def rate_limit(options: dict) -> dict:
+    return {'rate': options['rate'], 'burst': options['burst'], 'max_retries': options['max_retries']}
+
+
+def synced_lists(options: dict) -> list:
+    return LIST_IDS[:options['lists']] if options['lists'] else None
+
+
+def run_async_engine(base_url: str, workdir: str, options: dict):
+    sys.path.insert(0, os.path.join(ROOT, 'src'))
+    from core.plan import SyncPlan
+    from core.sync_engine import run_sync
+
+    os.environ.update({
+        'BENCH_TRELLO_BOARD': BOARD_ID,
+        'BENCH_TRELLO_KEY': 'bench-key',
+        'BENCH_TRELLO_TOKEN': 'bench-token',
+        'BENCH_JIRA_URL': base_url,
+        'BENCH_JIRA_USER': 'bench@example.com',
+        'BENCH_JIRA_TOKEN': 'bench-token',
+        'BENCH_JIRA_PROJECT': PROJECT_KEY,
+    })
+    connection = {
+        'name': 'bench',
+        'trello': {
+            'board_id': 'BENCH_TRELLO_BOARD',
+            'api_key': 'BENCH_TRELLO_KEY',
+            'token': 'BENCH_TRELLO_TOKEN',
+            'api_url': f'{base_url}/1',
+            'list_ids': synced_lists(options),
+            'page_size': options['card_page_size'],
+            'rate_limit': rate_limit(options),
+        },
+        'jira': {
+            'project_key': 'BENCH_JIRA_PROJECT',
+            'host': 'BENCH_JIRA_URL',
+            'user': 'BENCH_JIRA_USER',
+            'api_token': 'BENCH_JIRA_TOKEN',
+            'customfield_trello_id': CUSTOMFIELD,
+            'user_mapping': USER_MAPPING,
+            'rate_limit': rate_limit(options),
+        },
+        'sync': {
+            'fields': ['title', 'description', 'due_date', 'checklists', 'comments', 'attachments'],
+            'state_db': os.path.join(workdir, 'state.db'),
+            'max_concurrency': options['max_concurrency'],
+            'attachments': attachment_limits(options),
+        },
+    }
+
+    def run(plan=False):
+        if not plan:
+            return asyncio.run(run_sync(connection))
+        sync_plan = SyncPlan('bench', {'trello': rate_limit(options), 'jira': rate_limit(options)})
+        asyncio.run(run_sync(connection, plan=sync_plan))
+        return sync_plan
+
+    return run
+
+
+def run_legacy_engine(base_url: str, workdir: str, options: dict):
+    sys.path.insert(0, ROOT)
+    import sync_logic
+
+    os.environ.update({
+        'TRELLO_KEY': 'bench-key',
+        'TRELLO_TOKEN': 'bench-token',
+        'JIRA_URL': base_url,
+        'JIRA_USER': 'bench@example.com',
+        'JIRA_API_TOKEN': 'bench-token',
+    })
+    config = {
+        'trello': {
+            'board_id': BOARD_ID,
+            'api_url': f'{base_url}/1',
+            'list_ids': synced_lists(options),
+            'page_size': options['card_page_size'],
+            'rate_limit': rate_limit(options),
+        },
+        'jira': {
+            'project_key': PROJECT_KEY,
+            'customfield_trello_id': CUSTOMFIELD,
+            'user_mapping': USER_MAPPING,
+            'rate_limit': rate_limit(options),
+        },
+        'sync': {
+            'state_file': os.path.join(workdir, 'state.json'),
+            'state_db': os.path.join(workdir, 'state.db'),
+            'attachments': attachment_limits(options),
+        },
+    }
+    return lambda plan=False: sync_logic.sync(config, plan=plan)
+
+
+def run_engine(engine: str, base_url: str, options: dict, results):
+    """
+    Processo filho: executa as passadas do motor e devolve as medições.
+    """
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory(prefix='sync-bench-') as workdir:
+        factory = run_async_engine if engine == 'async' else run_legacy_engine
+        run = factory(base_url, workdir, options)
+        passes = []
+        for number in range(1, options['passes'] + 1):
+            if number > 1 and options['edit']:
+                edit_items(base_url, options['edit'])
+            planned = plan_error = None
+            if options['plan']:
+                before = fetch_stats(base_url)
+                projected = run(plan=True).projected
+                # Downloads de anexos são leituras; o resto são escritas
+                planned = sum(count for (_, method, _), count in projected.items() if method != 'GET')
+                mutations = fetch_stats(base_url)['mutations'] - before['mutations']
+                if mutations:
+                    plan_error = f'a simulação fez {mutations} escritas'
+            before = fetch_stats(base_url)
+            started = time.perf_counter()
+            error = None
+            try:
+                report = run()
+            except Exception as e:
+                report, error = None, str(e)
+            wall = time.perf_counter() - started
+            after = fetch_stats(base_url)
+            passes.append({
+                'pass': number,
+                'requests': after['requests'] - before['requests'],
+                'mutations': after['mutations'] - before['mutations'],
+                'throttled': after['throttled'] - before['throttled'],
+                'bytes': after['bytes'] - before['bytes'],
+                'uploaded_bytes': after['uploaded_bytes'] - before['uploaded_bytes'],
+                'routes': {
+                    route: count - before['routes'].get(route, 0)
+                    for route, count in after['routes'].items()
+                    if count != before['routes'].get(route, 0)
+                },
+                'wall_seconds': wall,
+                'processed': report.processed if report else None,
+                'planned': planned,
+                'writes': report.writes if report else None,
+                'p50_ms': report.percentile(50) * 1000 if report else None,
+                'p99_ms': report.percentile(99) * 1000 if report else None,
+                'peak_rss_mb': peak_rss_mb(),
+                'error': plan_error or error,
+            })
+        results.put(passes)
+
+
+def run_scenario(engine: str, cards: int, options: dict) -> list:
+    """
+    Sobe o servidor falso com um board de `cards` cards e mede o motor contra ele.
+    """
+    ctx = multiprocessing.get_context('spawn')
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    server = ctx.Process(target=serve, args=(port,), kwargs={
+        'cards': cards,
+        'comments': options['comments'],
+        'check_items': options['check_items'],
+        'linked': options['linked'],
+        'latency': options['latency'],
+        'jitter': options['jitter'],
+        'page_size': options['page_size'],
+        'throttle_every': options['throttle_every'],
+        'retry_after': options['retry_after'],
+        'bulk': not options['no_bulk'],
+        'attachments': options['attachments'],
+        'attachment_kb': options['attachment_kb'],
+        'seed': options['seed'],
+        'jira_utc_offset': options['jira_utc_offset'],
+    }, daemon=True)
+    server.start()
+    try:
+        wait_ready(base_url, server)
+        results = ctx.Queue()
+        worker = ctx.Process(target=run_engine, args=(engine, base_url, options, results))
+        worker.start()
+        while True:
+            try:
+                passes = results.get(timeout=1)
+                break
+            except queue.Empty:
+                if not worker.is_alive():
+                    raise RuntimeError(f'O processo do motor {engine} terminou com código {worker.exitcode}')
+        worker.join()
+    finally:
+        server.terminate()
+        server.join()
+    return [{'engine': engine, 'cards': cards, **result} for result in passes]
+
+
+def format_table(rows: list) -> str:
+    header = ('engine', 'cards', 'pass', 'requests', 'req/card', 'planned', 'POST/PUT', 'writes', '429s', 'recv KB',
+              'sent KB', 'wall s', 'p50 ms', 'p99 ms', 'rss MB')
+    lines = [header]
+    for row in rows:
+        lines.append((
+            row['engine'], str(row['cards']), str(row['pass']), str(row['requests']),
+            f"{row['requests'] / row['cards']:.2f}", '-' if row['planned'] is None else str(row['planned']),
+            str(row['mutations']), '-' if row['writes'] is None else str(row['writes']),
+            str(row['throttled']), f"{row['bytes'] / 1024:.0f}", f"{row['uploaded_bytes'] / 1024:.0f}",
+            f"{row['wall_seconds']:.2f}",
+            '-' if row['p50_ms'] is None else f"{row['p50_ms']:.1f}",
+            '-' if row['p99_ms'] is None else f"{row['p99_ms']:.1f}",
+            f"{row['peak_rss_mb']:.0f}",
+        ))
+    widths = [max(len(line[column]) for line in lines) for column in range(len(header))]
+    text = '\n'.join('  '.join(cell.rjust(width) for cell, width in zip(line, widths)) for line in lines)
+    errors = [f"{row['engine']}/{row['cards']} passada {row['pass']}: {row['error']}" for row in rows if row['error']]
+    return text + ''.join(f'\nerro: {error}' for error in errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the sync engines against a local Trello/Jira stand-in')
+    parser.add_argument('--engine', choices=ENGINES + ('both',), default='both', help='Engine to benchmark')
+    parser.add_argument('--cards', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='Board sizes to run (e.g. 100 1000 10000 50000)')
+    parser.add_argument('--passes', type=int, default=2,
+                        help='Consecutive runs per scenario; later passes measure incremental syncs')
+    parser.add_argument('--comments', type=int, default=2, help='Comments per card')
+    parser.add_argument('--check-items', type=int, default=3, help='Checklist items per card')
+    parser.add_argument('--lists', type=int, default=0,
+                        help=f'Sync only the first N of the {len(LIST_IDS)} board lists (0 syncs the whole board)')
+    parser.add_argument('--attachments', type=int, default=0, help='Uploaded attachments per card')
+    parser.add_argument('--attachment-kb', type=int, default=DEFAULT_ATTACHMENT_KB, help='Size of each attachment')
+    parser.add_argument('--linked', type=float, default=0.0, help='Fraction of cards that already have an issue')
+    parser.add_argument('--edit', type=float, default=0.0,
+                        help='Before each later pass, edit this fraction of cards and their issues on both sides')
+    parser.add_argument('--plan', action='store_true',
+                        help='Run a plan (dry run) before each pass and show its projected write requests next to the real ones')
+    parser.add_argument('--latency', type=float, default=0.005, help='Latency added to every response, in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random extra latency, in seconds')
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE, help='Maximum Jira search page size')
+    parser.add_argument('--card-page-size', type=int, default=DEFAULT_CARD_PAGE_SIZE,
+                        help='Trello cards fetched per page by the engines')
+    parser.add_argument('--throttle-every', type=int, default=0, help='Answer every Nth request with 429')
+    parser.add_argument('--retry-after', type=float, default=DEFAULT_RETRY_AFTER, help='Retry-After of the 429s')
+    parser.add_argument('--no-bulk', action='store_true', help='Make the stand-in reject Jira bulk issue creation')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE,
+                        help='Client-side rate limit per API, in requests per second')
+    parser.add_argument('--burst', type=int, default=100, help='Client-side rate limit burst')
+    parser.add_argument('--max-retries', type=int, default=5, help='Retries on 429/5xx')
+    parser.add_argument('--max-concurrency', type=int, default=8, help='Concurrent items in the async engine')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic board')
+    parser.add_argument('--jira-utc-offset', type=float, default=DEFAULT_JIRA_UTC_OFFSET,
+                        help='UTC offset in hours of the stand-in Jira user (JQL dates and "updated" values)')
+    parser.add_argument('--json', dest='json_path', default=None, help='Also write the results to this JSON file')
+    args = parser.parse_args()
+
+    options = {key: value for key, value in vars(args).items() if key not in ('engine', 'cards', 'json_path')}
+    engines = ENGINES if args.engine == 'both' else (args.engine,)
+
+    rows = []
+    for cards in args.cards:
+        for engine in engines:
+            print(f'{engine}: {cards} cards...', file=sys.stderr, flush=True)
+            rows.extend(run_scenario(engine, cards, options))
+
+    print(format_table(rows))
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'options': options, 'results': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""
+Cópia dos anexos do Trello para o Jira.
+
+Arquivos enviados ao Trello (`isUpload`) são baixados em blocos para um
+cache em disco endereçado pelo sha256 do conteúdo e enviados ao Jira a
+partir desse arquivo, de modo que nenhum anexo passa inteiro pela memória.
+O índice do banco local (URL -> sha256 e issue -> sha256) garante que cada
+arquivo seja baixado uma vez e anexado a cada issue uma vez, também entre
+execuções. Anexos que são apenas links continuam como links.
+
+O cache tem tamanho máximo: ao passar dele, os arquivos usados há mais tempo
+são removidos (e baixados de novo se voltarem a ser necessários).
+"""
+import hashlib
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+DEFAULT_MAX_BYTES = 10 * 1024 ** 2
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 ** 2
+DEFAULT_ATTACHMENT_CONCURRENCY = 2
+DEFAULT_MIME_TYPE = 'application/octet-stream'
+SPOOL_PREFIX = '.spool-'
+
+
+class AttachmentTooLarge(ValueError):
+    """
+    Anexo maior que o limite configurado.
+    """
+
+
+def is_upload(attachment: dict) -> bool:
+    """
+    Se o anexo é um arquivo enviado ao Trello (e não apenas um link).
+    """
+    return bool(attachment.get('isUpload'))
+
+
+def attachment_name(attachment: dict) -> str:
+    return attachment.get('name') or attachment.get('url', '').rstrip('/').rsplit('/', 1)[-1] or 'attachment'
+
+
+def attachment_options(sync_conf: dict, state_db: str) -> dict:
+    """
+    Limites e diretório do cache de `sync.attachments`; por padrão o cache
+    fica ao lado do banco de estado.
+    """
+    options = sync_conf.get('attachments') or {}
+    return {
+        'cache_dir': options.get('cache_dir') or os.path.join(os.path.dirname(state_db) or '.', 'attachments'),
+        'cache_max_bytes': options.get('cache_max_bytes', DEFAULT_CACHE_MAX_BYTES),
+        'max_bytes': options.get('max_bytes', DEFAULT_MAX_BYTES),
+        'concurrency': options.get('concurrency', DEFAULT_ATTACHMENT_CONCURRENCY),
+    }
+
+
+def pending_uploads(index, cache, issue_key: str, attachments, max_bytes: int = DEFAULT_MAX_BYTES) -> list:
+    """
+    Anexos que a cópia enviaria à issue, sem baixar nada: pares (anexo,
+    precisa baixar). Conteúdo ainda não baixado conta como novo, já que só o
+    download revela se ele repete outro.
+    """
+    pending = []
+    digests = set()
+    for attachment in attachments:
+        if not is_upload(attachment) or (attachment.get('bytes') or 0) > max_bytes:
+            continue
+        sha256 = index.digest_for(attachment['url'])
+        if sha256 and (sha256 in digests or index.uploaded(issue_key, sha256)):
+            continue
+        digests.add(sha256)
+        pending.append((attachment, not (sha256 and cache.path(sha256))))
+    return pending
+
+
+class Spool:
+    """
+    Arquivo temporário no diretório do cache que calcula o sha256 enquanto
+    recebe os blocos. `commit()` o move para o nome definitivo.
+    """
+    def __init__(self, cache: 'AttachmentCache', limit: int = None):
+        self.cache = cache
+        self.limit = limit
+        self.size = 0
+        self.digest = hashlib.sha256()
+        fd, self.tmp_path = tempfile.mkstemp(dir=cache.directory, prefix=SPOOL_PREFIX)
+        self.file = os.fdopen(fd, 'wb')
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.limit and self.size > self.limit:
+            raise AttachmentTooLarge(f'Anexo acima do limite de {self.limit} bytes')
+        self.digest.update(chunk)
+        self.file.write(chunk)
+
+    def commit(self):
+        """
+        Retorna (sha256, caminho no cache).
+        """
+        self.file.close()
+        sha256 = self.digest.hexdigest()
+        path = os.path.join(self.cache.directory, sha256)
+        os.replace(self.tmp_path, path)
+        self.tmp_path = None
+        self.cache.evict(keep=sha256)
+        return sha256, path
+
+    def discard(self):
+        self.file.close()
+        if self.tmp_path and os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.tmp_path:
+            self.discard()
+
+
+class AttachmentCache:
+    """
+    Diretório de arquivos nomeados pelo sha256 do conteúdo. Com
+    `read_only` (modo plano) o diretório não é criado nem alterado, e um
+    diretório inexistente vale como cache vazio.
+    """
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_CACHE_MAX_BYTES, read_only: bool = False):
+        if not read_only:
+            os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.read_only = read_only
+
+    def path(self, sha256: str):
+        """
+        Caminho do conteúdo no cache, ou None se ele não estiver lá.
+        """
+        path = os.path.join(self.directory, sha256)
+        if not os.path.exists(path):
+            return None
+        if not self.read_only:
+            os.utime(path)
+        return path
+
+    def spool(self, limit: int = None) -> Spool:
+        return Spool(self, limit)
+
+    def evict(self, keep: str = None):
+        """
+        Remove os arquivos usados há mais tempo até o cache caber no limite.
+        """
+        entries = [
+            entry for entry in os.scandir(self.directory)
+            if entry.is_file() and not entry.name.startswith(SPOOL_PREFIX)
+        ]
+        total = sum(entry.stat().st_size for entry in entries)
+        for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+            if total <= self.max_bytes:
+                break
+            if entry.name == keep:
+                continue
+            total -= entry.stat().st_size
+            os.remove(entry.path)
+
+
+class AttachmentMirror:
+    """
+    Copia os arquivos anexados aos cards para as issues ligadas, com no
+    máximo `concurrency` transferências simultâneas na execução.
+    """
+    def __init__(self, trello, jira, index, cache: AttachmentCache, max_bytes: int = DEFAULT_MAX_BYTES,
+                 concurrency: int = DEFAULT_ATTACHMENT_CONCURRENCY):
+        self.trello = trello
+        self.jira = jira
+        self.index = index
+        self.cache = cache
+        self.max_bytes = max_bytes
+        # Importado aqui: o motor legado usa só o cache e não precisa de asyncio
+        import asyncio
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    async def mirror(self, issue_key: str, attachments) -> int:
+        """
+        Envia à issue os arquivos que ela ainda não tem. Os anexos de uma
+        mesma issue vão em sequência, para que conteúdo repetido no card seja
+        enviado uma vez; o paralelismo vem de cards diferentes. Retorna a
+        quantidade de anexos enviados.
+        """
+        uploaded = 0
+        for attachment in attachments:
+            if is_upload(attachment):
+                uploaded += await self._mirror_one(issue_key, attachment)
+        return uploaded
+
+    async def _mirror_one(self, issue_key: str, attachment: dict) -> int:
+        url = attachment['url']
+        if (attachment.get('bytes') or 0) > self.max_bytes:
+            logger.info(f"Anexo {url} ignorado: acima do limite de {self.max_bytes} bytes")
+            return 0
+        sha256 = self.index.digest_for(url)
+        if sha256 and self.index.uploaded(issue_key, sha256):
+            return 0
+        async with self.semaphore:
+            path = self.cache.path(sha256) if sha256 else None
+            if path is None:
+                try:
+                    with self.cache.spool(self.max_bytes) as spool:
+                        async for chunk in self.trello.iter_attachment(url, CHUNK_SIZE):
+                            spool.write(chunk)
+                        sha256, path = spool.commit()
+                except AttachmentTooLarge as e:
+                    logger.info(f"Anexo {url} ignorado: {str(e)}")
+                    return 0
+                self.index.remember(url, sha256, spool.size)
+                if self.index.uploaded(issue_key, sha256):
+                    return 0
+            result = await self.jira.add_attachment(
+                issue_key, path, attachment_name(attachment), attachment.get('mimeType') or DEFAULT_MIME_TYPE
+            )
+        self.index.record_upload(issue_key, sha256, result[0].get('id') if result else None)
+        return 1
@@ -0,0 +1,141 @@
+"""
+Busca "gorda" de cards do Trello.
+
+O endpoint de cards do board aceita recursos aninhados (checklists, anexos e
+ações de comentário). Com eles, uma única resposta traz tudo o que a
+sincronização precisa, e as chamadas por card ficam apenas como fallback.
+
+Os campos do card são projetados (`fields=`) para os que a sincronização lê,
+e com `trello.list_ids` a busca é feita por lista (`/lists/{id}/cards`), de
+modo que o volume baixado acompanha as listas sincronizadas e não o board.
+
+A busca é paginada por `limit`/`before`, do card mais novo para o mais antigo
+(os IDs do Trello crescem com a criação), e cada página é processada antes da
+próxima, de modo que a memória acompanha o tamanho da página e não o do
+board. A posição (fonte e último card processado) permite retomar uma
+passada interrompida. Como os cards podem mudar enquanto a passada anda, a
+marca d'água só avança no fim dela, para o horário em que começou.
+"""
+from datetime import datetime, timedelta, timezone
+
+# O Trello devolve no máximo 50 ações aninhadas por card; se o limite for
+# atingido, os comentários são buscados pela chamada individual.
+NESTED_ACTIONS_LIMIT = 50
+
+# Campos do card lidos pela sincronização
+CARD_FIELDS = ('name', 'desc', 'due', 'idList', 'dateLastActivity')
+ATTACHMENT_FIELDS = ('name', 'url', 'bytes', 'isUpload', 'mimeType')
+
+# O Trello aceita até 1000 cards por página
+DEFAULT_CARD_PAGE_SIZE = 100
+# Folga para a diferença entre o relógio local e o do Trello; cards que não
+# mudaram nesse intervalo são ignorados pelos snapshots
+PASS_CLOCK_MARGIN = timedelta(minutes=5)
+POSITION_SEPARATOR = '@'
+
+
+def fat_fetch_params(sync_fields) -> dict:
+    """
+    Parâmetros de recursos aninhados conforme os campos sincronizados.
+    """
+    params = {'fields': ','.join(CARD_FIELDS)}
+    if 'checklists' in sync_fields:
+        params['checklists'] = 'all'
+    if 'attachments' in sync_fields:
+        params['attachments'] = 'true'
+        params['attachment_fields'] = ','.join(ATTACHMENT_FIELDS)
+    if 'comments' in sync_fields:
+        params['actions'] = 'commentCard'
+    return params
+
+
+def card_sources(board_id: str, list_ids) -> list:
+    """
+    Endpoints de onde os cards são buscados: as listas configuradas ou o board.
+    """
+    if list_ids:
+        return [f'lists/{list_id}/cards' for list_id in list_ids]
+    return [f'boards/{board_id}/cards']
+
+
+def card_position(source: str, card_id: str) -> str:
+    """
+    Posição para retomar a busca depois do card `card_id` da fonte `source`.
+    """
+    return f'{source}{POSITION_SEPARATOR}{card_id}'
+
+
+def resume_points(sources: list, position: str = None) -> list:
+    """
+    Pares (fonte, before) que faltam buscar a partir de `position`. Uma
+    posição de uma fonte que não está mais configurada recomeça do início.
+    """
+    if position:
+        source, _, before = position.rpartition(POSITION_SEPARATOR)
+        if source in sources:
+            index = sources.index(source)
+            return [(source, before)] + [(later, None) for later in sources[index + 1:]]
+    return [(source, None) for source in sources]
+
+
+def card_page_params(since: str, sync_fields, page_size: int, before: str = None) -> dict:
+    params = {'since': since, 'limit': page_size, **fat_fetch_params(sync_fields or [])}
+    if before:
+        params['before'] = before
+    return params
+
+
+def sorted_page(cards: list) -> list:
+    """
+    Página em ordem decrescente de ID, a ordem da paginação por `before`.
+    """
+    return sorted(cards, key=lambda card: card['id'], reverse=True)
+
+
+def next_before(page: list, page_size: int):
+    """
+    `before` da próxima página, ou None quando esta é a última da fonte.
+    """
+    if len(page) < page_size:
+        return None
+    return page[-1]['id']
+
+
+def pass_start(now: datetime = None) -> str:
+    """
+    Horário de início de uma passada, no formato do Trello e já com a folga
+    de relógio: é a marca d'água gravada quando a passada termina.
+    """
+    start = (now or datetime.now(timezone.utc)) - PASS_CLOCK_MARGIN
+    return start.strftime('%Y-%m-%dT%H:%M:%S.') + f'{start.microsecond // 1000:03d}Z'
+
+
+def in_lists(card, list_ids) -> bool:
+    """
+    Se o card pertence às listas sincronizadas (sem `list_ids`, todas).
+    """
+    return not list_ids or card.get('idList') in list_ids
+
+
+def embedded_checklists(card):
+    """
+    Checklists vindas na própria resposta, ou None se for preciso buscá-las.
+    """
+    return card.get('checklists')
+
+
+def embedded_attachments(card):
+    """
+    Anexos vindos na própria resposta, ou None se for preciso buscá-los.
+    """
+    return card.get('attachments')
+
+
+def embedded_comments(card):
+    """
+    Comentários vindos na própria resposta, ou None se for preciso buscá-los.
+    """
+    actions = card.get('actions')
+    if actions is None or len(actions) >= NESTED_ACTIONS_LIMIT:
+        return None
+    return [action for action in actions if action.get('type', 'commentCard') == 'commentCard']
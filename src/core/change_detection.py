@@ -0,0 +1,68 @@
+"""
+Detecção de mudanças campo a campo.
+
+Os valores sincronizados são reduzidos a uma forma canônica (título,
+descrição, data de entrega) comparável entre os dois lados. Um snapshot com
+o hash do último valor sincronizado de cada campo permite escrever apenas o
+que mudou e pular a escrita quando nada mudou, o que também interrompe o
+vai-e-volta causado por `updated > last_run`.
+"""
+
+SYNCED_FIELDS = ('title', 'description', 'due_date')
+
+JIRA_KEYS = {'title': 'summary', 'description': 'description', 'due_date': 'duedate'}
+TRELLO_KEYS = {'title': 'name', 'description': 'desc', 'due_date': 'due'}
+
+
+def normalize_due(value):
+    """
+    Reduz datas ISO do Trello e datas do Jira ao formato AAAA-MM-DD.
+    """
+    return value[:10] if value else None
+
+
+def _canonical(values: dict, keys: dict, sync_fields) -> dict:
+    result = {}
+    for field in SYNCED_FIELDS:
+        if field not in sync_fields:
+            continue
+        value = values.get(keys[field])
+        result[field] = normalize_due(value) if field == 'due_date' else (value or '')
+    return result
+
+
+def canonical_from_trello(card: dict, sync_fields=SYNCED_FIELDS) -> dict:
+    """
+    Forma canônica dos campos de um card (ou de um payload de card).
+    """
+    return _canonical(card, TRELLO_KEYS, sync_fields)
+
+
+def canonical_from_jira(fields: dict, sync_fields=SYNCED_FIELDS) -> dict:
+    """
+    Forma canônica dos campos de uma issue (ou de um payload de issue).
+    """
+    return _canonical(fields, JIRA_KEYS, sync_fields)
+
+
+def changed_fields(snapshot: dict, canonical: dict, hash_value) -> list:
+    """
+    Lista os campos canônicos cujo hash difere do último sincronizado.
+    """
+    return [field for field, value in canonical.items() if snapshot.get(field) != hash_value(value)]
+
+
+def select_fields(payload: dict, changed, keys: dict) -> dict:
+    """
+    Restringe um payload já convertido aos campos alterados. Campos que
+    deixaram de existir na origem são enviados como None para limpá-los.
+    """
+    return {keys[field]: payload.get(keys[field]) for field in changed}
+
+
+def jira_search_fields(sync_fields, customfield: str) -> list:
+    """
+    Campos pedidos na busca de issues: apenas os sincronizados, o ID do card
+    e a data de atualização.
+    """
+    return [JIRA_KEYS[field] for field in SYNCED_FIELDS if field in sync_fields] + [customfield, 'updated']
@@ -0,0 +1,202 @@
+"""
+Carga e validação da configuração, com cache da forma compilada.
+
+Ler o YAML custa a importação do PyYAML e o parse do arquivo a cada processo
+de curta duração (job da matriz, execução do cron). Por isso a configuração
+validada é gravada em um arquivo JSON ao lado dela (ou em `cache_path`), e as
+execuções seguintes a leem direto desse arquivo enquanto o YAML não mudar: o
+mtime e o tamanho são conferidos primeiro e, se diferirem (um checkout novo,
+por exemplo), o sha256 do conteúdo decide.
+
+O cache guarda apenas a estrutura do arquivo, em que credenciais são nomes de
+variáveis de ambiente; os valores delas são lidos na hora, pelos clientes.
+"""
+import hashlib
+import json
+import logging
+import os
+
+from .cron import CronSchedule
+
+logger = logging.getLogger(__name__)
+
+# Muda quando o formato do cache ou as regras de validação mudam
+CACHE_VERSION = 2
+CACHE_SUFFIX = '.compiled.json'
+
+# Formatos de configuração: mappings.yaml (várias conexões) e o config.yaml
+# do motor legado (uma conexão, com IDs literais)
+MAPPINGS = 'mappings'
+LEGACY = 'legacy'
+
+MAX_TRELLO_PAGE_SIZE = 1000
+
+REQUIRED_KEYS = {
+    MAPPINGS: {
+        'trello': ('board_id', 'api_key', 'token'),
+        'jira': ('project_key', 'host', 'user', 'api_token', 'customfield_trello_id'),
+        'sync': ('fields',),
+    },
+    LEGACY: {
+        'trello': ('board_id',),
+        'jira': ('project_key', 'customfield_trello_id'),
+        'sync': (),
+    },
+}
+POSITIVE_INTS = {
+    'sync': ('max_concurrency', 'checkpoint_every'),
+    'trello': ('page_size',),
+}
+# Aceitam frações: link_max_age_hours: 0.5 são 30 minutos
+POSITIVE_NUMBERS = {
+    'sync': ('link_max_age_hours',),
+}
+CRON_KEYS = ('interval', 'reconcile_interval')
+
+
+class ConfigError(ValueError):
+    """
+    Arquivo de configuração ilegível ou inválido.
+    """
+
+
+def default_cache_path(path: str) -> str:
+    """
+    Cache ao lado da configuração: config/mappings.yaml -> config/.mappings.yaml.compiled.json.
+    """
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f'.{name}{CACHE_SUFFIX}')
+
+
+def _connection_problems(connection, where: str, schema: str) -> list:
+    if not isinstance(connection, dict):
+        return [f'{where.rstrip(".") or "configuração"}: esperado um mapeamento']
+    problems = []
+    for section, keys in REQUIRED_KEYS[schema].items():
+        conf = connection.get(section)
+        if not isinstance(conf, dict):
+            problems.append(f'{where}{section}: seção obrigatória')
+            continue
+        problems.extend(f'{where}{section}.{key}: obrigatório' for key in keys if not conf.get(key))
+        for key in POSITIVE_INTS.get(section, ()):
+            value = conf.get(key)
+            if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value <= 0):
+                problems.append(f'{where}{section}.{key}: esperado um inteiro positivo')
+        for key in POSITIVE_NUMBERS.get(section, ()):
+            value = conf.get(key)
+            if value is not None and (not isinstance(value, (int, float)) or isinstance(value, bool) or value <= 0):
+                problems.append(f'{where}{section}.{key}: esperado um número positivo')
+        if section == 'trello' and isinstance(conf.get('page_size'), int) and conf['page_size'] > MAX_TRELLO_PAGE_SIZE:
+            problems.append(f'{where}trello.page_size: no máximo {MAX_TRELLO_PAGE_SIZE}')
+        if section == 'trello' and not isinstance(conf.get('list_ids') or [], list):
+            problems.append(f'{where}trello.list_ids: esperada uma lista')
+        if 'rate_limit' in conf and not isinstance(conf['rate_limit'] or {}, dict):
+            problems.append(f'{where}{section}.rate_limit: esperado um mapeamento')
+    sync_conf = connection.get('sync')
+    if isinstance(sync_conf, dict):
+        if 'fields' in sync_conf and not isinstance(sync_conf['fields'], list):
+            problems.append(f'{where}sync.fields: esperada uma lista')
+        for key in CRON_KEYS:
+            if sync_conf.get(key) is not None:
+                try:
+                    CronSchedule(str(sync_conf[key]))
+                except ValueError as e:
+                    problems.append(f'{where}sync.{key}: {str(e)}')
+    return problems
+
+
+def validate(data, schema: str = MAPPINGS):
+    """
+    Confere a estrutura da configuração e levanta ConfigError com todos os
+    problemas encontrados.
+    """
+    if schema == LEGACY:
+        problems = _connection_problems(data, '', LEGACY)
+    elif not isinstance(data, dict) or not isinstance(data.get('connections'), list):
+        problems = ['connections: esperada uma lista de conexões']
+    else:
+        problems = []
+        for index, connection in enumerate(data['connections']):
+            problems.extend(_connection_problems(connection, f'connections[{index}].', MAPPINGS))
+        if not isinstance(data.get('http') or {}, dict):
+            problems.append('http: esperado um mapeamento')
+    if problems:
+        raise ConfigError('Configuração inválida: ' + '; '.join(problems))
+    return data
+
+
+def _read_cache(cache_path: str, schema: str):
+    try:
+        with open(cache_path, 'r') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(entry, dict) or entry.get('version') != CACHE_VERSION or entry.get('schema') != schema:
+        return None
+    return entry
+
+
+def _write_cache(cache_path: str, entry: dict):
+    # Arquivo temporário trocado de uma vez, como o estado; falhas (diretório
+    # somente leitura, por exemplo) apenas deixam as próximas execuções sem cache
+    tmp = f'{cache_path}.tmp'
+    try:
+        os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp, cache_path)
+    except OSError as e:
+        logger.warning(f"Não foi possível gravar o cache da configuração em {cache_path}: {str(e)}")
+
+
+def _parse_yaml(content: bytes, path: str):
+    import yaml  # Só quando o cache não serve
+
+    try:
+        return yaml.safe_load(content)
+    except yaml.YAMLError as e:
+        raise ConfigError(f'Erro ao processar {path}: {str(e)}') from e
+
+
+def compiled_config(path: str, schema: str = MAPPINGS, cache_path: str = None):
+    """
+    Configuração validada de `path` e se ela veio do cache. `cache_path`
+    vazio ('') desativa o cache.
+    """
+    if cache_path is None:
+        cache_path = default_cache_path(path)
+    stat = os.stat(path)
+    source = {'path': os.path.abspath(path), 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+    entry = _read_cache(cache_path, schema) if cache_path else None
+    if entry and entry.get('source') == source:
+        return entry['config'], True
+
+    with open(path, 'rb') as f:
+        content = f.read()
+    sha256 = hashlib.sha256(content).hexdigest()
+    if entry and entry.get('sha256') == sha256:
+        # Mesmo conteúdo com outro mtime (checkout novo): só atualiza a chave
+        _write_cache(cache_path, {**entry, 'source': source})
+        return entry['config'], True
+
+    data = validate(_parse_yaml(content, path), schema)
+    if cache_path:
+        try:
+            # Tipos do YAML sem equivalente em JSON (datas, chaves numéricas)
+            # não sobrevivem ao cache; nesse caso o YAML é lido sempre
+            cacheable = json.loads(json.dumps(data)) == data
+        except (TypeError, ValueError):
+            cacheable = False
+        if cacheable:
+            _write_cache(cache_path, {
+                'version': CACHE_VERSION, 'schema': schema, 'source': source, 'sha256': sha256, 'config': data,
+            })
+    return data, False
+
+
+def load_config(path: str, schema: str = MAPPINGS, cache_path: str = None):
+    """
+    Configuração validada de `path` (veja `compiled_config`).
+    """
+    return compiled_config(path, schema, cache_path)[0]
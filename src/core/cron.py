@@ -0,0 +1,100 @@
+"""
+Interpretação de expressões cron de cinco campos (minuto, hora, dia do mês,
+mês, dia da semana), usadas em `sync.interval`.
+"""
+from datetime import datetime, timedelta
+
+FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+# Limite de busca pela próxima execução (pouco mais de quatro anos, para
+# cobrir expressões como 29 de fevereiro)
+MAX_SEARCH_MINUTES = 60 * 24 * 366 * 5
+
+
+def _parse_field(expr: str, low: int, high: int) -> set:
+    values = set()
+    for part in expr.split(','):
+        step = 1
+        if '/' in part:
+            part, step_expr = part.split('/', 1)
+            step = int(step_expr)
+            if step <= 0:
+                raise ValueError(f'Passo inválido na expressão cron: {expr}')
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start_expr, end_expr = part.split('-', 1)
+            start, end = int(start_expr), int(end_expr)
+        else:
+            start = int(part)
+            end = high if step != 1 else start
+        # No dia da semana, 7 também representa domingo
+        if high == 6 and end == 7:
+            if start == 7:
+                start = end = 0
+            else:
+                values.add(0)
+                end = 6
+        if start < low or end > high or start > end:
+            raise ValueError(f'Valor fora do intervalo na expressão cron: {expr}')
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """
+    Agenda definida por uma expressão cron.
+    """
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f'Expressão cron deve ter 5 campos: {expression!r}')
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            _parse_field(field, low, high) for field, (low, high) in zip(fields, FIELD_RANGES)
+        )
+        # Como no cron tradicional, se dia do mês e dia da semana forem
+        # restritos, basta um deles casar
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day = moment.day in self.days
+        weekday = (moment.isoweekday() % 7) in self.weekdays
+        if self.any_day:
+            return weekday
+        if self.any_weekday:
+            return day
+        return day or weekday
+
+    def matches(self, moment: datetime) -> bool:
+        return (
+            moment.minute in self.minutes
+            and moment.hour in self.hours
+            and moment.month in self.months
+            and self._day_matches(moment)
+        )
+
+    def next_after(self, moment: datetime) -> datetime:
+        """
+        Próximo instante (com precisão de minuto) estritamente após `moment`.
+        """
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # O limite é de tempo, não de passos: os saltos de mês e de dia
+        # percorreriam séculos antes de esgotar as iterações
+        limit = candidate + timedelta(minutes=MAX_SEARCH_MINUTES)
+        while candidate <= limit:
+            if candidate.month not in self.months:
+                candidate = (candidate.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+                continue
+            if not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+                continue
+            if candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+                continue
+            return candidate
+        raise ValueError(f'Expressão cron sem execuções futuras: {self.expression!r}')
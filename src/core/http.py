@@ -0,0 +1,97 @@
+"""
+Sessões HTTP compartilhadas (aiohttp) com pool de conexões.
+
+Cada cliente mantém uma única `ClientSession` de vida longa, de modo que
+requisições repetidas ao mesmo host reaproveitam conexões TCP/TLS abertas.
+No modo daemon, um `SessionPool` compartilha a mesma sessão entre todas as
+conexões que falam com o mesmo host.
+"""
+from urllib.parse import urlsplit
+
+import aiohttp
+
+DEFAULT_LIMIT = 100
+DEFAULT_LIMIT_PER_HOST = 10
+DEFAULT_DNS_TTL = 300
+DEFAULT_KEEPALIVE_TIMEOUT = 30
+
+
+class ConnectionStats:
+    """
+    Contador de conexões novas e reaproveitadas, por host.
+    """
+    def __init__(self):
+        self.created = {}
+        self.reused = {}
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """
+        Cria o TraceConfig que alimenta os contadores.
+        """
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(self._on_request_start)
+        trace.on_connection_create_end.append(self._on_create)
+        trace.on_connection_reuseconn.append(self._on_reuse)
+        return trace
+
+    async def _on_request_start(self, session, ctx, params):
+        ctx.host = params.url.host
+
+    async def _on_create(self, session, ctx, params):
+        host = getattr(ctx, 'host', None)
+        self.created[host] = self.created.get(host, 0) + 1
+
+    async def _on_reuse(self, session, ctx, params):
+        host = getattr(ctx, 'host', None)
+        self.reused[host] = self.reused.get(host, 0) + 1
+
+    def summary(self) -> str:
+        hosts = sorted(set(self.created) | set(self.reused), key=str)
+        return ', '.join(
+            f"{host}: {self.created.get(host, 0)} novas/{self.reused.get(host, 0)} reutilizadas"
+            for host in hosts
+        ) or 'nenhuma conexão'
+
+
+def create_session(stats: ConnectionStats = None, options: dict = None) -> aiohttp.ClientSession:
+    """
+    Cria uma ClientSession com TCPConnector ajustado para keep-alive,
+    cache de DNS e limite de conexões por host.
+    """
+    options = options or {}
+    connector = aiohttp.TCPConnector(
+        limit=options.get('limit', DEFAULT_LIMIT),
+        limit_per_host=options.get('limit_per_host', DEFAULT_LIMIT_PER_HOST),
+        ttl_dns_cache=options.get('ttl_dns_cache', DEFAULT_DNS_TTL),
+        keepalive_timeout=options.get('keepalive_timeout', DEFAULT_KEEPALIVE_TIMEOUT),
+    )
+    trace_configs = [stats.trace_config()] if stats else None
+    return aiohttp.ClientSession(connector=connector, trace_configs=trace_configs)
+
+
+class SessionPool:
+    """
+    Sessões compartilhadas por host entre várias conexões de sincronização.
+    """
+    def __init__(self, options: dict = None):
+        self.options = options
+        self.stats = ConnectionStats()
+        self._sessions = {}
+
+    def session_for(self, url: str) -> aiohttp.ClientSession:
+        """
+        Retorna a sessão do host da URL, criando-a na primeira chamada.
+        Deve ser chamado dentro do event loop.
+        """
+        host = urlsplit(url).netloc
+        session = self._sessions.get(host)
+        if session is None or session.closed:
+            session = create_session(self.stats, self.options)
+            self._sessions[host] = session
+        return session
+
+    async def close(self):
+        for session in self._sessions.values():
+            if not session.closed:
+                await session.close()
+        self._sessions.clear()
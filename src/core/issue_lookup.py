@@ -0,0 +1,63 @@
+"""
+Busca em lote de issues do Jira a partir dos IDs de cards do Trello.
+
+Em vez de uma consulta JQL por card, os IDs são agrupados em blocos e
+consultados com `IN (...)`, resultando em O(cards / batch_size) requisições.
+"""
+from datetime import datetime, timedelta
+
+DEFAULT_BATCH_SIZE = 50
+# Maior distância entre um fuso e o UTC (UTC+14 / UTC-12)
+MAX_UTC_OFFSET = timedelta(hours=14)
+
+
+def chunked(items, size):
+    """
+    Divide uma sequência em blocos de no máximo `size` elementos.
+    """
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def build_lookup_jql(project_key, customfield, card_ids):
+    """
+    Monta a JQL que encontra as issues ligadas a um bloco de cards.
+    """
+    ids = ', '.join(f'"{card_id}"' for card_id in card_ids)
+    return f"project={project_key} AND \"{customfield}\" IN ({ids})"
+
+
+def index_by_card(issues, customfield):
+    """
+    Constrói o dicionário card_id -> issue_key a partir das issues retornadas.
+    """
+    result = {}
+    for issue in issues:
+        card_id = issue.get('fields', {}).get(customfield)
+        if card_id and card_id not in result:
+            result[card_id] = issue['key']
+    return result
+
+
+def jql_datetime(value: str) -> str:
+    """
+    Converte um timestamp ISO para o formato de data da JQL, com precisão
+    de minuto.
+
+    A JQL lê a data no fuso do usuário do Jira, e é nesse fuso que o Jira
+    devolve o campo `updated` (p.ex. -0300): com offset explícito, o horário
+    é mantido como está, sem converter para UTC. Em UTC ('Z', como a marca
+    d'água inicial ou `--last-sync`) ou sem fuso, o fuso do usuário é
+    desconhecido e a data recua MAX_UTC_OFFSET; o que vier a mais é
+    descartado pelos snapshots.
+    """
+    utc = value.endswith('Z')
+    value = value.replace('Z', '+00:00')
+    # O Jira usa offsets sem dois-pontos (+0000)
+    if len(value) > 5 and value[-5] in '+-' and value[-3] != ':':
+        value = f'{value[:-2]}:{value[-2:]}'
+    moment = datetime.fromisoformat(value)
+    if utc or moment.tzinfo is None:
+        moment -= MAX_UTC_OFFSET
+    return moment.strftime('%Y/%m/%d %H:%M')
@@ -1,11 +1,21 @@
+import asyncio
 import aiohttp
 import logging
+from . import metrics
+from .http import ConnectionStats, create_session
+from .rate_limit import bucket_for, retry_policy
+from .issue_lookup import DEFAULT_BATCH_SIZE, build_lookup_jql, chunked, index_by_card
+from .pagination import DEFAULT_PAGE_SIZE, next_cursor, page_params
+from .subtasks import (BULK_CREATE_LIMIT, DEFAULT_SUBTASK_CONCURRENCY, SUBTASK_ISSUE_TYPE, bulk_created_keys,
+                       bulk_payload, subtask_fields)
 
 class JiraClient:
     """
     Async client for Jira REST API using aiohttp.
     """
-    def __init__(self, host: str, user: str, api_token: str):
+    def __init__(self, host: str, user: str, api_token: str,
+                 session: aiohttp.ClientSession = None, http_options: dict = None,
+                 rate_limit: dict = None):
         self.host = host
         self.user = user
         self.api_token = api_token
@@ -15,30 +25,129 @@ class JiraClient:
 
         self.auth = aiohttp.BasicAuth(self.user, self.api_token)
         self.logger = logging.getLogger(__name__)
+        self.bucket = bucket_for('jira', f'{self.host}|{self.user}', rate_limit)
+        self.retry = retry_policy(rate_limit)
+        self.http_options = http_options
+        self._session = session
+        self._owns_session = session is None
+        self.stats = ConnectionStats() if session is None else None
 
-    async def _make_request(self, method: str, endpoint: str, params: dict = None, json: dict = None) -> dict:
+    @property
+    def session(self) -> aiohttp.ClientSession:
         """
-        Faz uma requisição à API do Jira.
+        Sessão de vida longa, criada sob demanda dentro do event loop.
+        """
+        if self._session is None or self._session.closed:
+            self._session = create_session(self.stats, self.http_options)
+            self._owns_session = True
+        return self._session
+
+    async def close(self):
+        """
+        Fecha a sessão, se ela pertencer a este cliente.
+        """
+        if self._owns_session and self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _make_request(self, method: str, endpoint: str, params: dict = None, json: dict = None,
+                            form=None, headers: dict = None) -> dict:
+        """
+        Faz uma requisição à API do Jira. `form` monta um corpo multipart
+        novo a cada tentativa, já que o corpo é consumido no envio.
         """
         url = f'{self.host}/rest/api/2/{endpoint}'
 
         try:
-            async with aiohttp.ClientSession(auth=self.auth) as session:
-                async with session.request(method, url, params=params, json=json) as resp:
-                    resp.raise_for_status()
-                    return await resp.json()
+            attempt = 0
+            while True:
+                wait = await self.bucket.acquire()
+                metrics.observe_rate_limit_wait('jira', wait)
+                timer = metrics.RequestTimer('jira', method, url)
+                try:
+                    async with self.session.request(method, url, params=params, json=json, auth=self.auth,
+                                                    data=form() if form else None, headers=headers) as resp:
+                        timer.done(resp.status)
+                        self.bucket.observe(resp.headers)
+                        if self.retry.should_retry(method, resp.status, attempt, resp.headers):
+                            delay = self.retry.delay(attempt, resp.headers)
+                            self.logger.warning(f"Jira respondeu {resp.status}, nova tentativa em {delay:.1f}s")
+                            self.bucket.pause(delay)
+                            attempt += 1
+                            continue
+                        resp.raise_for_status()
+                        # PUT em issue responde 204 sem corpo
+                        if resp.status == 204:
+                            return {}
+                        return await resp.json()
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                    timer.done('error')
+                    raise
         except aiohttp.ClientError as e:
             self.logger.error(f"Erro na requisição ao Jira: {str(e)}")
             raise
 
-    async def search_issues(self, jql: str):
+    async def search_issues(self, jql: str, fields: list = None, max_results: int = DEFAULT_PAGE_SIZE):
+        """
+        Busca todas as issues de uma JQL, percorrendo todas as páginas.
+        """
+        issues = []
+        async for page in self.iter_issue_pages(jql, fields=fields, page_size=max_results):
+            issues.extend(page)
+        return issues
+
+    async def iter_issue_pages(self, jql: str, fields: list = None, page_size: int = DEFAULT_PAGE_SIZE):
         """
-        Busca issues usando JQL.
+        Gerador assíncrono das páginas de uma busca JQL. Apenas os `fields`
+        informados são pedidos, e a próxima página é buscada enquanto a
+        atual é processada.
         """
         self.logger.info(f"Buscando issues com JQL: {jql}")
-        params = {'jql': jql}
-        data = await self._make_request('GET', 'search', params=params)
-        return data.get('issues', [])
+        cursor = {'startAt': 0}
+        pending = asyncio.ensure_future(self._make_request('GET', 'search', params=page_params(jql, fields, page_size, cursor)))
+        try:
+            while pending is not None:
+                data = await pending
+                cursor = next_cursor(data, cursor)
+                pending = None
+                if cursor is not None:
+                    pending = asyncio.ensure_future(
+                        self._make_request('GET', 'search', params=page_params(jql, fields, page_size, cursor))
+                    )
+                issues = data.get('issues', [])
+                if issues:
+                    yield issues
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+    async def get_issue(self, issue_key: str, fields: list = None):
+        """
+        Obtém uma única issue, apenas com os campos informados.
+        """
+        params = {'fields': ','.join(fields)} if fields else None
+        return await self._make_request('GET', f'issue/{issue_key}', params=params)
+
+    async def find_issues_by_trello_ids(self, project_key: str, customfield: str, card_ids: list,
+                                        batch_size: int = DEFAULT_BATCH_SIZE) -> dict:
+        """
+        Busca em lote as issues ligadas aos cards informados.
+        Retorna um dicionário card_id -> issue_key.
+        """
+        batches = [
+            self.search_issues(build_lookup_jql(project_key, customfield, batch),
+                               fields=[customfield], max_results=batch_size)
+            for batch in chunked(card_ids, batch_size)
+        ]
+        found = {}
+        for issues in await asyncio.gather(*batches):
+            found.update(index_by_card(issues, customfield))
+        return found
 
     async def create_or_update_issue(self, issue_key: str, fields: dict):
         """
@@ -71,3 +180,78 @@ class JiraClient:
         url = f'issue/{issue_key}/comment'
         data = await self._make_request('GET', url)
         return data.get('comments', [])
+
+    async def create_subtask(self, parent_key: str, summary: str, description: str = '',
+                             duedate: str = None, issue_type: str = SUBTASK_ISSUE_TYPE):
+        """
+        Cria uma subtarefa na issue informada.
+        """
+        self.logger.info(f"Criando subtarefa na issue {parent_key}")
+        fields = subtask_fields(parent_key, summary, description, duedate, issue_type)
+        return await self._make_request('POST', 'issue', json={'fields': fields})
+
+    async def create_subtasks(self, parent_key: str, summaries: list, duedate: str = None,
+                              issue_type: str = SUBTASK_ISSUE_TYPE,
+                              concurrency: int = DEFAULT_SUBTASK_CONCURRENCY, on_created=None) -> list:
+        """
+        Cria várias subtarefas pela criação em lote, até 50 por requisição.
+        Se o lote for recusado, ou para os elementos que falharem nele, as
+        subtarefas são criadas uma a uma, com no máximo `concurrency` ao mesmo
+        tempo. Retorna as chaves na mesma ordem de `summaries`.
+
+        `on_created` recebe pares (índice em `summaries`, chave) assim que
+        cada lote ou criação avulsa termina, para que o que já foi criado seja
+        registrado mesmo que uma criação seguinte falhe.
+        """
+        self.logger.info(f"Criando {len(summaries)} subtarefas na issue {parent_key}")
+        semaphore = asyncio.Semaphore(concurrency)
+        keys = []
+        for batch in chunked(summaries, BULK_CREATE_LIMIT):
+            offset = len(keys)
+            fields = [subtask_fields(parent_key, summary, duedate=duedate, issue_type=issue_type) for summary in batch]
+            try:
+                data = await self._make_request('POST', 'issue/bulk', json=bulk_payload(fields))
+                batch_keys = bulk_created_keys(len(batch), data)
+            except aiohttp.ClientResponseError as e:
+                self.logger.warning(f"Criação em lote recusada ({e.status}), criando subtarefas uma a uma")
+                batch_keys = [None] * len(batch)
+            if on_created:
+                on_created([(offset + index, key) for index, key in enumerate(batch_keys) if key is not None])
+
+            async def create_one(index):
+                async with semaphore:
+                    result = await self.create_subtask(parent_key, batch[index], duedate=duedate, issue_type=issue_type)
+                batch_keys[index] = result['key']
+                if on_created:
+                    on_created([(offset + index, result['key'])])
+
+            # Todas as criações terminam antes de propagar a primeira falha
+            results = await asyncio.gather(
+                *(create_one(index) for index, key in enumerate(batch_keys) if key is None), return_exceptions=True
+            )
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+            keys.extend(batch_keys)
+        return keys
+
+    async def add_attachment(self, issue_key: str, path: str, filename: str, content_type: str) -> list:
+        """
+        Anexa um arquivo à issue, enviado do disco em blocos.
+        """
+        self.logger.info(f"Anexando {filename} à issue {issue_key}")
+
+        def form():
+            data = aiohttp.FormData()
+            data.add_field('file', open(path, 'rb'), filename=filename, content_type=content_type)
+            return data
+
+        return await self._make_request('POST', f'issue/{issue_key}/attachments', form=form,
+                                        headers={'X-Atlassian-Token': 'no-check'})
+
+    async def get_subtasks(self, issue_key: str) -> list:
+        """
+        Subtarefas da issue, como vêm no campo `subtasks`.
+        """
+        data = await self.get_issue(issue_key, ['subtasks'])
+        return data.get('fields', {}).get('subtasks', [])
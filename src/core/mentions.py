@@ -0,0 +1,61 @@
+"""
+Tradução de menções (@usuário) entre Trello e Jira.
+
+O mapeamento `jira.user_mapping` vira uma única expressão regular com todos
+os nomes, do mais longo para o mais curto, e cada texto é traduzido em uma
+só passada, em tempo linear no tamanho do texto. A menção só casa com o
+nome inteiro: `@ana` não altera `@anabela`, e o texto já traduzido não é
+traduzido de novo.
+"""
+import re
+from functools import lru_cache
+
+# Caracteres que podem continuar um nome de usuário; um ponto só conta se
+# vier seguido de outro caractere do nome (`@ana.` no fim da frase casa)
+NAME_END = r'(?![\w-]|\.\w)'
+
+
+class MentionTranslator:
+    """
+    Tradutor de menções para um mapeamento origem -> destino.
+    """
+    def __init__(self, mapping: dict):
+        self.mapping = dict(mapping)
+        self._inverse = None
+        if self.mapping:
+            names = sorted(self.mapping, key=len, reverse=True)
+            alternation = '|'.join(re.escape(name) for name in names)
+            self.pattern = re.compile(rf'(?<![\w@])@({alternation}){NAME_END}')
+        else:
+            self.pattern = None
+
+    def translate(self, text: str) -> str:
+        if not text or self.pattern is None:
+            return text
+        return self.pattern.sub(self._replace, text)
+
+    def _replace(self, match) -> str:
+        return f'@{self.mapping[match.group(1)]}'
+
+    @property
+    def inverse(self) -> 'MentionTranslator':
+        """
+        Tradutor da direção oposta, criado uma única vez.
+        """
+        if self._inverse is None:
+            self._inverse = MentionTranslator({target: source for source, target in self.mapping.items()})
+            self._inverse._inverse = self
+        return self._inverse
+
+
+@lru_cache(maxsize=64)
+def _cached_translator(items: tuple) -> MentionTranslator:
+    return MentionTranslator(dict(items))
+
+
+def translator_for(mapping: dict) -> MentionTranslator:
+    """
+    Tradutor Trello -> Jira do mapeamento, reaproveitado entre execuções
+    com o mesmo mapeamento.
+    """
+    return _cached_translator(tuple(sorted((mapping or {}).items())))
@@ -0,0 +1,190 @@
+"""
+Métricas Prometheus da sincronização.
+
+Os clientes registram cada requisição (API, modelo do endpoint e status) e o
+tempo de espera no rate limit; o motor registra o tempo de cada fase e os
+itens de cada conexão. O daemon expõe as métricas por HTTP e as execuções
+avulsas as enviam ao Pushgateway, quando `PROMETHEUS_PUSHGATEWAY` está definido.
+"""
+import logging
+import os
+import re
+import time
+from urllib.parse import urlsplit
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest,
+                               push_to_gateway, start_http_server)
+
+logger = logging.getLogger(__name__)
+
+PUSHGATEWAY_ENV = 'PROMETHEUS_PUSHGATEWAY'
+PUSH_JOB = 'trello_jira_sync'
+DEFAULT_METRICS_PORT = 9108
+
+FETCH = 'fetch'
+LOOKUP = 'lookup'
+CONVERT = 'convert'
+WRITE = 'write'
+COMMENTS = 'comments'
+
+REQUESTS = Counter(
+    'trello_jira_sync_http_requests_total', 'Requisições HTTP às APIs',
+    ['api', 'method', 'endpoint', 'status'],
+)
+REQUEST_SECONDS = Histogram(
+    'trello_jira_sync_http_request_duration_seconds', 'Duração das requisições HTTP às APIs',
+    ['api', 'method', 'endpoint', 'status'],
+)
+RATE_LIMIT_WAIT_SECONDS = Counter(
+    'trello_jira_sync_rate_limit_wait_seconds_total', 'Tempo de espera no rate limit antes das requisições',
+    ['api'],
+)
+PHASE_SECONDS = Histogram(
+    'trello_jira_sync_phase_duration_seconds', 'Duração de cada fase da sincronização',
+    ['connection', 'phase'],
+)
+ITEMS = Counter(
+    'trello_jira_sync_items_total', 'Cards e issues sincronizados, por resultado',
+    ['connection', 'result'],
+)
+LAST_SUCCESS = Gauge(
+    'trello_jira_sync_last_success_timestamp_seconds', 'Horário da última sincronização concluída sem falhas',
+    ['connection'],
+)
+
+# IDs do Trello (24 hex), chaves de issue (PROJ-123) e IDs numéricos viram
+# marcadores, para que o endpoint tenha cardinalidade baixa
+ID_PATTERNS = (
+    (re.compile(r'^[0-9a-f]{24}$'), '{id}'),
+    (re.compile(r'^[A-Z][A-Z0-9_]*-\d+$'), '{key}'),
+    (re.compile(r'^\d+$'), '{id}'),
+)
+# Segmentos após os quais vem a versão da API (/rest/api/2/ do Jira); a do
+# Trello (/1/) é sempre o primeiro segmento
+VERSION_PREFIXES = ('api',)
+# Nome do arquivo no download de anexos do Trello (.../download/{name})
+FILENAME_PREFIXES = ('download',)
+
+
+def endpoint_template(url: str) -> str:
+    """
+    Caminho da URL com os identificadores trocados por marcadores,
+    p.ex. /rest/api/2/issue/PROJ-1/comment -> /rest/api/2/issue/{key}/comment.
+    """
+    segments = urlsplit(url).path.split('/')
+    template = segments[:2]
+    for previous, segment in zip(segments[1:], segments[2:]):
+        if previous in FILENAME_PREFIXES:
+            segment = '{name}'
+        elif previous not in VERSION_PREFIXES:
+            for pattern, placeholder in ID_PATTERNS:
+                if pattern.match(segment):
+                    segment = placeholder
+                    break
+        template.append(segment)
+    return '/'.join(template)
+
+
+def observe_request(api: str, method: str, url: str, status, seconds: float):
+    """
+    Registra uma requisição; `status` é o código HTTP ou 'error' sem resposta.
+    """
+    labels = (api, method, endpoint_template(url), str(status))
+    REQUESTS.labels(*labels).inc()
+    REQUEST_SECONDS.labels(*labels).observe(seconds)
+
+
+def request_counts() -> dict:
+    """
+    Requisições registradas até agora por (api, método, endpoint), somando
+    todos os status.
+    """
+    counts = {}
+    for metric in REQUESTS.collect():
+        for sample in metric.samples:
+            if sample.name.endswith('_total'):
+                key = (sample.labels['api'], sample.labels['method'], sample.labels['endpoint'])
+                counts[key] = counts.get(key, 0) + sample.value
+    return counts
+
+
+def observe_rate_limit_wait(api: str, seconds: float):
+    if seconds > 0:
+        RATE_LIMIT_WAIT_SECONDS.labels(api).inc(seconds)
+
+
+def phase(connection: str, name: str):
+    """
+    Context manager que mede uma fase: `with phase(conn, WRITE): ...`.
+    """
+    return PHASE_SECONDS.labels(connection, name).time()
+
+
+async def timed_pages(pages, connection: str):
+    """
+    Repassa as páginas de um gerador assíncrono, medindo a espera por cada
+    uma como fase de busca.
+    """
+    iterator = pages.__aiter__()
+    while True:
+        with phase(connection, FETCH):
+            try:
+                page = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+        yield page
+
+
+class RequestTimer:
+    """
+    Mede uma requisição do início até `done(status)`.
+    """
+    def __init__(self, api: str, method: str, url: str):
+        self.api = api
+        self.method = method
+        self.url = url
+        self.started = time.perf_counter()
+
+    def done(self, status):
+        observe_request(self.api, self.method, self.url, status, time.perf_counter() - self.started)
+
+
+def record_run(connection: str, report, success: bool):
+    """
+    Soma os itens de uma execução e marca o horário do último sucesso.
+    """
+    ITEMS.labels(connection, 'processed').inc(report.processed)
+    ITEMS.labels(connection, 'skipped').inc(report.skipped)
+    ITEMS.labels(connection, 'failed').inc(report.failed)
+    if success:
+        LAST_SUCCESS.labels(connection).set_to_current_time()
+
+
+def serve(port: int = DEFAULT_METRICS_PORT, addr: str = '0.0.0.0'):
+    """
+    Expõe /metrics por HTTP em segundo plano (modo daemon).
+    """
+    start_http_server(port, addr=addr)
+    logger.info(f"Métricas expostas em http://{addr}:{port}/metrics")
+
+
+def exposition():
+    """
+    Corpo e content type da página /metrics, para servidores que já têm HTTP.
+    """
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def push(grouping: dict = None):
+    """
+    Envia as métricas ao Pushgateway de `PROMETHEUS_PUSHGATEWAY`, se definido.
+    Falhas no envio apenas geram log, sem afetar a sincronização.
+    """
+    gateway = os.getenv(PUSHGATEWAY_ENV)
+    if not gateway:
+        return
+    try:
+        push_to_gateway(gateway, job=PUSH_JOB, registry=REGISTRY, grouping_key=grouping or {})
+        logger.info(f"Métricas enviadas ao Pushgateway {gateway}")
+    except Exception as e:
+        logger.warning(f"Falha ao enviar métricas ao Pushgateway: {str(e)}")
@@ -0,0 +1,94 @@
+"""
+Fila de escritas de uma execução (outbox).
+
+A conversão enfileira as mutações em vez de chamar os clientes diretamente.
+As mutações são agrupadas por item de destino: atualizações de campos do
+mesmo card ou issue viram um único PUT, seguido dos comentários na ordem em
+que foram enfileirados. Campos que a direção oposta acabou de escrever no
+item de origem não são devolvidos a ele, pois apenas desfariam a escrita.
+
+Criações não passam pela fila, já que a chave criada é necessária para o
+restante do item. A fila é esvaziada ao fim de cada lote, antes do
+checkpoint, e cada motor executa as escritas com a sua própria concorrência.
+"""
+from .change_detection import JIRA_KEYS, TRELLO_KEYS, select_fields
+from .store import JIRA_SIDE, TRELLO_SIDE
+
+PAYLOAD_KEYS = {TRELLO_SIDE: TRELLO_KEYS, JIRA_SIDE: JIRA_KEYS}
+
+
+class Pending:
+    """
+    Escritas acumuladas para um item: campos (já no formato do destino),
+    comentários e as ações a executar quando cada escrita conclui.
+    """
+    def __init__(self, side: str, item_id: str):
+        self.side = side
+        self.item_id = item_id
+        self.payload = {}
+        self.on_update = []
+        self.comments = []
+
+
+class Outbox:
+    """
+    Mutações pendentes por (lado, item), mais os campos canônicos já
+    escritos em cada item durante a execução. Com `report`, PUTs unidos e
+    atualizações descartadas contam como escritas evitadas.
+    """
+    def __init__(self, report=None):
+        self.report = report
+        self.pending = {}
+        self.written = {}
+
+    def _avoided(self):
+        if self.report is not None:
+            self.report.writes_avoided += 1
+
+    def _entry(self, side: str, item_id: str) -> Pending:
+        entry = self.pending.get((side, item_id))
+        if entry is None:
+            entry = self.pending[(side, item_id)] = Pending(side, item_id)
+        return entry
+
+    def mark_written(self, side: str, item_id: str, fields):
+        """
+        Registra campos escritos fora da fila (p.ex. na criação do item).
+        """
+        self.written.setdefault((side, item_id), set()).update(fields)
+
+    def update(self, side: str, item_id: str, payload: dict, fields, source: tuple = None, on_done=None) -> list:
+        """
+        Enfileira a atualização dos campos canônicos `fields` do item, cujo
+        `payload` já está no formato do destino. `source` é o (lado, item) de
+        onde vieram os valores; campos escritos nele nesta execução são
+        descartados. Retorna os campos mantidos; `on_done(mantidos)` é chamado
+        após o PUT.
+        """
+        echoed = self.written.get(source, set()) if source else set()
+        kept = [field for field in fields if field not in echoed]
+        if not kept:
+            self._avoided()
+            return kept
+        entry = self._entry(side, item_id)
+        if entry.payload:
+            self._avoided()
+        entry.payload.update(select_fields(payload, kept, PAYLOAD_KEYS[side]))
+        if on_done is not None:
+            entry.on_update.append(lambda: on_done(kept))
+        self.mark_written(side, item_id, kept)
+        return kept
+
+    def comment(self, side: str, item_id: str, text: str, on_done=None):
+        """
+        Enfileira um comentário; `on_done(resposta)` recebe o comentário criado.
+        """
+        self._entry(side, item_id).comments.append((text, on_done))
+
+    def drain(self) -> list:
+        """
+        Retira e retorna as escritas pendentes, uma entrada por item.
+        """
+        entries = list(self.pending.values())
+        self.pending = {}
+        return entries
@@ -0,0 +1,33 @@
+"""
+Paginação da busca de issues do Jira.
+
+Suporta tanto a paginação clássica (`startAt`/`total`) de `/search` quanto
+a paginação por `nextPageToken` das versões mais novas da API.
+"""
+
+DEFAULT_PAGE_SIZE = 100
+
+
+def page_params(jql: str, fields, page_size: int, cursor: dict) -> dict:
+    """
+    Parâmetros da requisição de uma página.
+    """
+    params = {'jql': jql, 'maxResults': page_size, **cursor}
+    if fields:
+        params['fields'] = ','.join(fields)
+    return params
+
+
+def next_cursor(data: dict, cursor: dict):
+    """
+    Cursor da próxima página, ou None quando a página atual é a última.
+    """
+    issues = data.get('issues', [])
+    if 'nextPageToken' in data or 'isLast' in data:
+        if data.get('isLast', True) or not data.get('nextPageToken'):
+            return None
+        return {'nextPageToken': data['nextPageToken']}
+    start_at = cursor.get('startAt', 0) + len(issues)
+    if not issues or start_at >= data.get('total', 0):
+        return None
+    return {'startAt': start_at}
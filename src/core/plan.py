@@ -0,0 +1,163 @@
+"""
+Plano de uma execução (modo de simulação).
+
+Com um plano, os motores buscam e comparam o estado como em uma execução
+normal, mas nenhuma chamada de escrita é feita: criações, atualizações,
+comentários, subtarefas e anexos viram ações do plano, e o banco de estado
+é uma cópia em memória descartada no fim. Como a comparação é a mesma das
+execuções reais, o plano mostra também o custo da execução: as requisições
+de leitura feitas, as de escrita projetadas e o tempo mínimo que todas
+levariam no rate limit configurado, por API, endpoint e campo.
+"""
+import math
+from collections import Counter
+
+from . import metrics
+from .issue_lookup import chunked
+from .outbox import PAYLOAD_KEYS
+from .rate_limit import DEFAULT_LIMITS
+from .store import JIRA_SIDE, TRELLO_SIDE
+from .subtasks import BULK_CREATE_LIMIT
+
+# Prefixo das chaves provisórias das issues que seriam criadas
+PLACEHOLDER_PREFIX = 'PLAN-'
+
+# Requisições projetadas, no mesmo formato de endpoint das métricas
+JIRA_CREATE = ('jira', 'POST', '/rest/api/2/issue')
+JIRA_BULK_CREATE = ('jira', 'POST', '/rest/api/2/issue/bulk')
+JIRA_ATTACH = ('jira', 'POST', '/rest/api/2/issue/{key}/attachments')
+TRELLO_DOWNLOAD = ('trello', 'GET', '/1/cards/{id}/attachments/{id}/download/{name}')
+UPDATE = {
+    JIRA_SIDE: ('jira', 'PUT', '/rest/api/2/issue/{key}'),
+    TRELLO_SIDE: ('trello', 'PUT', '/1/cards/{id}'),
+}
+COMMENT = {
+    JIRA_SIDE: ('jira', 'POST', '/rest/api/2/issue/{key}/comment'),
+    TRELLO_SIDE: ('trello', 'POST', '/1/cards/{id}/actions/comments'),
+}
+
+
+class SyncPlan:
+    """
+    Ações e requisições projetadas de uma execução em modo de simulação.
+    `rate_limits` são as opções `rate_limit` de cada API na configuração.
+
+    As leituras são contadas pelas métricas de requisições do processo, a
+    partir da criação do plano.
+    """
+    def __init__(self, name: str, rate_limits: dict = None):
+        self.name = name
+        self.rate_limits = rate_limits or {}
+        self.actions = []
+        self.projected = Counter()
+        self.fields = Counter()
+        self.placeholders = 0
+        self.reads_before = metrics.request_counts()
+
+    def _add(self, request: tuple, action: dict, count: int = 1):
+        self.actions.append(action)
+        self.projected[request] += count
+
+    def create_issue(self, card_id: str, fields) -> str:
+        """
+        Planeja a criação da issue do card com os campos canônicos `fields` e
+        retorna a chave provisória usada no restante do item.
+        """
+        self.placeholders += 1
+        issue_key = f'{PLACEHOLDER_PREFIX}{self.placeholders}'
+        fields = sorted(fields)
+        self.fields.update(fields)
+        self._add(JIRA_CREATE, {
+            'action': 'create', 'side': JIRA_SIDE, 'target': issue_key, 'source': card_id, 'fields': fields,
+        })
+        return issue_key
+
+    def record(self, entries):
+        """
+        Planeja as escritas drenadas da outbox: um PUT por item com campos e
+        um POST por comentário. Os callbacks rodam como após uma escrita real,
+        sobre o banco em memória, para que o restante da execução veja o mesmo
+        estado.
+        """
+        for entry in entries:
+            if entry.payload:
+                canonical = {key: field for field, key in PAYLOAD_KEYS[entry.side].items()}
+                fields = sorted(canonical[key] for key in entry.payload)
+                self.fields.update(fields)
+                self._add(UPDATE[entry.side], {
+                    'action': 'update', 'side': entry.side, 'target': entry.item_id, 'fields': fields,
+                })
+                for done in entry.on_update:
+                    done()
+            for text, done in entry.comments:
+                self._add(COMMENT[entry.side], {
+                    'action': 'comment', 'side': entry.side, 'target': entry.item_id, 'chars': len(text),
+                })
+                if done is not None:
+                    done({})
+
+    def subtasks(self, parent_key: str, to_create, to_rename):
+        """
+        Planeja as subtarefas novas (criação em lote) e as renomeadas.
+        """
+        if to_create:
+            self._add(JIRA_BULK_CREATE, {
+                'action': 'create_subtasks', 'side': JIRA_SIDE, 'target': parent_key, 'count': len(to_create),
+            }, count=len(list(chunked(to_create, BULK_CREATE_LIMIT))))
+        for _, subtask_key, _ in to_rename:
+            self._add(UPDATE[JIRA_SIDE], {
+                'action': 'update', 'side': JIRA_SIDE, 'target': subtask_key, 'fields': ['title'],
+            })
+
+    def attachments(self, issue_key: str, uploads) -> int:
+        """
+        Planeja os anexos a enviar, dados como pares (anexo, precisa baixar).
+        """
+        for attachment, download in uploads:
+            if download:
+                self.projected[TRELLO_DOWNLOAD] += 1
+            self._add(JIRA_ATTACH, {
+                'action': 'attach', 'side': JIRA_SIDE, 'target': issue_key,
+                'name': attachment.get('name'), 'bytes': attachment.get('bytes'), 'download': download,
+            })
+        return len(uploads)
+
+    def requests(self) -> dict:
+        """
+        Requisições por API: as feitas durante o plano (leituras), as
+        projetadas (escritas e downloads) e o tempo mínimo para fazer todas
+        no rate limit configurado.
+        """
+        made = Counter(metrics.request_counts())
+        made.subtract(self.reads_before)
+        result = {}
+        for api in DEFAULT_LIMITS:
+            endpoints = {}
+            for counts, kind in ((made, 'made'), (self.projected, 'projected')):
+                for (request_api, method, endpoint), count in counts.items():
+                    if request_api == api and count > 0:
+                        endpoints.setdefault(f'{method} {endpoint}', {'made': 0, 'projected': 0})[kind] += int(count)
+            made_total = sum(counts['made'] for counts in endpoints.values())
+            projected_total = sum(counts['projected'] for counts in endpoints.values())
+            options = {**DEFAULT_LIMITS[api], **(self.rate_limits.get(api) or {})}
+            total = made_total + projected_total
+            result[api] = {
+                'made': made_total,
+                'projected': projected_total,
+                'total': total,
+                'rate': options['rate'],
+                'burst': options['burst'],
+                # O bucket começa cheio: o excedente à rajada sai a `rate` por segundo
+                'min_seconds': math.ceil(max(0, total - options['burst']) / options['rate']),
+                'endpoints': dict(sorted(endpoints.items(), key=lambda item: -sum(item[1].values()))),
+            }
+        return result
+
+    def to_dict(self) -> dict:
+        return {
+            'connection': self.name,
+            'summary': dict(Counter(action['action'] for action in self.actions)),
+            'fields': dict(self.fields.most_common()),
+            'requests': self.requests(),
+            'actions': self.actions,
+        }
@@ -0,0 +1,191 @@
+"""
+Controle de taxa compartilhado para as APIs do Trello e do Jira.
+
+Cada API + credencial tem um único token bucket no processo, usado como
+limitador global por todas as tarefas concorrentes. Respostas 429/5xx são
+repetidas com backoff exponencial com jitter, respeitando `Retry-After` e
+os cabeçalhos `X-RateLimit-*`.
+
+Escritas não idempotentes (POST) só são repetidas quando a API garante que
+nada foi feito: 429, ou 503 com `Retry-After`. Um 502/504 do gateway pode
+chegar depois de a issue, o comentário ou o anexo já terem sido criados, e
+repeti-los criaria duplicatas.
+"""
+import asyncio
+import hashlib
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+RETRY_STATUSES = {429, 502, 503, 504}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+# Trello: 100 requisições / 10s por token. Jira Cloud não publica um número
+# fixo, então usamos um valor conservador.
+DEFAULT_LIMITS = {
+    'trello': {'rate': 10.0, 'burst': 10},
+    'jira': {'rate': 10.0, 'burst': 10},
+}
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF_BASE = 1.0
+DEFAULT_BACKOFF_CAP = 60.0
+
+
+class TokenBucket:
+    """
+    Token bucket por reserva: cada chamada reserva um token e recebe o tempo
+    que deve esperar, o que o torna seguro entre threads e tarefas asyncio.
+    """
+    def __init__(self, rate: float, burst: int):
+        self.rate = float(rate)
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Reserva um token e retorna quantos segundos esperar antes de usá-lo.
+        """
+        with self._lock:
+            now = time.monotonic()
+            # Durante uma pausa `updated` aponta para o fim dela: nada é reposto antes
+            if now > self.updated:
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+            self.tokens -= 1
+            deficit = -self.tokens if self.tokens < 0 else 0.0
+            return max(0.0, self.paused_until - now) + deficit / self.rate
+
+    def pause(self, seconds: float):
+        """
+        Suspende todas as requisições desta credencial pelo tempo informado.
+        O bucket fica vazio e só volta a encher no fim da pausa, de modo que
+        as requisições acumuladas saem na taxa configurada, e não de uma vez.
+        """
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = min(self.tokens, 0.0)
+            self.updated = max(self.updated, self.paused_until)
+
+    def observe(self, headers):
+        """
+        Pausa o bucket quando a API avisa que a cota acabou.
+        """
+        pause = exhausted_pause(headers)
+        if pause:
+            self.pause(pause)
+
+    async def acquire(self) -> float:
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def acquire_blocking(self) -> float:
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class RetryPolicy:
+    """
+    Política de novas tentativas com backoff exponencial e jitter completo.
+    """
+    def __init__(self, max_retries: int = DEFAULT_MAX_RETRIES, base: float = DEFAULT_BACKOFF_BASE,
+                 cap: float = DEFAULT_BACKOFF_CAP):
+        self.max_retries = max_retries
+        self.base = base
+        self.cap = cap
+
+    def should_retry(self, method: str, status: int, attempt: int, headers=None) -> bool:
+        if status not in RETRY_STATUSES or attempt >= self.max_retries:
+            return False
+        if method.upper() in IDEMPOTENT_METHODS or status == 429:
+            return True
+        return status == 503 and parse_retry_after(headers or {}) is not None
+
+    def delay(self, attempt: int, headers) -> float:
+        retry_after = parse_retry_after(headers)
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def bucket_for(api: str, credential: str, options: dict = None) -> TokenBucket:
+    """
+    Retorna o bucket único da API + credencial, criando-o na primeira chamada.
+    """
+    options = {**DEFAULT_LIMITS[api], **(options or {})}
+    key = (api, hashlib.sha256((credential or '').encode()).hexdigest())
+    with _buckets_lock:
+        if key not in _buckets:
+            _buckets[key] = TokenBucket(options['rate'], options['burst'])
+        return _buckets[key]
+
+
+def retry_policy(options: dict = None) -> RetryPolicy:
+    options = options or {}
+    return RetryPolicy(
+        max_retries=options.get('max_retries', DEFAULT_MAX_RETRIES),
+        base=options.get('backoff_base', DEFAULT_BACKOFF_BASE),
+        cap=options.get('backoff_cap', DEFAULT_BACKOFF_CAP),
+    )
+
+
+def parse_retry_after(headers):
+    """
+    Interpreta o cabeçalho Retry-After (segundos ou data HTTP).
+    """
+    value = headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def exhausted_pause(headers) -> float:
+    """
+    Retorna por quanto tempo pausar quando algum cabeçalho de cota restante
+    (`X-RateLimit-Remaining`, `x-rate-limit-api-token-remaining`, ...) chega a zero.
+    """
+    exhausted = False
+    for name, value in headers.items():
+        lower = name.lower()
+        if ('ratelimit' in lower or 'rate-limit' in lower) and lower.endswith('remaining'):
+            try:
+                exhausted = exhausted or int(value) <= 0
+            except ValueError:
+                continue
+    if not exhausted:
+        return 0.0
+
+    reset = headers.get('X-RateLimit-Reset')
+    if reset:
+        try:
+            when = datetime.fromisoformat(reset.replace('Z', '+00:00'))
+            return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+        except ValueError:
+            pass
+    for name, value in headers.items():
+        if name.lower().endswith('interval-ms'):
+            try:
+                return int(value) / 1000
+            except ValueError:
+                continue
+    return 1.0
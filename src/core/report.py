@@ -0,0 +1,41 @@
+"""
+Resumo de uma execução de sincronização.
+"""
+import math
+
+
+class SyncReport:
+    """
+    Contadores de itens e escritas de uma execução.
+    """
+    def __init__(self):
+        self.processed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.writes = 0
+        self.writes_avoided = 0
+        self.latencies = []
+
+    def observe(self, seconds: float):
+        """
+        Registra o tempo gasto para sincronizar um item.
+        """
+        self.latencies.append(seconds)
+
+    def percentile(self, p: float) -> float:
+        """
+        Latência por item no percentil `p` (0-100), pelo método nearest-rank.
+        """
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+    def summary(self) -> str:
+        text = (
+            f"{self.processed} itens processados, {self.skipped} ignorados, {self.failed} com falha; "
+            f"{self.writes} escritas, {self.writes_avoided} evitadas"
+        )
+        if self.latencies:
+            text += f"; latência por item p50 {self.percentile(50) * 1000:.0f}ms, p99 {self.percentile(99) * 1000:.0f}ms"
+        return text
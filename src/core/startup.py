@@ -0,0 +1,57 @@
+"""
+Perfil de inicialização dos processos de curta duração.
+
+Cada job da matriz e cada execução do cron é um processo novo; quando há
+pouco ou nada a sincronizar, importar as dependências e carregar a
+configuração é a maior parte da execução. O perfil mede essas etapas (e a
+sincronização, para comparação) e as registra no log com `--profile-startup`.
+Só usa a biblioteca padrão, para poder ser importado antes de tudo.
+"""
+import importlib
+import logging
+import sys
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class StartupProfile:
+    """
+    Tempos das etapas de inicialização, na ordem em que aconteceram.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.steps = []
+
+    @contextmanager
+    def step(self, name: str):
+        """
+        Mede o bloco como uma etapa. O dicionário devolvido aceita um
+        `detail`, mostrado ao lado do tempo (p.ex. de onde veio a configuração).
+        """
+        entry = {'name': name, 'detail': None}
+        started = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            entry['seconds'] = time.perf_counter() - started
+            self.steps.append(entry)
+
+    def imports(self, *modules: str):
+        """
+        Importa os módulos em ordem, medindo cada um. O tempo de cada módulo
+        não inclui o que os anteriores já importaram.
+        """
+        for module in modules:
+            with self.step(f'import {module}') as entry:
+                if module in sys.modules:
+                    entry['detail'] = 'já importado'
+                importlib.import_module(module)
+
+    def log(self):
+        for entry in self.steps:
+            detail = f" ({entry['detail']})" if entry['detail'] else ''
+            logger.info(f"Inicialização: {entry['name']}: {entry['seconds'] * 1000:.0f} ms{detail}")
+        logger.info(f"Inicialização: total desde o início do perfil: "
+                    f"{(time.perf_counter() - self.started) * 1000:.0f} ms")
@@ -0,0 +1,417 @@
+"""
+Armazenamento local (SQLite) do estado de sincronização.
+
+O arquivo fica ao lado do `state.json` e guarda o vínculo card <-> issue,
+evitando redescobrir via JQL, a cada execução, o que já é conhecido, e o
+registro dos comentários já espelhados em cada direção, os snapshots dos
+últimos valores sincronizados de cada campo, as subtarefas criadas a partir
+de itens de checklist, os anexos já copiados para o Jira e as marcas d'água
+(watermarks) de cada conexão, com a posição da passada do Trello em
+andamento. Cada gravação é um commit do SQLite em modo WAL, de modo que uma
+execução interrompida retoma do último checkpoint.
+"""
+import hashlib
+import json
+import os
+import pathlib
+import sqlite3
+import time
+
+DEFAULT_LINK_MAX_AGE = 24 * 60 * 60
+EPOCH = '1970-01-01T00:00:00Z'
+
+TRELLO_TO_JIRA = 'trello_to_jira'
+JIRA_TO_TRELLO = 'jira_to_trello'
+REVERSE_DIRECTION = {TRELLO_TO_JIRA: JIRA_TO_TRELLO, JIRA_TO_TRELLO: TRELLO_TO_JIRA}
+
+TRELLO_SIDE = 'trello'
+JIRA_SIDE = 'jira'
+
+
+def content_hash(text) -> str:
+    return hashlib.sha256((text or '').encode('utf-8')).hexdigest()
+
+
+def value_hash(value) -> str:
+    return content_hash(json.dumps(value, sort_keys=True))
+
+
+class LinkIndex:
+    """
+    Índice persistente card do Trello <-> issue do Jira.
+    """
+    def __init__(self, conn: sqlite3.Connection, max_age: float = DEFAULT_LINK_MAX_AGE):
+        self.conn = conn
+        self.max_age = max_age
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS links ('
+            ' card_id TEXT PRIMARY KEY,'
+            ' issue_key TEXT NOT NULL,'
+            ' checked_at REAL NOT NULL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS links_issue_key ON links (issue_key)')
+        self.conn.commit()
+
+    def card_for(self, issue_key: str):
+        """
+        Retorna o card ligado à issue, ou None.
+        """
+        row = self.conn.execute('SELECT card_id FROM links WHERE issue_key = ?', (issue_key,)).fetchone()
+        return row[0] if row else None
+
+    def resolve(self, card_ids) -> dict:
+        """
+        Retorna card_id -> issue_key apenas para os vínculos ainda válidos.
+        Cards ausentes ou com vínculo expirado ficam de fora e devem ser
+        consultados no Jira.
+        """
+        oldest = time.time() - self.max_age
+        found = {}
+        for card_id in card_ids:
+            row = self.conn.execute(
+                'SELECT issue_key FROM links WHERE card_id = ? AND checked_at >= ?',
+                (card_id, oldest)
+            ).fetchone()
+            if row:
+                found[card_id] = row[0]
+        return found
+
+    def link(self, card_id: str, issue_key: str):
+        """
+        Registra (ou renova) o vínculo entre um card e uma issue.
+        """
+        self.link_many({card_id: issue_key})
+
+    def link_many(self, mapping: dict):
+        """
+        Registra (ou renova) vários vínculos de uma vez.
+        """
+        now = time.time()
+        self.conn.executemany(
+            'INSERT INTO links (card_id, issue_key, checked_at) VALUES (?, ?, ?) '
+            'ON CONFLICT(card_id) DO UPDATE SET issue_key = excluded.issue_key, checked_at = excluded.checked_at',
+            [(card_id, issue_key, now) for card_id, issue_key in mapping.items()]
+        )
+        self.conn.commit()
+
+    def forget(self, card_ids):
+        """
+        Remove vínculos que não foram mais encontrados no Jira.
+        """
+        self.conn.executemany('DELETE FROM links WHERE card_id = ?', [(card_id,) for card_id in card_ids])
+        self.conn.commit()
+
+
+class CommentLedger:
+    """
+    Registro dos comentários espelhados, por direção, ID de origem e hash
+    do conteúdo. Também reconhece comentários criados pela própria
+    sincronização, evitando o pingue-pongue entre Trello e Jira.
+    """
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS comments ('
+            ' direction TEXT NOT NULL,'
+            ' source_id TEXT NOT NULL,'
+            ' content_hash TEXT NOT NULL,'
+            ' target_id TEXT,'
+            ' mirrored_at REAL NOT NULL,'
+            ' PRIMARY KEY (direction, source_id))'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS comments_target ON comments (direction, target_id)')
+        self.conn.commit()
+
+    def seen(self, direction: str, source_id: str, text: str) -> bool:
+        """
+        Indica se o comentário, com este conteúdo, já foi espelhado.
+        """
+        row = self.conn.execute(
+            'SELECT content_hash FROM comments WHERE direction = ? AND source_id = ?',
+            (direction, source_id)
+        ).fetchone()
+        return bool(row) and row[0] == content_hash(text)
+
+    def is_mirror(self, direction: str, comment_id: str) -> bool:
+        """
+        Indica se o comentário foi criado pela sincronização na direção informada.
+        """
+        row = self.conn.execute(
+            'SELECT 1 FROM comments WHERE direction = ? AND target_id = ?',
+            (direction, comment_id)
+        ).fetchone()
+        return bool(row)
+
+    def pending(self, direction: str, comments):
+        """
+        Filtra (comment_id, texto) deixando apenas os comentários novos ou
+        editados que não tenham vindo da direção oposta.
+        """
+        reverse = REVERSE_DIRECTION[direction]
+        return [
+            (comment_id, text) for comment_id, text in comments
+            if not self.is_mirror(reverse, comment_id) and not self.seen(direction, comment_id, text)
+        ]
+
+    def record(self, direction: str, source_id: str, text: str, target_id: str):
+        """
+        Registra que o comentário de origem foi espelhado como `target_id`.
+        """
+        self.conn.execute(
+            'INSERT INTO comments (direction, source_id, content_hash, target_id, mirrored_at) '
+            'VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT(direction, source_id) DO UPDATE SET content_hash = excluded.content_hash, '
+            'target_id = excluded.target_id, mirrored_at = excluded.mirrored_at',
+            (direction, source_id, content_hash(text), target_id, time.time())
+        )
+        self.conn.commit()
+
+
+class FieldSnapshots:
+    """
+    Hash do último valor sincronizado de cada campo, por lado e item.
+    """
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS snapshots ('
+            ' side TEXT NOT NULL,'
+            ' item_id TEXT NOT NULL,'
+            ' field TEXT NOT NULL,'
+            ' value_hash TEXT NOT NULL,'
+            ' PRIMARY KEY (side, item_id, field))'
+        )
+        self.conn.commit()
+
+    def get(self, side: str, item_id: str) -> dict:
+        """
+        Retorna campo -> hash do último valor sincronizado.
+        """
+        rows = self.conn.execute(
+            'SELECT field, value_hash FROM snapshots WHERE side = ? AND item_id = ?',
+            (side, item_id)
+        ).fetchall()
+        return dict(rows)
+
+    def save(self, side: str, item_id: str, values: dict):
+        """
+        Atualiza o snapshot com os valores canônicos informados.
+        """
+        self.conn.executemany(
+            'INSERT INTO snapshots (side, item_id, field, value_hash) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(side, item_id, field) DO UPDATE SET value_hash = excluded.value_hash',
+            [(side, item_id, field, value_hash(value)) for field, value in values.items()]
+        )
+        self.conn.commit()
+
+
+class SubtaskIndex:
+    """
+    Item de checklist do Trello -> subtarefa do Jira, com o hash do nome
+    sincronizado, para reconciliar checklists de forma incremental.
+    """
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS subtasks ('
+            ' check_item_id TEXT PRIMARY KEY,'
+            ' card_id TEXT NOT NULL,'
+            ' issue_key TEXT NOT NULL,'
+            ' name_hash TEXT NOT NULL,'
+            ' synced_at REAL NOT NULL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS subtasks_card ON subtasks (card_id)')
+        self.conn.commit()
+
+    def for_card(self, card_id: str) -> dict:
+        """
+        Retorna check_item_id -> (subtarefa, hash do nome) dos itens do card.
+        """
+        rows = self.conn.execute(
+            'SELECT check_item_id, issue_key, name_hash FROM subtasks WHERE card_id = ?', (card_id,)
+        ).fetchall()
+        return {item_id: (issue_key, name_hash) for item_id, issue_key, name_hash in rows}
+
+    def record(self, card_id: str, entries):
+        """
+        Registra (check_item_id, subtarefa, nome) criados ou renomeados.
+        """
+        now = time.time()
+        self.conn.executemany(
+            'INSERT INTO subtasks (check_item_id, card_id, issue_key, name_hash, synced_at) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT(check_item_id) DO UPDATE SET issue_key = excluded.issue_key, '
+            'name_hash = excluded.name_hash, synced_at = excluded.synced_at',
+            [(item_id, card_id, issue_key, content_hash(name), now) for item_id, issue_key, name in entries]
+        )
+        self.conn.commit()
+
+
+class AttachmentIndex:
+    """
+    Anexos do Trello já baixados (URL -> sha256 do conteúdo) e anexos já
+    enviados a cada issue (issue, sha256), para que cada arquivo seja
+    transferido uma única vez.
+    """
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS attachment_sources ('
+            ' url TEXT PRIMARY KEY,'
+            ' sha256 TEXT NOT NULL,'
+            ' size INTEGER NOT NULL)'
+        )
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS attachment_uploads ('
+            ' issue_key TEXT NOT NULL,'
+            ' sha256 TEXT NOT NULL,'
+            ' attachment_id TEXT,'
+            ' uploaded_at REAL NOT NULL,'
+            ' PRIMARY KEY (issue_key, sha256))'
+        )
+        self.conn.commit()
+
+    def digest_for(self, url: str):
+        """
+        sha256 do conteúdo já baixado desta URL, ou None.
+        """
+        row = self.conn.execute('SELECT sha256 FROM attachment_sources WHERE url = ?', (url,)).fetchone()
+        return row[0] if row else None
+
+    def remember(self, url: str, sha256: str, size: int):
+        self.conn.execute(
+            'INSERT INTO attachment_sources (url, sha256, size) VALUES (?, ?, ?) '
+            'ON CONFLICT(url) DO UPDATE SET sha256 = excluded.sha256, size = excluded.size',
+            (url, sha256, size)
+        )
+        self.conn.commit()
+
+    def uploaded(self, issue_key: str, sha256: str) -> bool:
+        """
+        Indica se este conteúdo já foi anexado à issue.
+        """
+        row = self.conn.execute(
+            'SELECT 1 FROM attachment_uploads WHERE issue_key = ? AND sha256 = ?', (issue_key, sha256)
+        ).fetchone()
+        return bool(row)
+
+    def record_upload(self, issue_key: str, sha256: str, attachment_id: str):
+        self.conn.execute(
+            'INSERT OR REPLACE INTO attachment_uploads (issue_key, sha256, attachment_id, uploaded_at) '
+            'VALUES (?, ?, ?, ?)',
+            (issue_key, sha256, attachment_id, time.time())
+        )
+        self.conn.commit()
+
+
+class Watermarks:
+    """
+    Marcas d'água por conexão: até onde cada lado já foi sincronizado. A
+    passada do Trello, paginada, guarda também a sua posição, para que uma
+    execução interrompida a retome.
+    """
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS watermarks ('
+            ' connection_id TEXT PRIMARY KEY,'
+            ' trello TEXT NOT NULL,'
+            ' jira TEXT NOT NULL,'
+            ' updated_at REAL NOT NULL)'
+        )
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS trello_passes ('
+            ' connection_id TEXT PRIMARY KEY,'
+            ' since TEXT NOT NULL,'
+            ' started TEXT NOT NULL,'
+            ' position TEXT NOT NULL)'
+        )
+        self.conn.commit()
+
+    def trello_pass(self, connection_id: str):
+        """
+        Retorna (since, início, posição) da passada do Trello interrompida, ou None.
+        """
+        row = self.conn.execute(
+            'SELECT since, started, position FROM trello_passes WHERE connection_id = ?', (connection_id,)
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def save_trello_pass(self, connection_id: str, since: str, started: str, position: str):
+        """
+        Registra até onde a passada do Trello em andamento chegou.
+        """
+        self.conn.execute(
+            'INSERT OR REPLACE INTO trello_passes (connection_id, since, started, position) VALUES (?, ?, ?, ?)',
+            (connection_id, since, started, position)
+        )
+        self.conn.commit()
+
+    def finish_trello_pass(self, connection_id: str, watermark: str):
+        """
+        Encerra a passada do Trello e avança a marca d'água, de forma atômica.
+        """
+        self.conn.execute('DELETE FROM trello_passes WHERE connection_id = ?', (connection_id,))
+        self.checkpoint(connection_id, trello=watermark)
+
+    def get(self, connection_id: str):
+        """
+        Retorna (watermark do Trello, watermark do Jira) da conexão.
+        """
+        row = self.conn.execute(
+            'SELECT trello, jira FROM watermarks WHERE connection_id = ?', (connection_id,)
+        ).fetchone()
+        return tuple(row) if row else (EPOCH, EPOCH)
+
+    def checkpoint(self, connection_id: str, trello: str = None, jira: str = None):
+        """
+        Avança uma ou ambas as marcas d'água de forma atômica.
+        """
+        current_trello, current_jira = self.get(connection_id)
+        self.conn.execute(
+            'INSERT INTO watermarks (connection_id, trello, jira, updated_at) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(connection_id) DO UPDATE SET trello = excluded.trello, jira = excluded.jira, '
+            'updated_at = excluded.updated_at',
+            (connection_id, trello or current_trello, jira or current_jira, time.time())
+        )
+        self.conn.commit()
+
+
+class SyncStore:
+    """
+    Banco SQLite com as tabelas de estado da sincronização.
+
+    Com `in_memory`, trabalha sobre uma cópia em memória do banco (vazia se
+    o arquivo não existir), que é descartada ao fechar: nada é gravado no
+    arquivo. É o que o modo de simulação usa.
+    """
+    def __init__(self, path: str, link_max_age: float = DEFAULT_LINK_MAX_AGE, in_memory: bool = False):
+        self.path = path
+        if in_memory:
+            self.conn = sqlite3.connect(':memory:')
+            if os.path.exists(path):
+                source = sqlite3.connect(f'{pathlib.Path(path).absolute().as_uri()}?mode=ro', uri=True)
+                try:
+                    source.backup(self.conn)
+                finally:
+                    source.close()
+        else:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.conn = sqlite3.connect(path)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+        self.links = LinkIndex(self.conn, max_age=link_max_age)
+        self.comments = CommentLedger(self.conn)
+        self.snapshots = FieldSnapshots(self.conn)
+        self.subtasks = SubtaskIndex(self.conn)
+        self.attachments = AttachmentIndex(self.conn)
+        self.watermarks = Watermarks(self.conn)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
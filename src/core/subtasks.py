@@ -0,0 +1,86 @@
+"""
+Subtarefas do Jira a partir dos itens de checklist do Trello.
+
+As subtarefas são criadas pelo endpoint de criação em lote do Jira
+(`/rest/api/2/issue/bulk`, até 50 por requisição). Cada item de checklist
+fica registrado com a subtarefa correspondente, de modo que cards já
+sincronizados recebem apenas os itens novos e os renomeados. Itens removidos
+do checklist não apagam subtarefas.
+"""
+from .store import content_hash
+
+BULK_CREATE_LIMIT = 50
+DEFAULT_SUBTASK_CONCURRENCY = 4
+SUBTASK_ISSUE_TYPE = 'Sub-task'
+
+
+def subtask_fields(parent_key: str, summary: str, description: str = '', duedate: str = None,
+                   issue_type: str = SUBTASK_ISSUE_TYPE) -> dict:
+    """
+    Campos de criação de uma subtarefa da issue `parent_key`.
+    """
+    fields = {
+        'project': {'key': parent_key.split('-')[0]},
+        'parent': {'key': parent_key},
+        'summary': summary,
+        'description': description,
+        'issuetype': {'name': issue_type},
+    }
+    if duedate:
+        fields['duedate'] = duedate
+    return fields
+
+
+def bulk_payload(fields_list) -> dict:
+    return {'issueUpdates': [{'fields': fields} for fields in fields_list]}
+
+
+def bulk_created_keys(count: int, response: dict) -> list:
+    """
+    Chave criada para cada elemento do lote, na ordem do envio; None para os
+    elementos que falharam (`errors[].failedElementNumber`).
+    """
+    failed = {error.get('failedElementNumber') for error in response.get('errors', [])}
+    created = iter(response.get('issues', []))
+    return [None if index in failed else next(created, {}).get('key') for index in range(count)]
+
+
+def checklist_items(checklists) -> list:
+    """
+    (check_item_id, nome) de todos os itens das checklists de um card.
+    """
+    return [
+        (item['id'], item.get('name', ''))
+        for checklist in checklists
+        for item in checklist.get('checkItems', [])
+    ]
+
+
+def plan_subtasks(items, known: dict):
+    """
+    Compara os itens do checklist com as subtarefas já registradas.
+    Retorna (a criar: [(item_id, nome)], a renomear: [(item_id, subtarefa, nome)]).
+    """
+    to_create = [(item_id, name) for item_id, name in items if item_id not in known]
+    to_rename = [
+        (item_id, known[item_id][0], name) for item_id, name in items
+        if item_id in known and known[item_id][1] != content_hash(name)
+    ]
+    return to_create, to_rename
+
+
+def adopt_existing(items, subtasks) -> list:
+    """
+    Associa itens de checklist a subtarefas já existentes com o mesmo título,
+    para issues criadas antes do registro de subtarefas. Cada subtarefa é
+    usada no máximo uma vez. Retorna [(item_id, subtarefa, nome)].
+    """
+    by_summary = {}
+    for subtask in subtasks:
+        by_summary.setdefault(subtask.get('fields', {}).get('summary'), []).append(subtask['key'])
+    adopted = []
+    for item_id, name in items:
+        keys = by_summary.get(name)
+        if keys:
+            adopted.append((item_id, keys.pop(0), name))
+    return adopted
@@ -1,108 +1,551 @@
 import asyncio
 import logging
 import os
+import time
 from typing import Dict
+from .attachments import AttachmentCache, AttachmentMirror, attachment_options, pending_uploads
+from .card_fetch import (card_position, embedded_attachments, embedded_checklists, embedded_comments, in_lists,
+                         pass_start)
+from .change_detection import (canonical_from_jira, canonical_from_trello, changed_fields, jira_search_fields,
+                               normalize_due)
+from . import metrics
+from .mentions import MentionTranslator, translator_for
+from .outbox import Outbox
+from .plan import SyncPlan
+from .report import SyncReport
 from .trello_client import TrelloClient
+from .http import SessionPool
+from .issue_lookup import chunked, jql_datetime
 from .jira_client import JiraClient
+from .subtasks import DEFAULT_SUBTASK_CONCURRENCY, adopt_existing, checklist_items, plan_subtasks
+from .store import (DEFAULT_LINK_MAX_AGE, JIRA_SIDE, JIRA_TO_TRELLO, TRELLO_SIDE, TRELLO_TO_JIRA,
+                    SyncStore, value_hash)
 
 logger = logging.getLogger(__name__)
 
-async def sync_changes(connection: Dict, last_sync: str):
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_CHECKPOINT_EVERY = 50
+
+def create_clients(connection: Dict, pool: SessionPool = None):
     """
-    Perform bidirectional sync for a single connection.
+    Cria os clientes do Trello e do Jira a partir das variáveis de ambiente
+    nomeadas no arquivo de configuração. Com `pool`, os clientes usam as
+    sessões compartilhadas por host em vez de abrir as suas.
     """
     trello_conf = connection['trello']
     jira_conf = connection['jira']
-    sync_conf = connection['sync']
-
-    # Lê as variáveis de ambiente usando os nomes definidos no arquivo de configuração
-    board_id = os.getenv(trello_conf['board_id'])
-    api_key = os.getenv(trello_conf['api_key'])
-    token = os.getenv(trello_conf['token'])
+    http_options = connection['sync'].get('http')
     jira_host = os.getenv(jira_conf['host'])
-    jira_user = os.getenv(jira_conf['user'])
-    jira_token = os.getenv(jira_conf['api_token'])
-    project_key = os.getenv(jira_conf['project_key'])
+
+    trello_url = trello_conf.get('api_url', TrelloClient.BASE_URL)
 
     trello = TrelloClient(
-        board_id=board_id,
-        api_key=api_key,
-        token=token
+        board_id=os.getenv(trello_conf['board_id']),
+        api_key=os.getenv(trello_conf['api_key']),
+        token=os.getenv(trello_conf['token']),
+        session=pool.session_for(trello_url) if pool else None,
+        http_options=http_options,
+        rate_limit=trello_conf.get('rate_limit'),
+        base_url=trello_url,
+        list_ids=trello_conf.get('list_ids'),
+        page_size=trello_conf.get('page_size')
     )
     jira = JiraClient(
         host=jira_host,
-        user=jira_user,
-        api_token=jira_token
+        user=os.getenv(jira_conf['user']),
+        api_token=os.getenv(jira_conf['api_token']),
+        session=pool.session_for(jira_host) if pool and jira_host else None,
+        http_options=http_options,
+        rate_limit=jira_conf.get('rate_limit')
+    )
+    return trello, jira
+
+def connection_id(connection: Dict) -> str:
+    """
+    Identificador estável da conexão, usado como chave das marcas d'água.
+    """
+    return connection.get('name') or (
+        f"{os.getenv(connection['trello']['board_id'])}:{os.getenv(connection['jira']['project_key'])}"
     )
 
+class SyncContext:
+    """
+    Estado compartilhado pelas tarefas de uma execução de sincronização.
+    Com `plan`, a execução é uma simulação: as escritas vão para o plano.
+    """
+    def __init__(self, connection: Dict, trello: TrelloClient, jira: JiraClient, store: SyncStore,
+                 plan: SyncPlan = None):
+        self.connection = connection
+        self.name = connection_id(connection)
+        self.sync_conf = connection['sync']
+        self.fields = self.sync_conf['fields']
+        self.customfield = connection['jira']['customfield_trello_id']
+        self.project_key = os.getenv(connection['jira']['project_key'])
+        self.issue_type = connection['jira'].get('issue_type', 'Task')
+        self.mentions = translator_for(connection['jira'].get('user_mapping'))
+        self.trello = trello
+        self.jira = jira
+        self.store = store
+        self.plan = plan
+        self.report = SyncReport()
+        if 'attachments' in self.fields:
+            options = attachment_options(self.sync_conf, self.sync_conf.get('state_db', 'state.db'))
+            # No modo plano o cache só é consultado: nada é criado em disco
+            cache = AttachmentCache(options['cache_dir'], options['cache_max_bytes'], read_only=plan)
+            self.attachments = AttachmentMirror(
+                trello, jira, store.attachments, cache,
+                max_bytes=options['max_bytes'], concurrency=options['concurrency']
+            )
+
+async def run_bounded(items, worker, limit: int, label: str, report: SyncReport = None) -> int:
+    """
+    Executa `worker` para cada item com no máximo `limit` tarefas simultâneas.
+    A ordem das etapas dentro de um item é preservada pelo próprio worker.
+    Com `report`, registra a latência de cada item.
+    Retorna a quantidade de itens que falharam.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def guarded(item):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await worker(item)
+            finally:
+                if report is not None:
+                    report.observe(time.perf_counter() - started)
+
+    results = await asyncio.gather(*(guarded(item) for item in items), return_exceptions=True)
+    failed = 0
+    for item, result in zip(items, results):
+        if isinstance(result, Exception):
+            failed += 1
+            logger.error(f"Falha ao sincronizar {label} {item.get('key', item.get('id'))}: {str(result)}")
+        elif isinstance(result, BaseException):
+            raise result
+    return failed
+
+async def sync_card(ctx: SyncContext, card: Dict, issue_key: str, outbox: Outbox):
+    """
+    Sincroniza um card com o Jira: issue, depois anexos, subtarefas e comentários.
+    Apenas os campos alterados desde a última sincronização são enviados; a
+    atualização da issue e os comentários entram na `outbox`.
+    """
+    with metrics.phase(ctx.name, metrics.CONVERT):
+        fields = convert_to_jira_fields(card, ctx.sync_conf, ctx.mentions)
+        duedate = fields.get('duedate')
+        source = canonical_from_trello(card, ctx.fields)
+        if issue_key:
+            changed = changed_fields(ctx.store.snapshots.get(TRELLO_SIDE, card['id']), source, value_hash)
+    wrote = False
+    if issue_key:
+        if changed:
+            def updated(kept, issue_key=issue_key):
+                ctx.store.snapshots.save(TRELLO_SIDE, card['id'], source)
+                ctx.store.snapshots.save(JIRA_SIDE, issue_key, canonical_from_jira(fields, kept))
+
+            outbox.update(JIRA_SIDE, issue_key, fields, changed, (TRELLO_SIDE, card['id']), on_done=updated)
+            wrote = True
+        else:
+            ctx.report.writes_avoided += 1
+        created = False
+    else:
+        if ctx.plan is not None:
+            issue_key = ctx.plan.create_issue(card['id'], source)
+        else:
+            with metrics.phase(ctx.name, metrics.WRITE):
+                result = await ctx.jira.create_or_update_issue(None, {
+                    **fields,
+                    'project': {'key': ctx.project_key},
+                    'issuetype': {'name': ctx.issue_type},
+                    ctx.customfield: card['id'],
+                })
+            issue_key = result['key']
+            ctx.report.writes += 1
+        ctx.store.links.link(card['id'], issue_key)
+        ctx.store.snapshots.save(TRELLO_SIDE, card['id'], source)
+        ctx.store.snapshots.save(JIRA_SIDE, issue_key, canonical_from_jira(fields, ctx.fields))
+        outbox.mark_written(JIRA_SIDE, issue_key, source)
+        wrote = created = True
+
+    if 'attachments' in ctx.fields:
+        attachments = embedded_attachments(card)
+        if attachments is None:
+            with metrics.phase(ctx.name, metrics.FETCH):
+                attachments = await ctx.trello.get_attachments(card['id'])
+        if ctx.plan is not None:
+            uploaded = ctx.plan.attachments(issue_key, pending_uploads(
+                ctx.store.attachments, ctx.attachments.cache, issue_key, attachments, ctx.attachments.max_bytes
+            ))
+        else:
+            with metrics.phase(ctx.name, metrics.WRITE):
+                uploaded = await ctx.attachments.mirror(issue_key, attachments)
+            ctx.report.writes += uploaded
+        wrote = wrote or bool(uploaded)
+
+    if 'checklists' in ctx.fields:
+        checklists = embedded_checklists(card)
+        if checklists is None:
+            with metrics.phase(ctx.name, metrics.FETCH):
+                checklists = await ctx.trello.get_checklists(card['id'])
+        with metrics.phase(ctx.name, metrics.WRITE):
+            written = await sync_subtasks(ctx, card['id'], issue_key, checklists, duedate, created)
+        ctx.report.writes += written
+        wrote = wrote or bool(written)
+
+    if 'comments' in ctx.fields:
+        with metrics.phase(ctx.name, metrics.COMMENTS):
+            comments = embedded_comments(card)
+            if comments is None:
+                comments = await ctx.trello.get_comments(card['id'])
+            comments = [(comment['id'], comment['data']['text']) for comment in comments]
+            for comment_id, text in ctx.store.comments.pending(TRELLO_TO_JIRA, comments):
+                outbox.comment(JIRA_SIDE, issue_key, ctx.mentions.translate(text),
+                               on_done=comment_recorder(ctx, TRELLO_TO_JIRA, comment_id, text))
+                wrote = True
+
+    if not wrote:
+        ctx.report.skipped += 1
+    logger.info(f"Card {card['id']} sincronizado com issue {issue_key}")
+
+async def sync_subtasks(ctx: SyncContext, card_id: str, issue_key: str, checklists: list,
+                        duedate: str, created: bool) -> int:
+    """
+    Reconcilia os itens de checklist do card com as subtarefas da issue:
+    itens novos são criados em lote e itens renomeados têm o título
+    atualizado. Retorna a quantidade de escritas; em uma simulação, elas
+    vão para o plano.
+    """
+    items = checklist_items(checklists)
+    if not items:
+        return 0
+    known = ctx.store.subtasks.for_card(card_id)
+    if not known and not created:
+        # Issue anterior ao registro de subtarefas: aproveita as que já existem
+        adopted = adopt_existing(items, await ctx.jira.get_subtasks(issue_key))
+        if adopted:
+            ctx.store.subtasks.record(card_id, adopted)
+            known = ctx.store.subtasks.for_card(card_id)
+
+    to_create, to_rename = plan_subtasks(items, known)
+    if ctx.plan is not None:
+        ctx.plan.subtasks(issue_key, to_create, to_rename)
+        return 0
+    if to_create:
+        def created_subtasks(entries):
+            # Registradas a cada lote: uma falha adiante não gera duplicatas na próxima execução
+            ctx.store.subtasks.record(card_id, [
+                (to_create[index][0], key, to_create[index][1]) for index, key in entries
+            ])
+
+        await ctx.jira.create_subtasks(
+            issue_key, [name for _, name in to_create], duedate=duedate, concurrency=DEFAULT_SUBTASK_CONCURRENCY,
+            on_created=created_subtasks
+        )
+    if to_rename:
+        semaphore = asyncio.Semaphore(DEFAULT_SUBTASK_CONCURRENCY)
+
+        async def rename(subtask_key, name):
+            async with semaphore:
+                await ctx.jira.create_or_update_issue(subtask_key, {'summary': name})
+
+        await asyncio.gather(*(rename(subtask_key, name) for _, subtask_key, name in to_rename))
+        ctx.store.subtasks.record(card_id, to_rename)
+    return len(to_create) + len(to_rename)
+
+async def sync_issue(ctx: SyncContext, issue: Dict, card_id: str, outbox: Outbox):
+    """
+    Sincroniza uma issue com o Trello: card, depois comentários.
+    Apenas os campos alterados desde a última sincronização são enviados, e
+    os que esta execução acabou de escrever na issue não voltam ao card.
+    """
+    with metrics.phase(ctx.name, metrics.CONVERT):
+        source = canonical_from_jira(issue['fields'], ctx.fields)
+        changed = changed_fields(ctx.store.snapshots.get(JIRA_SIDE, issue['key']), source, value_hash)
+        data = convert_to_trello_fields(issue, ctx.sync_conf, ctx.mentions.inverse)
+    wrote = False
+    if changed:
+        def updated(kept):
+            ctx.store.snapshots.save(JIRA_SIDE, issue['key'], source)
+            ctx.store.snapshots.save(TRELLO_SIDE, card_id, canonical_from_trello(data, kept))
+
+        if outbox.update(TRELLO_SIDE, card_id, data, changed, (JIRA_SIDE, issue['key']), on_done=updated):
+            wrote = True
+        else:
+            # Eco da escrita feita nesta execução: a issue já está sincronizada
+            ctx.store.snapshots.save(JIRA_SIDE, issue['key'], source)
+    else:
+        ctx.report.writes_avoided += 1
+
+    if 'comments' in ctx.fields:
+        with metrics.phase(ctx.name, metrics.COMMENTS):
+            comments = [(comment['id'], comment.get('body', '')) for comment in await ctx.jira.get_comments(issue['key'])]
+            for comment_id, text in ctx.store.comments.pending(JIRA_TO_TRELLO, comments):
+                outbox.comment(TRELLO_SIDE, card_id, ctx.mentions.inverse.translate(text),
+                               on_done=comment_recorder(ctx, JIRA_TO_TRELLO, comment_id, text))
+                wrote = True
+
+    if not wrote:
+        ctx.report.skipped += 1
+    logger.info(f"Issue {issue['key']} sincronizada com card {card_id}")
+
+def comment_recorder(ctx: SyncContext, direction: str, comment_id: str, text: str):
+    """
+    Callback que registra o comentário espelhado quando a outbox o publica.
+    """
+    return lambda result: ctx.store.comments.record(direction, comment_id, text, result.get('id'))
+
+async def flush_outbox(ctx: SyncContext, outbox: Outbox, limit: int) -> int:
+    """
+    Executa as escritas pendentes da outbox, com no máximo `limit` itens em
+    paralelo; dentro de cada item, o PUT vem antes dos comentários.
+    Retorna a quantidade de itens cujas escritas falharam. Em uma simulação,
+    as escritas vão para o plano.
+    """
+    if ctx.plan is not None:
+        ctx.plan.record(outbox.drain())
+        return 0
+    entries = outbox.drain()
+    semaphore = asyncio.Semaphore(limit)
+
+    async def apply(entry):
+        async with semaphore:
+            if entry.payload:
+                if entry.side == JIRA_SIDE:
+                    await ctx.jira.create_or_update_issue(entry.item_id, entry.payload)
+                else:
+                    await ctx.trello.create_or_update_card(entry.item_id, entry.payload)
+                ctx.report.writes += 1
+                for done in entry.on_update:
+                    done()
+            for text, done in entry.comments:
+                if entry.side == JIRA_SIDE:
+                    result = await ctx.jira.add_comment(entry.item_id, text)
+                else:
+                    result = await ctx.trello.add_comment(entry.item_id, text)
+                ctx.report.writes += 1
+                if done is not None:
+                    done(result)
+
+    with metrics.phase(ctx.name, metrics.WRITE):
+        results = await asyncio.gather(*(apply(entry) for entry in entries), return_exceptions=True)
+    failed = 0
+    for entry, result in zip(entries, results):
+        if isinstance(result, Exception):
+            failed += 1
+            logger.error(f"Falha ao gravar alterações em {entry.side} {entry.item_id}: {str(result)}")
+        elif isinstance(result, BaseException):
+            raise result
+    return failed
+
+async def sync_card_by_id(ctx: SyncContext, card_id: str):
+    """
+    Sincroniza um único card a partir do seu ID (usado pelos webhooks).
+    Cards fora das listas sincronizadas são ignorados.
+    """
+    with metrics.phase(ctx.name, metrics.FETCH):
+        card = await ctx.trello.get_card(card_id, ctx.fields)
+    if not in_lists(card, ctx.trello.list_ids):
+        logger.debug(f"Card {card_id} fora das listas sincronizadas")
+        return
+    with metrics.phase(ctx.name, metrics.LOOKUP):
+        existing = await find_existing_issues(ctx.jira, [card], ctx.connection, ctx.project_key, ctx.store)
+    outbox = Outbox(ctx.report)
+    await sync_card(ctx, card, existing.get(card_id), outbox)
+    if await flush_outbox(ctx, outbox, DEFAULT_MAX_CONCURRENCY):
+        raise RuntimeError(f"Falha ao gravar as alterações do card {card_id}")
+
+async def sync_issue_by_key(ctx: SyncContext, issue_key: str):
+    """
+    Sincroniza uma única issue a partir da sua chave (usado pelos webhooks).
+    Issues sem card ligado são ignoradas.
+    """
+    card_id = ctx.store.links.card_for(issue_key)
+    with metrics.phase(ctx.name, metrics.FETCH):
+        issue = await ctx.jira.get_issue(issue_key, jira_search_fields(ctx.fields, ctx.customfield))
+    if not card_id:
+        card_id = issue['fields'].get(ctx.customfield)
+        if not card_id:
+            return
+        ctx.store.links.link(card_id, issue_key)
+    outbox = Outbox(ctx.report)
+    await sync_issue(ctx, issue, card_id, outbox)
+    if await flush_outbox(ctx, outbox, DEFAULT_MAX_CONCURRENCY):
+        raise RuntimeError(f"Falha ao gravar as alterações da issue {issue_key}")
+
+async def sync_changes(connection: Dict, last_sync: str, trello: TrelloClient, jira: JiraClient,
+                       plan: SyncPlan = None):
+    """
+    Perform bidirectional sync for a single connection.
+
+    Sem `last_sync`, cada direção parte da sua marca d'água salva. Os cards e
+    as issues são buscados e processados página a página, e cada lote
+    processado sem falhas é um checkpoint: a posição da passada do Trello e a
+    marca d'água do Jira. Uma execução interrompida retoma do último
+    checkpoint; a marca d'água do Trello só avança quando a passada termina.
+    As escritas de cada lote passam pela outbox e são gravadas antes do
+    checkpoint.
+
+    Com `plan`, nada é escrito nas APIs nem no banco de estado, que é aberto
+    como cópia em memória; as escritas são registradas no plano.
+    """
+    store = open_store(connection['sync'], in_memory=plan is not None)
+    ctx = SyncContext(connection, trello, jira, store, plan)
+    outbox = Outbox(ctx.report)
+    limit = connection['sync'].get('max_concurrency', DEFAULT_MAX_CONCURRENCY)
+    batch_size = connection['sync'].get('checkpoint_every', DEFAULT_CHECKPOINT_EVERY)
+    key = ctx.name
+    trello_since, jira_since = (last_sync, last_sync) if last_sync else store.watermarks.get(key)
+    # Passada do Trello interrompida: retoma com o mesmo `since`, de onde parou
+    resumed = None if last_sync else store.watermarks.trello_pass(key)
+    if resumed:
+        trello_since, started, position = resumed
+    else:
+        started, position = pass_start(), None
+
     try:
         # Trello -> Jira
-        logger.info(f"Iniciando sincronização Trello -> Jira desde {last_sync}")
-        updates = await trello.get_updates_since(last_sync)
-        for card in updates:
-            # convert and sync to Jira
-            fields = convert_to_jira_fields(card, sync_conf)
-            issue_key = find_existing_issue(jira, card, connection)
-            result = await jira.create_or_update_issue(issue_key, fields)
-            logger.info(f"Card {card['id']} sincronizado com issue {result.get('key', 'nova')}")
+        logger.info(f"Iniciando sincronização Trello -> Jira desde {trello_since}"
+                    + (f", retomando de {position}" if position else ''))
+        trello_failed = 0
+        async for source, page in metrics.timed_pages(trello.iter_card_pages(trello_since, ctx.fields, position), key):
+            with metrics.phase(key, metrics.LOOKUP):
+                existing = await find_existing_issues(jira, page, connection, ctx.project_key, store)
+            for batch in chunked(page, batch_size):
+                trello_failed += await run_bounded(
+                    batch, lambda card: sync_card(ctx, card, existing.get(card['id']), outbox), limit, 'card',
+                    ctx.report
+                )
+                trello_failed += await flush_outbox(ctx, outbox, limit)
+                ctx.report.processed += len(batch)
+                # Após a primeira falha a posição para, para que o item seja refeito
+                if not trello_failed:
+                    position = card_position(source, batch[-1]['id'])
+                    store.watermarks.save_trello_pass(key, trello_since, started, position)
+        if not trello_failed:
+            store.watermarks.finish_trello_pass(key, max(trello_since, started))
 
         # Jira -> Trello
-        logger.info(f"Iniciando sincronização Jira -> Trello desde {last_sync}")
-        jql = f"project={project_key} AND updated > \"{last_sync}\""
-        issues = await jira.search_issues(jql)
-        for issue in issues:
-            data = convert_to_trello_fields(issue, sync_conf)
-            card_id = issue['fields'].get(connection['jira']['customfield_trello_id'])
-            result = await trello.create_or_update_card(card_id, data)
-            logger.info(f"Issue {issue['key']} sincronizada com card {result.get('id', 'novo')}")
+        logger.info(f"Iniciando sincronização Jira -> Trello desde {jira_since}")
+        # Apenas issues ligadas a um card interessam; a JQL tem precisão de
+        # minuto, então o próprio minuto da marca d'água é incluído
+        jql = (
+            f"project={ctx.project_key} AND \"{ctx.customfield}\" is not EMPTY "
+            f"AND updated >= \"{jql_datetime(jira_since)}\" ORDER BY updated ASC"
+        )
+        search_fields = jira_search_fields(ctx.fields, ctx.customfield)
+        jira_failed = 0
+        async for page in metrics.timed_pages(jira.iter_issue_pages(jql, fields=search_fields), key):
+            issues = []
+            card_ids = {}
+            for issue in page:
+                card_id = store.links.card_for(issue['key'])
+                if not card_id:
+                    card_id = issue['fields'].get(ctx.customfield)
+                    if not card_id:
+                        continue
+                    store.links.link(card_id, issue['key'])
+                issues.append(issue)
+                card_ids[issue['key']] = card_id
+            jira_failed += await run_bounded(
+                issues, lambda issue: sync_issue(ctx, issue, card_ids[issue['key']], outbox), limit, 'issue', ctx.report
+            )
+            jira_failed += await flush_outbox(ctx, outbox, limit)
+            ctx.report.processed += len(issues)
+            if not jira_failed and page[-1]['fields'].get('updated'):
+                store.watermarks.checkpoint(key, jira=page[-1]['fields']['updated'])
+        failed = trello_failed + jira_failed
+        ctx.report.processed -= failed
+        ctx.report.failed = failed
+        logger.info(f"Resumo da sincronização: {ctx.report.summary()}")
+        if plan is None:
+            metrics.record_run(key, ctx.report, success=not failed)
+
+        if failed:
+            raise RuntimeError(f"{failed} itens falharam durante a sincronização")
+        return ctx.report
 
     except Exception as e:
         logger.error(f"Erro durante a sincronização: {str(e)}")
         raise
+    finally:
+        store.close()
 
-async def run_sync(connection: Dict, last_sync: str):
+async def run_sync(connection: Dict, last_sync: str = None, pool: SessionPool = None, plan: SyncPlan = None):
     """
-    Executa a sincronização com tratamento de erros.
+    Executa a sincronização com tratamento de erros e retorna o relatório.
+    Com `plan`, apenas simula a execução (veja `sync_changes`).
     """
+    trello, jira = create_clients(connection, pool)
     try:
-        await sync_changes(connection, last_sync)
+        async with trello, jira:
+            report = await sync_changes(connection, last_sync, trello, jira, plan)
+            if pool is None:
+                logger.info(f"Conexões HTTP Trello: {trello.stats.summary()}")
+                logger.info(f"Conexões HTTP Jira: {jira.stats.summary()}")
+            return report
     except Exception as e:
         logger.error(f"Falha na sincronização: {str(e)}")
         raise
 
-def convert_to_jira_fields(card, sync_conf):
+def convert_to_jira_fields(card, sync_conf, mentions: MentionTranslator = None):
     """
-    Converte campos do Trello para o formato do Jira.
+    Converte campos do Trello para o formato do Jira, traduzindo as
+    menções da descrição quando `mentions` é informado.
     """
     fields = {}
     if 'title' in sync_conf['fields']:
         fields['summary'] = card.get('name', '')
     if 'description' in sync_conf['fields']:
-        fields['description'] = card.get('desc', '')
+        desc = card.get('desc', '')
+        fields['description'] = mentions.translate(desc) if mentions else desc
     if 'due_date' in sync_conf['fields'] and card.get('due'):
-        fields['duedate'] = card['due']
+        # O Jira aceita apenas a data em duedate
+        fields['duedate'] = normalize_due(card['due'])
     return fields
 
-def convert_to_trello_fields(issue, sync_conf):
+def convert_to_trello_fields(issue, sync_conf, mentions: MentionTranslator = None):
     """
-    Converte campos do Jira para o formato do Trello.
+    Converte campos do Jira para o formato do Trello, traduzindo as
+    menções da descrição quando `mentions` é informado.
     """
     fields = {}
     if 'title' in sync_conf['fields']:
         fields['name'] = issue['fields'].get('summary', '')
     if 'description' in sync_conf['fields']:
-        fields['desc'] = issue['fields'].get('description', '')
+        desc = issue['fields'].get('description', '')
+        fields['desc'] = mentions.translate(desc) if mentions else desc
     if 'due_date' in sync_conf['fields'] and issue['fields'].get('duedate'):
         fields['due'] = issue['fields']['duedate']
     return fields
 
-def find_existing_issue(jira: JiraClient, card, connection):
+def open_store(sync_conf, in_memory: bool = False):
+    """
+    Abre o banco local de estado configurado para a conexão; com
+    `in_memory`, uma cópia dele que não é gravada.
+    """
+    max_age = sync_conf.get('link_max_age_hours')
+    return SyncStore(
+        sync_conf.get('state_db', 'state.db'),
+        link_max_age=max_age * 3600 if max_age is not None else DEFAULT_LINK_MAX_AGE,
+        in_memory=in_memory
+    )
+
+async def find_existing_issues(jira: JiraClient, cards, connection, project_key, store: SyncStore):
     """
-    Procura uma issue existente baseada no ID do card do Trello.
+    Procura as issues existentes baseadas nos IDs dos cards do Trello.
+    Usa o índice local e consulta o Jira em lote apenas para os cards sem
+    vínculo conhecido ou com vínculo expirado.
+    Retorna um dicionário card_id -> issue_key.
     """
     customfield = connection['jira']['customfield_trello_id']
-    # Lê project_key da variável de ambiente
-    project_key = os.getenv('JIRA_PROJECT_KEY')
-    jql = f"project={project_key} AND \"{customfield}\" = \"{card['id']}\""
-    issues = asyncio.run(jira.search_issues(jql))
-    return issues[0]['key'] if issues else None
+    card_ids = [card['id'] for card in cards]
+    existing = store.links.resolve(card_ids)
+    missing = [card_id for card_id in card_ids if card_id not in existing]
+    if missing:
+        found = await jira.find_issues_by_trello_ids(project_key, customfield, missing)
+        store.links.link_many(found)
+        store.links.forget([card_id for card_id in missing if card_id not in found])
+        existing.update(found)
+    logger.info(f"{len(card_ids) - len(missing)} vínculos card/issue vindos do índice local, {len(missing)} consultados no Jira")
+    return existing
@@ -1,5 +1,11 @@
+import asyncio
 import aiohttp
 import logging
+from . import metrics
+from .card_fetch import (DEFAULT_CARD_PAGE_SIZE, card_page_params, card_sources, fat_fetch_params, next_before,
+                         resume_points, sorted_page)
+from .http import ConnectionStats, create_session
+from .rate_limit import bucket_for, retry_policy
 
 class TrelloClient:
     """
@@ -7,8 +13,13 @@ class TrelloClient:
     """
     BASE_URL = 'https://api.trello.com/1'
 
-    def __init__(self, board_id: str, api_key: str, token: str):
+    def __init__(self, board_id: str, api_key: str, token: str,
+                 session: aiohttp.ClientSession = None, http_options: dict = None,
+                 rate_limit: dict = None, base_url: str = None, list_ids: list = None, page_size: int = None):
         self.board_id = board_id
+        self.list_ids = list(list_ids or [])
+        self.page_size = page_size or DEFAULT_CARD_PAGE_SIZE
+        self.base_url = (base_url or self.BASE_URL).rstrip('/')
         self.api_key = api_key
         self.token = token
 
@@ -16,12 +27,42 @@ class TrelloClient:
             raise ValueError('Trello key/token não definidos nas variáveis de ambiente')
 
         self.logger = logging.getLogger(__name__)
+        # Limite do Trello é por token: clientes com o mesmo token dividem o bucket
+        self.bucket = bucket_for('trello', self.token, rate_limit)
+        self.retry = retry_policy(rate_limit)
+        self.http_options = http_options
+        self._session = session
+        self._owns_session = session is None
+        self.stats = ConnectionStats() if session is None else None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """
+        Sessão de vida longa, criada sob demanda dentro do event loop.
+        """
+        if self._session is None or self._session.closed:
+            self._session = create_session(self.stats, self.http_options)
+            self._owns_session = True
+        return self._session
+
+    async def close(self):
+        """
+        Fecha a sessão, se ela pertencer a este cliente.
+        """
+        if self._owns_session and self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
 
     async def _make_request(self, method: str, endpoint: str, params: dict = None, json: dict = None) -> dict:
         """
         Faz uma requisição à API do Trello.
         """
-        url = f'{self.BASE_URL}/{endpoint}'
+        url = f'{self.base_url}/{endpoint}'
 
         # Adiciona os parâmetros de autenticação
         if params is None:
@@ -32,20 +73,63 @@ class TrelloClient:
         })
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.request(method, url, params=params, json=json) as resp:
+            attempt = 0
+            while True:
+                wait = await self.bucket.acquire()
+                metrics.observe_rate_limit_wait('trello', wait)
+                timer = metrics.RequestTimer('trello', method, url)
+                try:
+                    async with self.session.request(method, url, params=params, json=json) as resp:
+                        timer.done(resp.status)
+                        self.bucket.observe(resp.headers)
+                        if self.retry.should_retry(method, resp.status, attempt, resp.headers):
+                            delay = self.retry.delay(attempt, resp.headers)
+                            self.logger.warning(f"Trello respondeu {resp.status}, nova tentativa em {delay:.1f}s")
+                            self.bucket.pause(delay)
+                            attempt += 1
+                            continue
                         resp.raise_for_status()
                         return await resp.json()
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                    timer.done('error')
+                    raise
         except Exception as e:
             self.logger.error(f"Erro na requisição ao Trello: {str(e)}")
             raise
 
-    async def get_updates_since(self, since: str):
+    async def iter_card_pages(self, since: str, sync_fields: list = None, position: str = None):
+        """
+        Gerador assíncrono das páginas de cards alterados desde `since`, do
+        mais novo para o mais antigo, pelo board ou por lista configurada.
+        Com `sync_fields`, checklists, anexos e comentários vêm aninhados em
+        cada card. Cada página vem com a sua fonte, para `card_position`; com
+        `position`, a busca recomeça logo depois dela. A próxima página é
+        buscada enquanto a atual é processada.
+        """
+        for source, before in resume_points(card_sources(self.board_id, self.list_ids), position):
+            pending = asyncio.ensure_future(self._make_request(
+                'GET', source, params=card_page_params(since, sync_fields, self.page_size, before)
+            ))
+            try:
+                while pending is not None:
+                    page = sorted_page(await pending)
+                    before = next_before(page, self.page_size)
+                    pending = None
+                    if before is not None:
+                        pending = asyncio.ensure_future(self._make_request(
+                            'GET', source, params=card_page_params(since, sync_fields, self.page_size, before)
+                        ))
+                    if page:
+                        yield source, page
+            finally:
+                if pending is not None:
+                    pending.cancel()
+
+    async def get_card(self, card_id: str, sync_fields: list = None):
         """
-        Obtém atualizações do board desde uma data específica.
+        Obtém um único card, com os mesmos recursos aninhados da busca do board.
         """
-        params = {'since': since}
-        return await self._make_request('GET', f'boards/{self.board_id}/cards', params=params)
+        return await self._make_request('GET', f'cards/{card_id}', params=fat_fetch_params(sync_fields or []))
 
     async def create_or_update_card(self, card_id: str, data: dict):
         """
@@ -81,3 +165,32 @@ class TrelloClient:
         Obtém os anexos de um card.
         """
         return await self._make_request('GET', f'cards/{card_id}/attachments')
+
+    async def iter_attachment(self, url: str, chunk_size: int):
+        """
+        Baixa o arquivo de um anexo em blocos, sem carregá-lo inteiro na memória.
+        """
+        # Downloads de anexos exigem a autenticação no cabeçalho, não na query
+        headers = {'Authorization': f'OAuth oauth_consumer_key="{self.api_key}", oauth_token="{self.token}"'}
+        attempt = 0
+        while True:
+            wait = await self.bucket.acquire()
+            metrics.observe_rate_limit_wait('trello', wait)
+            timer = metrics.RequestTimer('trello', 'GET', url)
+            try:
+                async with self.session.get(url, headers=headers) as resp:
+                    timer.done(resp.status)
+                    self.bucket.observe(resp.headers)
+                    if self.retry.should_retry('GET', resp.status, attempt, resp.headers):
+                        delay = self.retry.delay(attempt, resp.headers)
+                        self.logger.warning(f"Trello respondeu {resp.status}, nova tentativa em {delay:.1f}s")
+                        self.bucket.pause(delay)
+                        attempt += 1
+                        continue
+                    resp.raise_for_status()
+                    async for chunk in resp.content.iter_chunked(chunk_size):
+                        yield chunk
+                    return
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                timer.done('error')
+                raise
@@ -0,0 +1,210 @@
+"""
+Eventos de webhook do Trello e do Jira.
+
+Os eventos são reduzidos ao item afetado (card ou issue) e entram em uma
+fila com debounce por item: uma rajada de eventos do mesmo card vira uma
+única sincronização, e um mesmo item nunca é processado em paralelo. A
+varredura de reconciliação de uma conexão e os itens dos webhooks dela se
+revezam (`SweepGate`).
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import logging
+import os
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEBOUNCE_SECONDS = 2.0
+DEFAULT_WORKERS = 8
+
+CARD = 'card'
+ISSUE = 'issue'
+
+
+def trello_event_items(payload: dict) -> list:
+    """
+    Cards afetados por um evento de webhook do Trello.
+    """
+    card = payload.get('action', {}).get('data', {}).get('card')
+    return [(CARD, card['id'])] if card and card.get('id') else []
+
+
+def jira_event_items(payload: dict) -> list:
+    """
+    Issues afetadas por um evento de webhook do Jira (issue ou comentário).
+    """
+    issue = payload.get('issue')
+    return [(ISSUE, issue['key'])] if issue and issue.get('key') else []
+
+
+def trello_signature(secret: str, body: bytes, callback_url: str) -> str:
+    """
+    Valor do cabeçalho X-Trello-Webhook: base64(HMAC-SHA1(secret, corpo + callback)).
+    """
+    digest = hmac.new(secret.encode(), body + callback_url.encode(), hashlib.sha1).digest()
+    return base64.b64encode(digest).decode()
+
+
+def jira_signature(secret: str, body: bytes) -> str:
+    """
+    Valor do cabeçalho X-Hub-Signature: sha256=HMAC-SHA256(secret, corpo).
+    """
+    return f'sha256={hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()}'
+
+
+def verify_trello_signature(secret: str, body: bytes, callback_url: str, signature: str) -> bool:
+    return hmac.compare_digest(trello_signature(secret, body, callback_url), signature or '')
+
+
+def verify_jira_signature(secret: str, body: bytes, signature: str) -> bool:
+    return hmac.compare_digest(jira_signature(secret, body), signature or '')
+
+
+def webhook_secrets(connection: dict, public_url: str = None) -> dict:
+    """
+    Segredos de webhook da conexão por API ('trello' e 'jira'), lidos das
+    variáveis de ambiente nomeadas em `webhook_secret`; None quando a API não
+    tem `webhook_secret` e os eventos dela são aceitos sem assinatura.
+
+    Levanta ValueError quando um segredo configurado não poderia ser
+    conferido (variável vazia, ou Trello sem `public_url`, que entra na
+    assinatura), em vez de aceitar eventos sem verificação.
+    """
+    secrets = {}
+    for api in ('trello', 'jira'):
+        secret_env = connection[api].get('webhook_secret')
+        if not secret_env:
+            secrets[api] = None
+            continue
+        secret = os.getenv(secret_env)
+        if not secret:
+            raise ValueError(f'{api}.webhook_secret: variável de ambiente {secret_env} vazia ou não definida')
+        secrets[api] = secret
+    if secrets['trello'] and not public_url:
+        raise ValueError('trello.webhook_secret exige --public-url para conferir as assinaturas do Trello')
+    return secrets
+
+
+class DebouncedQueue:
+    """
+    Fila de trabalho por item com debounce.
+
+    Cada `push` reinicia o prazo do item; ao fim do prazo o item é entregue a
+    um dos workers. Se chegar um evento enquanto o item está em execução, ele
+    é reprocessado logo depois, sem rodar em paralelo consigo mesmo.
+    """
+    def __init__(self, handler, delay: float = DEFAULT_DEBOUNCE_SECONDS, workers: int = DEFAULT_WORKERS):
+        self.handler = handler
+        self.delay = delay
+        self.workers = workers
+        self._timers = {}
+        self._queued = set()
+        self._running = set()
+        self._dirty = set()
+        self._queue = asyncio.Queue()
+        self._tasks = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def push(self, key):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        self._timers[key] = asyncio.get_running_loop().call_later(self.delay, self._ready, key)
+
+    def _ready(self, key):
+        self._timers.pop(key, None)
+        if key in self._running:
+            self._dirty.add(key)
+        elif key not in self._queued:
+            self._queued.add(key)
+            self._queue.put_nowait(key)
+
+    async def _worker(self):
+        while True:
+            key = await self._queue.get()
+            self._queued.discard(key)
+            self._running.add(key)
+            try:
+                await self.handler(key)
+            except Exception as e:
+                logger.error(f"Falha ao processar evento {key}: {str(e)}")
+            finally:
+                self._running.discard(key)
+                self._queue.task_done()
+            if key in self._dirty:
+                self._dirty.discard(key)
+                self._ready(key)
+
+    async def drain(self):
+        """
+        Aguarda até que não haja itens pendentes, agendados ou em execução.
+        """
+        while self._timers or self._queued or self._running:
+            await asyncio.sleep(self.delay / 4 or 0.01)
+
+    async def stop(self):
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+class SweepGate:
+    """
+    Revezamento entre a varredura de reconciliação de uma conexão e os itens
+    dos webhooks dela.
+
+    Os dois caminhos usam contextos e conexões ao banco de estado próprios:
+    juntos, ambos poderiam não achar o vínculo de um card novo e criar duas
+    issues, ou postar o mesmo comentário antes de o registro dele ser gravado.
+    A varredura espera os itens em execução terminarem; os itens que chegam
+    durante ela são adiados e entregues a `on_resume` quando ela termina,
+    sem ocupar os workers da fila enquanto isso.
+    """
+    def __init__(self, on_resume):
+        self.on_resume = on_resume
+        self.sweeping = False
+        self._active = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._deferred = []
+
+    def enter(self, key) -> bool:
+        """
+        Admite um item, ou o adia se houver uma varredura em andamento.
+        Itens admitidos devem chamar `leave` ao terminar.
+        """
+        if self.sweeping:
+            if key not in self._deferred:
+                self._deferred.append(key)
+            return False
+        self._active += 1
+        self._idle.clear()
+        return True
+
+    def leave(self):
+        self._active -= 1
+        if not self._active:
+            self._idle.set()
+
+    @asynccontextmanager
+    async def sweep(self):
+        """
+        Bloco exclusivo da varredura.
+        """
+        self.sweeping = True
+        try:
+            await self._idle.wait()
+            yield
+        finally:
+            self.sweeping = False
+            deferred, self._deferred = self._deferred, []
+            for key in deferred:
+                self.on_resume(key)
@@ -1,9 +1,9 @@
 import argparse
-import asyncio
+import json
 import logging
 import os
-import yaml
-from core.sync_engine import run_sync
+from core.config import ConfigError, compiled_config
+from core.startup import StartupProfile
 
 # Configuração do logging
 logging.basicConfig(
@@ -12,40 +12,78 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Dependências pesadas, importadas só depois de validar argumentos e
+# configuração; importadas nesta ordem, o perfil mostra o custo de cada uma
+ENGINE_MODULES = ('asyncio', 'aiohttp', 'prometheus_client', 'core.sync_engine')
+
 def main():
+    profile = StartupProfile()
     parser = argparse.ArgumentParser(description='Run Trello-Jira sync for a connection')
     parser.add_argument('--config', default='config/mappings.yaml', help='Path to mappings YAML')
+    parser.add_argument('--config-cache', default=None,
+                        help='Path of the compiled config cache (default: next to the config file; empty disables it)')
     parser.add_argument('--connection-index', type=int, required=True, help='Index of connection to run')
-    parser.add_argument('--last-sync', default=None, help='Timestamp of last sync')
+    parser.add_argument('--last-sync', default=None, help='Timestamp of last sync (defaults to the stored watermarks)')
+    parser.add_argument('--plan', action='store_true',
+                        help='Fetch and compare without writing anything; print the planned changes and API cost as JSON')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='Log the time spent on imports, config loading and the sync itself')
     args = parser.parse_args()
 
     try:
         logger.info(f"Carregando configuração de {args.config}")
-        data = yaml.safe_load(open(args.config))
-        connections = data.get('connections', [])
+        with profile.step('configuração') as step:
+            data, cached = compiled_config(args.config, cache_path=args.config_cache)
+            step['detail'] = 'cache' if cached else 'YAML validado'
+        connections = data['connections']
 
         if args.connection_index < 0 or args.connection_index >= len(connections):
             raise IndexError(f'connection-index {args.connection_index} fora do intervalo (0-{len(connections)-1})')
 
         connection = connections[args.connection_index]
-        last_sync = args.last_sync or '1970-01-01T00:00:00Z'
 
         logger.info(f"Iniciando sincronização para conexão {args.connection_index}")
         logger.info(f"Board Trello: {os.getenv(connection['trello']['board_id'], 'NOT_SET')}")
         logger.info(f"Projeto Jira: {os.getenv(connection['jira']['project_key'], 'NOT_SET')}")
 
-        asyncio.run(run_sync(connection, last_sync))
+        profile.imports(*ENGINE_MODULES)
+        import asyncio
+        from core import metrics
+        from core.plan import SyncPlan
+        from core.sync_engine import connection_id, run_sync
+
+        if args.plan:
+            # Simulação: o plano vai para a saída padrão e nada é enviado ao Pushgateway
+            plan = SyncPlan(connection_id(connection), {
+                'trello': connection['trello'].get('rate_limit'),
+                'jira': connection['jira'].get('rate_limit'),
+            })
+            with profile.step('plano'):
+                asyncio.run(run_sync(connection, args.last_sync, plan=plan))
+            print(json.dumps(plan.to_dict(), indent=2))
+            logger.info("Plano concluído; nenhuma alteração foi gravada")
+            return
+
+        try:
+            with profile.step('sincronização'):
+                asyncio.run(run_sync(connection, args.last_sync))
+        finally:
+            # Execução avulsa: as métricas vão para o Pushgateway, se configurado
+            metrics.push({'connection': connection_id(connection)})
         logger.info("Sincronização concluída com sucesso")
 
     except FileNotFoundError:
         logger.error(f"Arquivo de configuração não encontrado: {args.config}")
         raise
-    except yaml.YAMLError as e:
-        logger.error(f"Erro ao processar arquivo YAML: {str(e)}")
+    except ConfigError as e:
+        logger.error(str(e))
         raise
     except Exception as e:
         logger.error(f"Erro durante a sincronização: {str(e)}")
         raise
+    finally:
+        if args.profile_startup:
+            profile.log()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,105 @@
+import argparse
+import asyncio
+import logging
+import signal
+from datetime import datetime
+from core import metrics
+from core.config import ConfigError, load_config
+from core.cron import CronSchedule
+from core.http import SessionPool
+from core.sync_engine import run_sync
+
+# Configuração do logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = '*/5 * * * *'
+DEFAULT_MAX_PARALLEL = 4
+
+async def run_connection(index: int, connection: dict, pool: SessionPool, limiter: asyncio.Semaphore,
+                         stop: asyncio.Event, interval: str = None, run=None):
+    """
+    Executa uma conexão repetidamente, conforme o cron de `sync.interval`
+    (ou de `interval`, quando informado). Cada execução parte das marcas
+    d'água salvas no estado da conexão. `run`, quando informado, é a
+    corrotina sem argumentos que substitui `run_sync` em cada execução.
+    """
+    schedule = CronSchedule(interval or connection['sync'].get('interval', DEFAULT_INTERVAL))
+
+    while not stop.is_set():
+        next_run = schedule.next_after(datetime.now())
+        delay = (next_run - datetime.now()).total_seconds()
+        logger.info(f"Conexão {index}: próxima execução às {next_run:%Y-%m-%d %H:%M}")
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=max(0, delay))
+            break
+        except asyncio.TimeoutError:
+            pass
+
+        async with limiter:
+            try:
+                await (run() if run else run_sync(connection, pool=pool))
+                logger.info(f"Conexão {index}: sincronização concluída")
+            except Exception as e:
+                # Uma conexão com falha não derruba as demais; tenta de novo no próximo horário
+                logger.error(f"Conexão {index}: falha na sincronização: {str(e)}")
+
+async def run_daemon(connections: list, max_parallel: int, http_options: dict = None):
+    """
+    Executa todas as conexões em um único event loop, compartilhando as
+    sessões HTTP por host e limitando quantas sincronizam ao mesmo tempo.
+    """
+    pool = SessionPool(http_options)
+    limiter = asyncio.Semaphore(max_parallel)
+    stop = asyncio.Event()
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+
+    try:
+        await asyncio.gather(*(
+            run_connection(index, connection, pool, limiter, stop)
+            for index, connection in enumerate(connections)
+        ))
+    finally:
+        logger.info(f"Conexões HTTP: {pool.stats.summary()}")
+        await pool.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Run all Trello-Jira connections on their cron schedules')
+    parser.add_argument('--config', default='config/mappings.yaml', help='Path to mappings YAML')
+    parser.add_argument('--max-parallel', type=int, default=DEFAULT_MAX_PARALLEL,
+                        help='Maximum number of connections syncing at the same time')
+    parser.add_argument('--metrics-port', type=int, default=metrics.DEFAULT_METRICS_PORT,
+                        help='Port for the Prometheus /metrics endpoint (0 disables it)')
+    args = parser.parse_args()
+
+    try:
+        logger.info(f"Carregando configuração de {args.config}")
+        data = load_config(args.config)
+        connections = data['connections']
+        if not connections:
+            raise ValueError('Nenhuma conexão configurada')
+
+        if args.metrics_port:
+            metrics.serve(args.metrics_port)
+        logger.info(f"Iniciando daemon com {len(connections)} conexões")
+        asyncio.run(run_daemon(connections, args.max_parallel, data.get('http')))
+        logger.info("Daemon finalizado")
+
+    except FileNotFoundError:
+        logger.error(f"Arquivo de configuração não encontrado: {args.config}")
+        raise
+    except ConfigError as e:
+        logger.error(str(e))
+        raise
+
+if __name__ == '__main__':
+    main()
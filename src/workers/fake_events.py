@@ -0,0 +1,83 @@
+import argparse
+import asyncio
+import json
+import logging
+import aiohttp
+from core.webhooks import jira_signature, trello_signature
+
+# Configuração do logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def trello_payload(card_id: str, text: str = None) -> dict:
+    """
+    Evento no formato enviado pelo webhook do Trello.
+    """
+    if text is not None:
+        return {'action': {'type': 'commentCard', 'data': {'card': {'id': card_id}, 'text': text}}}
+    return {'action': {'type': 'updateCard', 'data': {'card': {'id': card_id}}}}
+
+def jira_payload(issue_key: str, comment: str = None) -> dict:
+    """
+    Evento no formato enviado pelo webhook do Jira.
+    """
+    if comment is not None:
+        return {'webhookEvent': 'comment_created', 'issue': {'key': issue_key}, 'comment': {'body': comment}}
+    return {'webhookEvent': 'jira:issue_updated', 'issue': {'key': issue_key}}
+
+async def post_event(session, url: str, body: bytes, headers: dict) -> int:
+    async with session.post(url, data=body, headers={'Content-Type': 'application/json', **headers}) as resp:
+        return resp.status
+
+async def send_events(url: str, index: int, cards: list, issues: list, repeat: int,
+                      trello_secret: str = None, jira_secret: str = None, public_url: str = None):
+    """
+    Envia os eventos. Com os segredos, assina como o Trello (corpo + URL
+    pública de callback) e como o Jira (corpo), sobre os bytes enviados.
+    """
+    public_url = (public_url or url).rstrip('/')
+    async with aiohttp.ClientSession() as session:
+        for _ in range(repeat):
+            for card_id in cards:
+                path = f'/webhooks/trello/{index}'
+                body = json.dumps(trello_payload(card_id)).encode()
+                headers = {}
+                if trello_secret:
+                    headers['X-Trello-Webhook'] = trello_signature(trello_secret, body, f'{public_url}{path}')
+                status = await post_event(session, f'{url}{path}', body, headers)
+                logger.info(f"Evento do card {card_id}: HTTP {status}")
+            for issue_key in issues:
+                body = json.dumps(jira_payload(issue_key)).encode()
+                headers = {}
+                if jira_secret:
+                    headers['X-Hub-Signature'] = jira_signature(jira_secret, body)
+                status = await post_event(session, f'{url}/webhooks/jira/{index}', body, headers)
+                logger.info(f"Evento da issue {issue_key}: HTTP {status}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Send fake Trello/Jira webhook events to a local webhook server')
+    parser.add_argument('--url', default='http://localhost:8080', help='Base URL of the webhook server')
+    parser.add_argument('--connection-index', type=int, default=0, help='Index of the connection')
+    parser.add_argument('--card', action='append', default=[], help='Trello card ID (repeatable)')
+    parser.add_argument('--issue', action='append', default=[], help='Jira issue key (repeatable)')
+    parser.add_argument('--repeat', type=int, default=1, help='Send each event this many times (to exercise debounce)')
+    parser.add_argument('--secret', default=None,
+                        help='Sign events for both APIs with this webhook secret (the value, not the env var name)')
+    parser.add_argument('--trello-secret', default=None, help='Trello webhook secret (overrides --secret)')
+    parser.add_argument('--jira-secret', default=None, help='Jira webhook secret (overrides --secret)')
+    parser.add_argument('--public-url', default=None,
+                        help='Public URL the server was started with, part of the Trello signature (defaults to --url)')
+    args = parser.parse_args()
+
+    if not args.card and not args.issue:
+        parser.error('informe ao menos um --card ou --issue')
+    asyncio.run(send_events(args.url.rstrip('/'), args.connection_index, args.card, args.issue, args.repeat,
+                            trello_secret=args.trello_secret or args.secret,
+                            jira_secret=args.jira_secret or args.secret,
+                            public_url=args.public_url))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+import argparse
+import asyncio
+import functools
+import json
+import logging
+from aiohttp import web
+from core import metrics
+from core.config import ConfigError, load_config
+from core.http import SessionPool
+from core.sync_engine import SyncContext, create_clients, open_store, run_sync, sync_card_by_id, sync_issue_by_key
+from core.webhooks import (CARD, DEFAULT_DEBOUNCE_SECONDS, DebouncedQueue, SweepGate, jira_event_items,
+                           trello_event_items, verify_jira_signature, verify_trello_signature, webhook_secrets)
+from workers.daemon import DEFAULT_MAX_PARALLEL, run_connection
+
+# Configuração do logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_RECONCILE_INTERVAL = '0 * * * *'
+
+class WebhookServer:
+    """
+    Recebe webhooks do Trello e do Jira e sincroniza apenas os itens afetados.
+    A sincronização por polling continua como varredura de reconciliação,
+    em `sync.reconcile_interval`; enquanto ela roda, os itens da conexão
+    esperam por ela (veja `SweepGate`).
+    """
+    def __init__(self, connections: list, debounce: float, public_url: str = None,
+                 reconcile: bool = True, max_parallel: int = DEFAULT_MAX_PARALLEL):
+        self.connections = connections
+        self.public_url = public_url.rstrip('/') if public_url else None
+        # Segredos resolvidos já na partida: um webhook_secret que não pode ser
+        # conferido impede o servidor de subir em vez de aceitar eventos sem assinatura
+        self.secrets = []
+        for index, connection in enumerate(connections):
+            try:
+                self.secrets.append(webhook_secrets(connection, self.public_url))
+            except ValueError as e:
+                raise ValueError(f'Conexão {index}: {str(e)}') from e
+        self.reconcile = reconcile
+        self.max_parallel = max_parallel
+        self.queue = DebouncedQueue(self.handle_item, delay=debounce)
+        self.gates = [SweepGate(self.queue.push) for _ in connections]
+        self.pool = None
+        self.contexts = []
+        self.stop = asyncio.Event()
+        self.tasks = []
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        # add_get também responde ao HEAD de verificação do Trello
+        app.router.add_get('/webhooks/trello/{index}', self.trello_verify)
+        app.router.add_post('/webhooks/trello/{index}', self.trello_event)
+        app.router.add_post('/webhooks/jira/{index}', self.jira_event)
+        app.router.add_get('/metrics', self.metrics_page)
+        app.on_startup.append(self.on_startup)
+        app.on_cleanup.append(self.on_cleanup)
+        return app
+
+    async def on_startup(self, app):
+        self.pool = SessionPool()
+        for connection in self.connections:
+            trello, jira = create_clients(connection, self.pool)
+            self.contexts.append(SyncContext(connection, trello, jira, open_store(connection['sync'])))
+        self.queue.start()
+
+        if self.reconcile:
+            limiter = asyncio.Semaphore(self.max_parallel)
+            self.tasks = [
+                asyncio.create_task(run_connection(
+                    index, connection, self.pool, limiter, self.stop,
+                    interval=connection['sync'].get('reconcile_interval', DEFAULT_RECONCILE_INTERVAL),
+                    run=functools.partial(self.sweep, index)
+                ))
+                for index, connection in enumerate(self.connections)
+            ]
+        logger.info(f"Recebendo webhooks de {len(self.connections)} conexões")
+
+    async def on_cleanup(self, app):
+        self.stop.set()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        await self.queue.stop()
+        for ctx in self.contexts:
+            ctx.store.close()
+        await self.pool.close()
+
+    def _context(self, request):
+        try:
+            return int(request.match_info['index']), self.contexts[int(request.match_info['index'])]
+        except (ValueError, IndexError):
+            raise web.HTTPNotFound()
+
+    async def trello_verify(self, request):
+        # O Trello confirma a URL de callback com um HEAD antes de criar o webhook
+        self._context(request)
+        return web.Response()
+
+    async def trello_event(self, request):
+        index, _ = self._context(request)
+        body = await request.read()
+        secret = self.secrets[index]['trello']
+        if secret:
+            callback = f'{self.public_url}{request.path}'
+            if not verify_trello_signature(secret, body, callback, request.headers.get('X-Trello-Webhook')):
+                raise web.HTTPUnauthorized()
+        self._enqueue(index, trello_event_items(json.loads(body or b'{}')))
+        return web.Response()
+
+    async def jira_event(self, request):
+        index, _ = self._context(request)
+        body = await request.read()
+        secret = self.secrets[index]['jira']
+        if secret:
+            if not verify_jira_signature(secret, body, request.headers.get('X-Hub-Signature')):
+                raise web.HTTPUnauthorized()
+        self._enqueue(index, jira_event_items(json.loads(body or b'{}')))
+        return web.Response()
+
+    async def metrics_page(self, request):
+        body, content_type = metrics.exposition()
+        return web.Response(body=body, headers={'Content-Type': content_type})
+
+    def _enqueue(self, index: int, items: list):
+        for kind, item_id in items:
+            self.queue.push((index, kind, item_id))
+
+    async def sweep(self, index: int):
+        """
+        Varredura de reconciliação da conexão, sem itens dos webhooks dela
+        em execução ao mesmo tempo.
+        """
+        async with self.gates[index].sweep():
+            return await run_sync(self.connections[index], pool=self.pool)
+
+    async def handle_item(self, key):
+        index, kind, item_id = key
+        gate = self.gates[index]
+        if not gate.enter(key):
+            logger.debug(f"{kind} {item_id} adiado até o fim da varredura da conexão {index}")
+            return
+        try:
+            ctx = self.contexts[index]
+            if kind == CARD:
+                await sync_card_by_id(ctx, item_id)
+            else:
+                await sync_issue_by_key(ctx, item_id)
+        finally:
+            gate.leave()
+
+def main():
+    parser = argparse.ArgumentParser(description='Receive Trello and Jira webhooks and sync the affected items')
+    parser.add_argument('--config', default='config/mappings.yaml', help='Path to mappings YAML')
+    parser.add_argument('--host', default='0.0.0.0', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on')
+    parser.add_argument('--debounce', type=float, default=DEFAULT_DEBOUNCE_SECONDS,
+                        help='Seconds to wait for more events on the same item before syncing it')
+    parser.add_argument('--public-url', default=None,
+                        help='Public base URL of this server, used to check Trello webhook signatures')
+    parser.add_argument('--no-reconcile', action='store_true', help='Disable the polling reconciliation sweep')
+    parser.add_argument('--max-parallel', type=int, default=DEFAULT_MAX_PARALLEL,
+                        help='Maximum number of connections reconciling at the same time')
+    args = parser.parse_args()
+
+    try:
+        logger.info(f"Carregando configuração de {args.config}")
+        data = load_config(args.config)
+        connections = data['connections']
+        if not connections:
+            raise ValueError('Nenhuma conexão configurada')
+
+        server = WebhookServer(connections, args.debounce, args.public_url,
+                               reconcile=not args.no_reconcile, max_parallel=args.max_parallel)
+        web.run_app(server.app(), host=args.host, port=args.port)
+
+    except FileNotFoundError:
+        logger.error(f"Arquivo de configuração não encontrado: {args.config}")
+        raise
+    except ConfigError as e:
+        logger.error(str(e))
+        raise
+    except ValueError as e:
+        logger.error(f"Configuração de webhooks inválida: {str(e)}")
+        raise
+
+if __name__ == '__main__':
+    main()
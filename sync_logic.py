@@ -1,125 +1,408 @@
+import argparse
 import os
-import yaml
 import json
 import logging
-from datetime import datetime
-from trello_jira_sync import TrelloClient, JiraClient
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.core.attachments import (CHUNK_SIZE, DEFAULT_MIME_TYPE, AttachmentCache, AttachmentTooLarge, attachment_name,
+                                  attachment_options, is_upload, pending_uploads)
+from src.core.card_fetch import (DEFAULT_CARD_PAGE_SIZE, card_position, embedded_attachments, embedded_checklists,
+                                 embedded_comments, pass_start)
+from src.core.change_detection import (SYNCED_FIELDS, TRELLO_KEYS, canonical_from_jira, canonical_from_trello,
+                                       changed_fields, jira_search_fields, normalize_due)
+from src.core.config import LEGACY, compiled_config
+from src.core.issue_lookup import jql_datetime
+from src.core.mentions import translator_for
+from src.core.outbox import Outbox
+from src.core.report import SyncReport
+from src.core.startup import StartupProfile
+from src.core.subtasks import adopt_existing, checklist_items, plan_subtasks
+from src.core.store import (DEFAULT_LINK_MAX_AGE, EPOCH, JIRA_SIDE, JIRA_TO_TRELLO, TRELLO_SIDE, TRELLO_TO_JIRA,
+                            SyncStore, value_hash)
 
 logging.basicConfig(level=logging.INFO)
 
-def load_config():
-    with open('config.yaml', 'r') as f:
-        return yaml.safe_load(f)
+SYNC_FIELDS = ['checklists', 'attachments', 'comments']
+DEFAULT_CHECKPOINT_EVERY = 50
+DEFAULT_WRITE_WORKERS = 4
+CONFIG_FILE = 'config.yaml'
+# Importadas só na sincronização (veja sync); nesta ordem, o perfil de
+# inicialização mostra o custo de cada uma
+CLIENT_MODULES = ('requests', 'prometheus_client', 'trello_jira_sync')
+
+def load_config(path=CONFIG_FILE, cache_path=None):
+    return compiled_config(path, LEGACY, cache_path)[0]
 
 def load_state(path):
+    data = {}
     if os.path.exists(path):
         with open(path, 'r') as f:
             data = json.load(f)
-        return data.get('last_run')
-    return '1970-01-01T00:00:00Z'
+    # Arquivos antigos guardam apenas last_run, comum às duas direções
+    last_run = data.get('last_run', EPOCH)
+    return {'trello': data.get('trello', last_run), 'jira': data.get('jira', last_run),
+            'trello_pass': data.get('trello_pass')}
+
+def save_state(path, state):
+    # Grava em um arquivo temporário e troca de uma vez, para que uma
+    # interrupção no meio nunca deixe o estado truncado
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'last_run': min(state['trello'], state['jira']), **state}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def state_db_path(sync_conf, state_file):
+    return sync_conf.get('state_db', os.path.join(os.path.dirname(state_file), 'state.db'))
+
+def connection_name(config):
+    return config['sync'].get('name') or f"{config['trello']['board_id']}:{config['jira']['project_key']}"
+
+def find_linked_issues(store, jira, jira_conf, card_ids):
+    cf_id = jira_conf['customfield_trello_id']
+    existing = store.links.resolve(card_ids)
+    missing = [card_id for card_id in card_ids if card_id not in existing]
+    if missing:
+        found = jira.find_issues_by_trello_ids(jira_conf['project_key'], cf_id, missing)
+        store.links.link_many(found)
+        store.links.forget([card_id for card_id in missing if card_id not in found])
+        existing.update(found)
+    logging.info(f'{len(card_ids) - len(missing)} vínculos card/issue vindos do índice local, {len(missing)} consultados no Jira')
+    return existing
+
+def sync_subtasks(store, jira, card_id, key, checklists, duedate, created, sync_plan=None):
+    items = checklist_items(checklists)
+    if not items:
+        return 0
+    known = store.subtasks.for_card(card_id)
+    if not known and not created:
+        # Issue anterior ao registro de subtarefas: aproveita as que já existem
+        adopted = adopt_existing(items, jira.get_subtasks(key))
+        if adopted:
+            store.subtasks.record(card_id, adopted)
+            known = store.subtasks.for_card(card_id)
+
+    to_create, to_rename = plan_subtasks(items, known)
+    if sync_plan:
+        sync_plan.subtasks(key, to_create, to_rename)
+        return 0
+    if to_create:
+        # Registradas a cada lote: uma falha adiante não gera duplicatas na próxima execução
+        def created_subtasks(entries):
+            store.subtasks.record(card_id, [(to_create[index][0], sub_key, to_create[index][1]) for index, sub_key in entries])
+        jira.create_subtasks(key, [item_name for _, item_name in to_create], duedate=duedate, on_created=created_subtasks)
+    for _, sub_key, item_name in to_rename:
+        jira.update_issue(sub_key, {'summary': item_name})
+    if to_rename:
+        store.subtasks.record(card_id, to_rename)
+    return len(to_create) + len(to_rename)
+
+def mirror_attachments(store, cache, trello, jira, key, attachments, max_bytes):
+    # Cada arquivo é baixado uma vez (URL -> sha256) e anexado uma vez por issue
+    uploaded = 0
+    for att in attachments:
+        if not is_upload(att):
+            continue
+        url = att['url']
+        if (att.get('bytes') or 0) > max_bytes:
+            logging.info(f'Anexo {url} ignorado: acima do limite de {max_bytes} bytes')
+            continue
+        sha256 = store.attachments.digest_for(url)
+        if sha256 and store.attachments.uploaded(key, sha256):
+            continue
+        path = cache.path(sha256) if sha256 else None
+        if path is None:
+            try:
+                with cache.spool(max_bytes) as spool:
+                    for chunk in trello.iter_attachment(url, CHUNK_SIZE):
+                        spool.write(chunk)
+                    sha256, path = spool.commit()
+            except AttachmentTooLarge as e:
+                logging.info(f'Anexo {url} ignorado: {e}')
+                continue
+            store.attachments.remember(url, sha256, spool.size)
+            if store.attachments.uploaded(key, sha256):
+                continue
+        result = jira.add_attachment(key, path, attachment_name(att), att.get('mimeType') or DEFAULT_MIME_TYPE)
+        store.attachments.record_upload(key, sha256, result[0].get('id') if result else None)
+        uploaded += 1
+    return uploaded
 
-def save_state(path, timestamp):
-    with open(path, 'w') as f:
-        json.dump({'last_run': timestamp}, f)
+def snapshot_saver(store, side, item_id, source, target_side, target_id, payload, canonical):
+    # Chamado pela outbox após o PUT, com os campos efetivamente escritos
+    def done(kept):
+        store.snapshots.save(side, item_id, source)
+        store.snapshots.save(target_side, target_id, canonical(payload, kept))
+    return done
 
-def convert_mentions(text, mapping):
-    for src, dst in mapping.items():
-        text = text.replace(f'@{src}', f'@{dst}')
-    return text
+def comment_recorder(store, direction, source_id, text):
+    return lambda posted: store.comments.record(direction, source_id, text, posted.get('id'))
 
-def sync():
-    config = load_config()
+def flush_outbox(outbox, trello, jira, report, workers=DEFAULT_WRITE_WORKERS, sync_plan=None):
+    # As requisições rodam em threads; os callbacks gravam no SQLite e por
+    # isso rodam nesta thread, inclusive para o que concluiu antes de um erro
+    if sync_plan:
+        sync_plan.record(outbox.drain())
+        return
+    def apply(entry):
+        done = []
+        try:
+            if entry.payload:
+                if entry.side == JIRA_SIDE:
+                    jira.update_issue(entry.item_id, entry.payload)
+                else:
+                    trello.update_card(entry.item_id, entry.payload)
+                done.append((entry.on_update, ()))
+            for text, callback in entry.comments:
+                if entry.side == JIRA_SIDE:
+                    posted = jira.add_comment(entry.item_id, text)
+                else:
+                    posted = trello.add_comment(entry.item_id, text)
+                done.append(([callback] if callback else [], (posted,)))
+        except Exception as e:
+            return done, e
+        return done, None
+
+    errors = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for done, error in executor.map(apply, outbox.drain()):
+            for callbacks, args in done:
+                report.writes += 1
+                for callback in callbacks:
+                    callback(*args)
+            if error:
+                errors.append(error)
+    if errors:
+        raise errors[0]
+
+def sync(config=None, plan=False):
+    # Com plan=True nada é escrito (APIs, state.json ou banco, aberto como
+    # cópia em memória) e o retorno é o SyncPlan com as escritas projetadas
+    # Clientes HTTP e métricas só aqui: importar sync_logic e carregar a
+    # configuração não paga requests nem prometheus_client
+    from trello_jira_sync import TrelloClient, JiraClient
+    from src.core import metrics
+    from src.core.plan import SyncPlan
+    config = config or load_config()
     state_file = config['sync'].get('state_file', 'state.json')
-    last_run = load_state(state_file)
-    now = datetime.utcnow().isoformat() + 'Z'
-    logging.info(f'Iniciando sincronização (última execução: {last_run})')
+    state = load_state(state_file)
+    checkpoint_every = config['sync'].get('checkpoint_every', DEFAULT_CHECKPOINT_EVERY)
+    # Passada do Trello interrompida: retoma com o mesmo since, de onde parou
+    trello_pass = state['trello_pass'] or {'since': state['trello'], 'started': pass_start(), 'position': None}
+    logging.info(f'Iniciando sincronização (Trello desde {trello_pass["since"]}, Jira desde {state["jira"]})')
 
     trello_conf = config['trello']
     jira_conf = config['jira']
-    trello = TrelloClient()
-    jira = JiraClient()
+    trello = TrelloClient(rate_limit=trello_conf.get('rate_limit'), base_url=trello_conf.get('api_url'))
+    jira = JiraClient(rate_limit=jira_conf.get('rate_limit'))
+    max_age = config['sync'].get('link_max_age_hours')
+    state_db = state_db_path(config['sync'], state_file)
+    store = SyncStore(state_db, link_max_age=max_age * 3600 if max_age is not None else DEFAULT_LINK_MAX_AGE,
+                      in_memory=plan)
+    att_options = attachment_options(config['sync'], state_db)
+    att_cache = AttachmentCache(att_options['cache_dir'], att_options['cache_max_bytes'], read_only=plan)
+    report = SyncReport()
+    name = connection_name(config)
+    to_jira = translator_for(jira_conf.get('user_mapping'))
+    to_trello = to_jira.inverse
+    outbox = Outbox(report)
+    workers = config['sync'].get('max_concurrency', DEFAULT_WRITE_WORKERS)
+    sync_plan = SyncPlan(name, {'trello': trello_conf.get('rate_limit'), 'jira': jira_conf.get('rate_limit')}) if plan else None
 
-    # Trello -> Jira
-    cards = trello.get_cards(trello_conf['board_id'], since=last_run)
-    for card in cards:
-        if 'list_ids' in trello_conf and card.get('idList') not in trello_conf['list_ids']:
-            continue
+    # Trello -> Jira, página a página; a posição é o checkpoint e a marca
+    # d'água só avança no fim da passada, para o horário em que ela começou
+    pages = trello.iter_card_pages(trello_conf['board_id'], trello_pass['since'], sync_fields=SYNC_FIELDS,
+                                   list_ids=trello_conf.get('list_ids'), position=trello_pass['position'],
+                                   page_size=trello_conf.get('page_size') or DEFAULT_CARD_PAGE_SIZE)
+    cf_id = jira_conf['customfield_trello_id']
+    for endpoint, page in pages:
+        with metrics.phase(name, metrics.LOOKUP):
+            existing = find_linked_issues(store, jira, jira_conf, [card['id'] for card in page])
 
-        cf_id = jira_conf['customfield_trello_id']
-        jql = f"project={jira_conf['project_key']} AND \"{cf_id}\" = \"{card['id']}\""
-        issues = jira.search_issues(jql)
+        for index, card in enumerate(page, 1):
+            started = time.perf_counter()
+            report.processed += 1
+            summary = card.get('name', '')
+            desc = to_jira.translate(card.get('desc', ''))
 
-        summary = card.get('name', '')
-        desc = convert_mentions(card.get('desc', ''), jira_conf.get('user_mapping', {}))
+            # Attachments
+            attachments = embedded_attachments(card)
+            if attachments is None:
+                attachments = trello.get_attachments(card['id'])
+            # Arquivos são copiados para a issue; links continuam na descrição
+            for att in attachments:
+                if not is_upload(att):
+                    desc += f"\nAttachment: {att.get('url')}"
 
-        # Attachments
-        attachments = trello.get_attachments(card['id'])
-        for att in attachments:
-            desc += f"\nAttachment: {att.get('url')}"
+            duedate = normalize_due(card.get('due'))
+            fields = {'summary': summary, 'description': desc, 'duedate': duedate}
+            source = canonical_from_trello(card)
 
-        # Due date
-        fields = {}
-        if card.get('due'):
-            fields['duedate'] = card.get('due')
+            key = existing.get(card['id'])
+            created = key is None
+            if key:
+                changed = changed_fields(store.snapshots.get(TRELLO_SIDE, card['id']), source, value_hash)
+                if changed:
+                    logging.info(f'Atualizando issue {key} para o card {card["id"]}: {", ".join(changed)}')
+                    outbox.update(JIRA_SIDE, key, fields, changed, (TRELLO_SIDE, card['id']),
+                                  on_done=snapshot_saver(store, TRELLO_SIDE, card['id'], source, JIRA_SIDE, key, fields,
+                                                         canonical_from_jira))
+                else:
+                    report.writes_avoided += 1
 
-        if issues:
-            key = issues[0]['key']
-            logging.info(f'Atualizando issue {key} para o card {card["id"]}')
-            jira.update_issue(key, {'summary': summary, 'description': desc, **fields})
+                # Comments
+                with metrics.phase(name, metrics.COMMENTS):
+                    comments = embedded_comments(card)
+                    if comments is None:
+                        comments = trello.get_comments(card['id'])
+                    comments = [(c['id'], c['data']['text']) for c in comments]
+                    for c_id, raw in store.comments.pending(TRELLO_TO_JIRA, comments):
+                        outbox.comment(JIRA_SIDE, key, to_jira.translate(raw),
+                                       on_done=comment_recorder(store, TRELLO_TO_JIRA, c_id, raw))
+            else:
+                logging.info(f'Criando issue para card {card["id"]}')
+                if sync_plan:
+                    key = sync_plan.create_issue(card['id'], source)
+                else:
+                    with metrics.phase(name, metrics.WRITE):
+                        new = jira.create_issue(
+                            jira_conf['project_key'],
+                            summary,
+                            desc,
+                            duedate=fields['duedate'],
+                            custom_fields={cf_id: card['id']}
+                        )
+                    key = new.get('key')
+                    report.writes += 1
+                store.links.link(card['id'], key)
+                store.snapshots.save(TRELLO_SIDE, card['id'], source)
+                store.snapshots.save(JIRA_SIDE, key, canonical_from_jira(fields))
+                outbox.mark_written(JIRA_SIDE, key, source)
 
-            # Comments
-            comments = trello.get_comments(card['id'])
-            for c in comments:
-                text = convert_mentions(c['data']['text'], jira_conf.get('user_mapping', {}))
-                jira.add_comment(key, text)
-        else:
-            logging.info(f'Criando issue para card {card["id"]}')
-            new = jira.create_issue(
-                jira_conf['project_key'],
-                summary,
-                desc,
-                duedate=card.get('due'),
-                custom_fields={cf_id: card['id']}
-            )
-            key = new.get('key')
+            if sync_plan:
+                sync_plan.attachments(key, pending_uploads(store.attachments, att_cache, key, attachments,
+                                                           att_options['max_bytes']))
+            else:
+                with metrics.phase(name, metrics.WRITE):
+                    report.writes += mirror_attachments(store, att_cache, trello, jira, key, attachments,
+                                                        att_options['max_bytes'])
 
             # Subtasks
-            checklists = trello.get_checklists(card['id'])
-            for cl in checklists:
-                for item in cl.get('checkItems', []):
-                    jira.create_subtask(key, item.get('name'), duedate=card.get('due'))
+            checklists = embedded_checklists(card)
+            if checklists is None:
+                checklists = trello.get_checklists(card['id'])
+            with metrics.phase(name, metrics.WRITE):
+                report.writes += sync_subtasks(store, jira, card['id'], key, checklists, duedate, created, sync_plan)
+
+            report.observe(time.perf_counter() - started)
+            if index % checkpoint_every == 0 or index == len(page):
+                with metrics.phase(name, metrics.WRITE):
+                    flush_outbox(outbox, trello, jira, report, workers, sync_plan)
+                if not sync_plan:
+                    trello_pass['position'] = card_position(endpoint, card['id'])
+                    state['trello_pass'] = trello_pass
+                    save_state(state_file, state)
+    if not sync_plan:
+        state['trello'] = max(trello_pass['since'], trello_pass['started'])
+        state['trello_pass'] = None
+        save_state(state_file, state)
 
     # Jira -> Trello
-    jql2 = f"project={jira_conf['project_key']} AND updated > \"{last_run}\""
-    issues = jira.search_issues(jql2)
-    inv_mapping = {v: k for k, v in jira_conf.get('user_mapping', {}).items()}
+    # Apenas issues ligadas a um card interessam; a JQL tem precisão de
+    # minuto, então o próprio minuto da marca d'água é incluído
+    jql2 = (
+        f"project={jira_conf['project_key']} AND \"{cf_id}\" is not EMPTY "
+        f"AND updated >= \"{jql_datetime(state['jira'])}\" ORDER BY updated ASC"
+    )
+    pages = jira.iter_issue_pages(jql2, fields=jira_search_fields(SYNCED_FIELDS, cf_id))
 
-    for issue in issues:
-        t_id = issue['fields'].get(jira_conf['customfield_trello_id'])
-        if not t_id:
-            continue
+    for page in pages:
+        for issue in page:
+            started = time.perf_counter()
+            t_id = store.links.card_for(issue['key'])
+            if not t_id:
+                t_id = issue['fields'].get(cf_id)
+                if not t_id:
+                    report.skipped += 1
+                    continue
+                store.links.link(t_id, issue['key'])
+            report.processed += 1
 
-        logging.info(f'Atualizando card {t_id} para issue {issue["key"]}')
-        data = {}
-        fields = issue['fields']
+            data = {}
+            fields = issue['fields']
 
-        if fields.get('summary'):
-            data['name'] = fields['summary']
-        if fields.get('description'):
-            data['desc'] = fields['description']
-        if fields.get('duedate'):
-            data['due'] = fields['duedate']
+            if fields.get('summary'):
+                data['name'] = fields['summary']
+            if fields.get('description'):
+                data['desc'] = to_trello.translate(fields['description'])
+            if fields.get('duedate'):
+                data['due'] = fields['duedate']
 
-        trello.update_card(t_id, data)
+            source = canonical_from_jira(fields)
+            changed = changed_fields(store.snapshots.get(JIRA_SIDE, issue['key']), source, value_hash)
+            changed = [f for f in changed if data.get(TRELLO_KEYS[f])]
+            if changed:
+                # Campos que esta execução acabou de escrever na issue não voltam ao card
+                kept = outbox.update(TRELLO_SIDE, t_id, data, changed, (JIRA_SIDE, issue['key']),
+                                     on_done=snapshot_saver(store, JIRA_SIDE, issue['key'], source, TRELLO_SIDE, t_id,
+                                                            data, canonical_from_trello))
+                if kept:
+                    logging.info(f'Atualizando card {t_id} para issue {issue["key"]}: {", ".join(kept)}')
+                else:
+                    store.snapshots.save(JIRA_SIDE, issue['key'], source)
+            else:
+                report.writes_avoided += 1
 
-        # Comments
-        j_comments = jira.get_comments(issue['key'])
-        for jc in j_comments:
-            text = convert_mentions(jc.get('body', ''), inv_mapping)
-            trello.add_comment(t_id, text)
+            # Comments
+            with metrics.phase(name, metrics.COMMENTS):
+                j_comments = [(jc['id'], jc.get('body', '')) for jc in jira.get_comments(issue['key'])]
+                for jc_id, raw in store.comments.pending(JIRA_TO_TRELLO, j_comments):
+                    outbox.comment(TRELLO_SIDE, t_id, to_trello.translate(raw),
+                                   on_done=comment_recorder(store, JIRA_TO_TRELLO, jc_id, raw))
+            report.observe(time.perf_counter() - started)
 
-    save_state(state_file, now)
+        with metrics.phase(name, metrics.WRITE):
+            flush_outbox(outbox, trello, jira, report, workers, sync_plan)
+        if page and page[-1]['fields'].get('updated') and not sync_plan:
+            state['jira'] = page[-1]['fields']['updated']
+            save_state(state_file, state)
+
+    store.close()
+    logging.info(f'Resumo da sincronização: {report.summary()}')
+    if sync_plan:
+        logging.info('Plano concluído; nenhuma alteração foi gravada')
+        return sync_plan
+    metrics.record_run(name, report, success=True)
     logging.info('Sincronização finalizada')
+    return report
 
 if __name__ == '__main__':
-    sync()
+    profile = StartupProfile()
+    parser = argparse.ArgumentParser(description='Run the Trello-Jira sync')
+    parser.add_argument('--config-cache', default=None,
+                        help='Path of the compiled config cache (default: next to config.yaml; empty disables it)')
+    parser.add_argument('--plan', action='store_true',
+                        help='Fetch and compare without writing anything; print the planned changes and API cost as JSON')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='Log the time spent on imports, config loading and the sync itself')
+    args = parser.parse_args()
+    try:
+        with profile.step('configuração') as step:
+            config, cached = compiled_config(CONFIG_FILE, LEGACY, args.config_cache)
+            step['detail'] = 'cache' if cached else 'YAML validado'
+        profile.imports(*CLIENT_MODULES)
+        from src.core import metrics
+        if args.plan:
+            with profile.step('plano'):
+                sync_plan = sync(config, plan=True)
+            print(json.dumps(sync_plan.to_dict(), indent=2))
+        else:
+            try:
+                with profile.step('sincronização'):
+                    sync(config)
+            finally:
+                metrics.push()
+    finally:
+        if args.profile_startup:
+            profile.log()
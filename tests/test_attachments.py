@@ -0,0 +1,33 @@
+import os
+
+from src.core.attachments import AttachmentCache, pending_uploads
+
+
+class FakeIndex:
+    def __init__(self, digests):
+        self.digests = digests
+
+    def digest_for(self, url):
+        return self.digests.get(url)
+
+    def uploaded(self, issue_key, sha256):
+        return False
+
+
+def test_read_only_cache_does_not_create_directory(tmp_path):
+    directory = tmp_path / 'attachments'
+    cache = AttachmentCache(str(directory), read_only=True)
+    assert not directory.exists()
+    assert cache.path('0' * 64) is None
+
+
+def test_pending_uploads_treats_missing_directory_as_empty_cache(tmp_path):
+    cache = AttachmentCache(str(tmp_path / 'attachments'), read_only=True)
+    index = FakeIndex({'https://trello/a': 'a' * 64})
+    attachments = [
+        {'url': 'https://trello/a', 'isUpload': True, 'bytes': 10},
+        {'url': 'https://trello/b', 'isUpload': True, 'bytes': 10},
+    ]
+    pending = pending_uploads(index, cache, 'PRJ-1', attachments)
+    assert [needs_download for _, needs_download in pending] == [True, True]
+    assert not os.path.exists(cache.directory)
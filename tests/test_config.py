@@ -0,0 +1,23 @@
+import pytest
+
+from src.core.config import LEGACY, ConfigError, validate
+
+
+def legacy_config(**sync):
+    return {'trello': {'board_id': 'b'}, 'jira': {'project_key': 'P', 'customfield_trello_id': 'c'}, 'sync': sync}
+
+
+@pytest.mark.parametrize('hours', [1, 0.5, 36.25])
+def test_link_max_age_accepts_positive_numbers(hours):
+    assert validate(legacy_config(link_max_age_hours=hours), LEGACY)
+
+
+@pytest.mark.parametrize('hours', [0, -1, -0.5, True, '2'])
+def test_link_max_age_rejects_other_values(hours):
+    with pytest.raises(ConfigError, match='link_max_age_hours: esperado um número positivo'):
+        validate(legacy_config(link_max_age_hours=hours), LEGACY)
+
+
+def test_integer_options_still_reject_fractions():
+    with pytest.raises(ConfigError, match='max_concurrency: esperado um inteiro positivo'):
+        validate(legacy_config(max_concurrency=1.5), LEGACY)
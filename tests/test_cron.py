@@ -0,0 +1,83 @@
+from datetime import datetime
+
+import pytest
+
+from src.core.cron import CronSchedule
+
+# 17/10/2026 é um sábado
+SATURDAY = datetime(2026, 10, 17, 10, 7, 30)
+
+
+def next_after(expression, moment=SATURDAY):
+    return CronSchedule(expression).next_after(moment)
+
+
+def test_next_is_strictly_after_and_drops_seconds():
+    assert next_after('*/15 * * * *') == datetime(2026, 10, 17, 10, 15)
+    assert next_after('*/15 * * * *', datetime(2026, 10, 17, 10, 15)) == datetime(2026, 10, 17, 10, 30)
+    assert next_after('* * * * *') == datetime(2026, 10, 17, 10, 8)
+
+
+def test_start_with_step():
+    schedule = CronSchedule('5/20 * * * *')
+    assert schedule.minutes == {5, 25, 45}
+    assert schedule.next_after(SATURDAY) == datetime(2026, 10, 17, 10, 25)
+
+
+def test_ranges_lists_and_steps():
+    schedule = CronSchedule('0-10/5,30 8-17/3 * * *')
+    assert schedule.minutes == {0, 5, 10, 30}
+    assert schedule.hours == {8, 11, 14, 17}
+    assert schedule.next_after(SATURDAY) == datetime(2026, 10, 17, 11, 0)
+
+
+def test_weekday_seven_is_sunday():
+    assert CronSchedule('0 9 * * 7').weekdays == {0}
+    assert CronSchedule('0 9 * * 5-7').weekdays == {5, 6, 0}
+    assert next_after('0 9 * * 7') == datetime(2026, 10, 18, 9, 0)
+    assert next_after('0 9 * * 0') == datetime(2026, 10, 18, 9, 0)
+
+
+def test_day_of_month_or_weekday_when_both_restricted():
+    # Dia 20 ou segunda-feira: a segunda (19) vem antes do dia 20
+    assert next_after('0 0 20 * 1') == datetime(2026, 10, 19, 0, 0)
+    assert next_after('0 0 20 * 1', datetime(2026, 10, 19, 0, 0)) == datetime(2026, 10, 20, 0, 0)
+
+
+def test_only_one_restricted_day_field_counts():
+    assert next_after('0 0 20 * *') == datetime(2026, 10, 20, 0, 0)
+    assert next_after('0 0 * * 1') == datetime(2026, 10, 19, 0, 0)
+
+
+def test_month_and_year_rollover():
+    assert next_after('0 0 1 1 *') == datetime(2027, 1, 1, 0, 0)
+    assert next_after('30 23 31 * *') == datetime(2026, 10, 31, 23, 30)
+    assert next_after('30 23 31 * *', datetime(2026, 10, 31, 23, 30)) == datetime(2026, 12, 31, 23, 30)
+
+
+def test_leap_day_within_search_window():
+    assert next_after('0 0 29 2 *') == datetime(2028, 2, 29, 0, 0)
+
+
+def test_expression_without_future_runs():
+    with pytest.raises(ValueError, match='sem execuções futuras'):
+        next_after('0 0 30 2 *')
+
+
+@pytest.mark.parametrize('expression', ['* * * *', '* * * * * *', ''])
+def test_wrong_number_of_fields(expression):
+    with pytest.raises(ValueError, match='5 campos'):
+        CronSchedule(expression)
+
+
+@pytest.mark.parametrize('expression', ['60 * * * *', '* 24 * * *', '* * 0 * *', '* * * 13 *', '* * * * 8', '10-5 * * * *'])
+def test_values_out_of_range(expression):
+    with pytest.raises(ValueError, match='fora do intervalo'):
+        CronSchedule(expression)
+
+
+def test_invalid_step_and_values():
+    with pytest.raises(ValueError, match='Passo inválido'):
+        CronSchedule('*/0 * * * *')
+    with pytest.raises(ValueError):
+        CronSchedule('a * * * *')
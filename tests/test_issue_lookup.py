@@ -0,0 +1,14 @@
+from src.core.issue_lookup import jql_datetime
+
+
+def test_keeps_wall_clock_of_jira_offsets():
+    # A JQL lê a data no fuso do usuário, o mesmo do campo `updated`
+    assert jql_datetime('2026-10-17T10:05:30.123-0300') == '2026/10/17 10:05'
+    assert jql_datetime('2026-10-17T10:05:30.123+0530') == '2026/10/17 10:05'
+    assert jql_datetime('2026-10-17T10:05:30.123+0000') == '2026/10/17 10:05'
+    assert jql_datetime('2026-10-17T10:05:30+05:30') == '2026/10/17 10:05'
+
+
+def test_utc_without_user_zone_goes_back_by_largest_offset():
+    assert jql_datetime('2026-10-17T10:05:30.000Z') == '2026/10/16 20:05'
+    assert jql_datetime('2026-10-17T10:05:30') == '2026/10/16 20:05'
@@ -0,0 +1,40 @@
+from src.core.mentions import MentionTranslator, translator_for
+
+
+def test_whole_name_only():
+    # `@ana` não pode alterar o começo de `@anabela`
+    translator = MentionTranslator({'ana': 'ana.silva', 'anabela': 'anabela.costa'})
+    assert translator.translate('@ana e @anabela') == '@ana.silva e @anabela.costa'
+    assert translator.translate('@anab @ana-maria @ana_b') == '@anab @ana-maria @ana_b'
+    assert translator.translate('@ana.') == '@ana.silva.'
+    assert translator.translate('@ana.b') == '@ana.b'
+
+
+def test_no_chained_translation():
+    translator = MentionTranslator({'ana': 'bruno', 'bruno': 'carla'})
+    assert translator.translate('@ana @bruno') == '@bruno @carla'
+
+
+def test_email_addresses_are_left_alone():
+    translator = MentionTranslator({'ana': 'ana.silva'})
+    assert translator.translate('ana@ana.com e x@ana') == 'ana@ana.com e x@ana'
+    assert translator.translate('@@ana') == '@@ana'
+
+
+def test_empty_mapping_and_text():
+    assert MentionTranslator({}).translate('@ana') == '@ana'
+    assert MentionTranslator({'ana': 'bia'}).translate('') == ''
+    assert MentionTranslator({'ana': 'bia'}).translate(None) is None
+
+
+def test_inverse_is_created_once():
+    translator = MentionTranslator({'ana': 'ana.silva'})
+    assert translator.inverse is translator.inverse
+    assert translator.inverse.inverse is translator
+    assert translator.inverse.translate('@ana.silva') == '@ana'
+
+
+def test_translator_for_reuses_same_mapping():
+    assert translator_for({'a': 'b', 'c': 'd'}) is translator_for({'c': 'd', 'a': 'b'})
+    assert translator_for(None) is translator_for({})
+    assert translator_for({'a': 'b'}) is not translator_for({'a': 'c'})
@@ -0,0 +1,76 @@
+import pytest
+
+from src.core import rate_limit
+from src.core.rate_limit import RetryPolicy, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit.time, 'monotonic', clock)
+    return clock
+
+
+def test_burst_then_rate(clock):
+    bucket = TokenBucket(10, 10)
+    waits = [bucket.reserve() for _ in range(12)]
+    assert waits[:10] == [0.0] * 10
+    assert waits[10:] == pytest.approx([0.1, 0.2])
+
+
+def test_queue_after_pause_leaves_at_rate(clock):
+    bucket = TokenBucket(10, 10)
+    bucket.pause(10)
+    waits = [bucket.reserve() for _ in range(50)]
+    # Nada de rajada no fim da pausa: uma requisição a cada 1/rate segundos
+    assert waits == pytest.approx([10 + (i + 1) / 10 for i in range(50)])
+
+
+def test_refill_starts_when_pause_ends(clock):
+    bucket = TokenBucket(10, 10)
+    bucket.pause(10)
+    clock.now += 10.5
+    assert bucket.reserve() == 0.0
+    waits = [bucket.reserve() for _ in range(5)]
+    assert waits == pytest.approx([0.0, 0.0, 0.0, 0.0, 0.1])
+
+
+def test_pause_keeps_outstanding_reservations(clock):
+    bucket = TokenBucket(10, 1)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(0.1)
+    bucket.pause(5)
+    assert bucket.reserve() == pytest.approx(5.2)
+
+
+@pytest.mark.parametrize('method', ['GET', 'PUT', 'get'])
+@pytest.mark.parametrize('status', [429, 502, 503, 504])
+def test_idempotent_methods_retry_every_retry_status(method, status):
+    assert RetryPolicy().should_retry(method, status, 0, {})
+
+
+@pytest.mark.parametrize('status', [502, 504])
+def test_post_does_not_retry_gateway_errors(status):
+    # A escrita pode ter sido feita antes de o gateway desistir
+    assert not RetryPolicy().should_retry('POST', status, 0, {'Retry-After': '1'})
+
+
+def test_post_retries_only_when_nothing_was_written():
+    policy = RetryPolicy()
+    assert policy.should_retry('POST', 429, 0, {})
+    assert policy.should_retry('POST', 503, 0, {'Retry-After': '2'})
+    assert not policy.should_retry('POST', 503, 0, {})
+
+
+def test_no_retry_past_max_retries_or_for_other_statuses():
+    policy = RetryPolicy(max_retries=2)
+    assert not policy.should_retry('GET', 503, 2, {})
+    assert not policy.should_retry('GET', 500, 0, {})
@@ -0,0 +1,68 @@
+import asyncio
+import os
+import sys
+
+import pytest
+from aiohttp import web
+
+# O servidor de webhooks importa o motor assíncrono como `core.*`, e o
+# servidor falso dos benchmarks importa `dataset`
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'src'), os.path.join(ROOT, 'benchmarks')]
+
+from dataset import BOARD_ID, CUSTOMFIELD, PROJECT_KEY  # noqa: E402
+from fake_api import FakeApi  # noqa: E402
+from workers.webhook_server import WebhookServer  # noqa: E402
+from core.webhooks import CARD  # noqa: E402
+
+
+def connection(base_url, state_db):
+    return {
+        'name': 'test',
+        'trello': {'board_id': 'TEST_TRELLO_BOARD', 'api_key': 'TEST_TRELLO_KEY', 'token': 'TEST_TRELLO_TOKEN',
+                   'api_url': f'{base_url}/1'},
+        'jira': {'project_key': 'TEST_JIRA_PROJECT', 'host': 'TEST_JIRA_URL', 'user': 'TEST_JIRA_USER',
+                 'api_token': 'TEST_JIRA_TOKEN', 'customfield_trello_id': CUSTOMFIELD},
+        'sync': {'fields': ['title', 'description', 'comments'], 'state_db': state_db},
+    }
+
+
+@pytest.fixture
+def environment(monkeypatch):
+    for name, value in {
+        'TEST_TRELLO_BOARD': BOARD_ID, 'TEST_TRELLO_KEY': 'key', 'TEST_TRELLO_TOKEN': 'token',
+        'TEST_JIRA_USER': 'user@example.com', 'TEST_JIRA_TOKEN': 'token', 'TEST_JIRA_PROJECT': PROJECT_KEY,
+    }.items():
+        monkeypatch.setenv(name, value)
+    return monkeypatch
+
+
+async def sweep_and_webhook(environment, state_db, webhook_first):
+    # Latência para que as duas buscas de vínculo aconteçam antes de qualquer criação
+    api = FakeApi(cards=1, comments=2, latency=0.05)
+    runner = web.AppRunner(api.app())
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    environment.setenv('TEST_JIRA_URL', f'http://{host}:{port}')
+
+    server = WebhookServer([connection(f'http://{host}:{port}', state_db)], debounce=0, reconcile=False)
+    await server.on_startup(None)
+    try:
+        card_id = api.card_ids[0]
+        runs = [server.sweep(0), server.handle_item((0, CARD, card_id))]
+        await asyncio.gather(*(reversed(runs) if webhook_first else runs))
+        # Um item adiado pela varredura volta à fila quando ela termina
+        await server.queue.drain()
+    finally:
+        await server.on_cleanup(None)
+        await runner.cleanup()
+    return [issue for issue in api.issues.values() if issue['fields'].get(CUSTOMFIELD) == card_id]
+
+
+@pytest.mark.parametrize('webhook_first', [False, True])
+def test_sweep_and_webhook_create_one_issue(environment, tmp_path, webhook_first):
+    issues = asyncio.run(sweep_and_webhook(environment, str(tmp_path / 'state.db'), webhook_first))
+    assert len(issues) == 1
+    assert len(issues[0]['comments']) == 2
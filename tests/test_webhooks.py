@@ -0,0 +1,114 @@
+import asyncio
+
+from src.core.webhooks import DebouncedQueue, SweepGate
+
+
+class Recorder:
+    """
+    Handler que registra as chamadas e, opcionalmente, espera um evento.
+    """
+    def __init__(self):
+        self.calls = []
+        self.running = 0
+        self.overlapped = False
+        self.release = None
+
+    async def __call__(self, key):
+        self.running += 1
+        self.overlapped = self.overlapped or self.running > 1
+        self.calls.append(key)
+        if self.release is not None:
+            await self.release.wait()
+        self.running -= 1
+
+
+def run(scenario):
+    return asyncio.run(scenario())
+
+
+def test_burst_on_one_item_becomes_one_call():
+    async def scenario():
+        handler = Recorder()
+        queue = DebouncedQueue(handler, delay=0.02)
+        queue.start()
+        for _ in range(5):
+            queue.push('card-1')
+            await asyncio.sleep(0.005)
+        queue.push('card-2')
+        await queue.drain()
+        await queue.stop()
+        return handler.calls
+
+    assert sorted(run(scenario)) == ['card-1', 'card-2']
+
+
+def test_event_during_run_reruns_item_after_it():
+    async def scenario():
+        handler = Recorder()
+        handler.release = asyncio.Event()
+        queue = DebouncedQueue(handler, delay=0.01)
+        queue.start()
+        queue.push('card-1')
+        while not handler.calls:
+            await asyncio.sleep(0.005)
+        # Chega enquanto o item roda: não roda em paralelo, mas roda de novo depois
+        queue.push('card-1')
+        queue.push('card-1')
+        await asyncio.sleep(0.03)
+        handler.release.set()
+        await queue.drain()
+        await queue.stop()
+        return handler
+
+    handler = run(scenario)
+    assert handler.calls == ['card-1', 'card-1']
+    assert not handler.overlapped
+
+
+def test_failing_handler_does_not_stop_the_queue():
+    async def scenario():
+        calls = []
+
+        async def handler(key):
+            calls.append(key)
+            if key == 'bad':
+                raise RuntimeError('falha')
+
+        queue = DebouncedQueue(handler, delay=0, workers=1)
+        queue.start()
+        queue.push('bad')
+        await queue.drain()
+        queue.push('good')
+        await queue.drain()
+        await queue.stop()
+        return calls
+
+    assert run(scenario) == ['bad', 'good']
+
+
+def test_sweep_waits_for_running_items_and_defers_new_ones():
+    async def scenario():
+        resumed = []
+        gate = SweepGate(resumed.append)
+        assert gate.enter('card-1')
+        order = []
+
+        async def sweep():
+            async with gate.sweep():
+                order.append('sweep')
+                # Itens que chegam durante a varredura são adiados, uma vez cada
+                assert not gate.enter('card-2')
+                assert not gate.enter('card-2')
+                assert resumed == []
+
+        task = asyncio.create_task(sweep())
+        await asyncio.sleep(0.01)
+        assert order == []
+        order.append('card-1')
+        gate.leave()
+        await task
+        assert gate.enter('card-3')
+        gate.leave()
+        return order, resumed
+
+    assert run(scenario) == (['card-1', 'sweep'], ['card-2'])
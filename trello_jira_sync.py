@@ -1,57 +1,174 @@
 import os
+import uuid
 import requests
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.core import metrics
+from src.core.card_fetch import (DEFAULT_CARD_PAGE_SIZE, card_page_params, card_sources, next_before, resume_points,
+                                 sorted_page)
+from src.core.issue_lookup import DEFAULT_BATCH_SIZE, build_lookup_jql, chunked, index_by_card
+from src.core.pagination import DEFAULT_PAGE_SIZE, next_cursor, page_params
+from src.core.rate_limit import bucket_for, retry_policy
+from src.core.subtasks import (BULK_CREATE_LIMIT, DEFAULT_SUBTASK_CONCURRENCY, SUBTASK_ISSUE_TYPE, bulk_created_keys,
+                               bulk_payload, subtask_fields)
+
+
+def send_request(api, session, bucket, retry, method, url, **kwargs):
+    attempt = 0
+    while True:
+        # Corpos lidos de arquivo são consumidos no envio; volta ao início a cada tentativa
+        if attempt and hasattr(kwargs.get('data'), 'seek'):
+            kwargs['data'].seek(0)
+        metrics.observe_rate_limit_wait(api, bucket.acquire_blocking())
+        timer = metrics.RequestTimer(api, method, url)
+        try:
+            resp = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            timer.done('error')
+            raise
+        timer.done(resp.status_code)
+        bucket.observe(resp.headers)
+        if retry.should_retry(method, resp.status_code, attempt, resp.headers):
+            delay = retry.delay(attempt, resp.headers)
+            logging.warning(f'{url} respondeu {resp.status_code}, nova tentativa em {delay:.1f}s')
+            resp.close()
+            bucket.pause(delay)
+            attempt += 1
+            continue
+        resp.raise_for_status()
+        return resp
+
+
+class MultipartFile:
+    # Corpo multipart/form-data com um único arquivo, lido do disco aos
+    # poucos durante o envio (o requests monta `files=` inteiro na memória)
+    def __init__(self, path, filename, content_type, field='file'):
+        self.boundary = uuid.uuid4().hex
+        filename = filename.replace('"', '%22')
+        self.head = (
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'
+        ).encode()
+        self.tail = f'\r\n--{self.boundary}--\r\n'.encode()
+        self.size = len(self.head) + os.path.getsize(path) + len(self.tail)
+        self.file = open(path, 'rb')
+        self.position = 0
+
+    @property
+    def content_type(self):
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self):
+        return self.size
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=0):
+        if (offset, whence) != (0, 0):
+            raise ValueError('MultipartFile só volta ao início')
+        self.file.seek(0)
+        self.position = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self.position
+        file_end = self.size - len(self.tail)
+        chunks = []
+        while size > 0 and self.position < self.size:
+            if self.position < len(self.head):
+                chunk = self.head[self.position:self.position + size]
+            elif self.position < file_end:
+                chunk = self.file.read(min(size, file_end - self.position))
+            else:
+                start = self.position - file_end
+                chunk = self.tail[start:start + size]
+            if not chunk:
+                raise IOError('Arquivo do anexo mudou durante o envio')
+            chunks.append(chunk)
+            self.position += len(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
 
 
 class TrelloClient:
-    def __init__(self, key=None, token=None):
+    def __init__(self, key=None, token=None, rate_limit=None, base_url=None):
         self.key = key or os.getenv('TRELLO_KEY')
         self.token = token or os.getenv('TRELLO_TOKEN')
-        self.base_url = 'https://api.trello.com/1'
+        self.base_url = (base_url or 'https://api.trello.com/1').rstrip('/')
         if not self.key or not self.token:
             raise ValueError('Trello key/token não definidos nas variáveis de ambiente')
+        self.session = requests.Session()
+        self.bucket = bucket_for('trello', self.token, rate_limit)
+        self.retry = retry_policy(rate_limit)
 
-    def get_cards(self, board_id, since=None):
-        params = {'key': self.key, 'token': self.token}
-        if since:
-            params['since'] = since
-        resp = requests.get(f'{self.base_url}/boards/{board_id}/cards', params=params)
-        resp.raise_for_status()
-        return resp.json()
+    def _request(self, method, path, **kwargs):
+        return send_request('trello', self.session, self.bucket, self.retry, method, f'{self.base_url}{path}', **kwargs)
+
+    def iter_card_pages(self, board_id, since, sync_fields=None, list_ids=None, position=None,
+                        page_size=DEFAULT_CARD_PAGE_SIZE):
+        # Páginas (fonte, cards) do card mais novo para o mais antigo, por
+        # lista configurada ou pelo board; a próxima página é buscada em
+        # segundo plano enquanto a atual é processada
+        def fetch(source, before):
+            params = {'key': self.key, 'token': self.token, **card_page_params(since, sync_fields, page_size, before)}
+            return sorted_page(self._request('GET', f'/{source}', params=params).json())
+
+        with ThreadPoolExecutor(max_workers=1) as prefetch:
+            for source, before in resume_points(card_sources(board_id, list_ids), position):
+                pending = prefetch.submit(fetch, source, before)
+                while pending is not None:
+                    page = pending.result()
+                    before = next_before(page, page_size)
+                    pending = prefetch.submit(fetch, source, before) if before is not None else None
+                    if page:
+                        yield source, page
 
     def update_card(self, card_id, data):
         params = {'key': self.key, 'token': self.token}
-        resp = requests.put(f'{self.base_url}/cards/{card_id}', params=params, json=data)
-        resp.raise_for_status()
+        resp = self._request('PUT', f'/cards/{card_id}', params=params, json=data)
         return resp.json()
 
     def get_checklists(self, card_id):
         params = {'key': self.key, 'token': self.token}
-        resp = requests.get(f'{self.base_url}/cards/{card_id}/checklists', params=params)
-        resp.raise_for_status()
+        resp = self._request('GET', f'/cards/{card_id}/checklists', params=params)
         return resp.json()
 
     def get_comments(self, card_id):
         params = {'key': self.key, 'token': self.token, 'filter': 'commentCard'}
-        resp = requests.get(f'{self.base_url}/cards/{card_id}/actions', params=params)
-        resp.raise_for_status()
+        resp = self._request('GET', f'/cards/{card_id}/actions', params=params)
         return resp.json()
 
     def add_comment(self, card_id, text):
         params = {'key': self.key, 'token': self.token, 'text': text}
-        resp = requests.post(f'{self.base_url}/cards/{card_id}/actions/comments', params=params)
-        resp.raise_for_status()
+        resp = self._request('POST', f'/cards/{card_id}/actions/comments', params=params)
         return resp.json()
 
     def get_attachments(self, card_id):
         params = {'key': self.key, 'token': self.token}
-        resp = requests.get(f'{self.base_url}/cards/{card_id}/attachments', params=params)
-        resp.raise_for_status()
+        resp = self._request('GET', f'/cards/{card_id}/attachments', params=params)
         return resp.json()
 
+    def iter_attachment(self, url, chunk_size):
+        # Downloads de anexos exigem a autenticação no cabeçalho, não na query
+        headers = {'Authorization': f'OAuth oauth_consumer_key="{self.key}", oauth_token="{self.token}"'}
+        with send_request('trello', self.session, self.bucket, self.retry, 'GET', url,
+                          headers=headers, stream=True) as resp:
+            yield from resp.iter_content(chunk_size)
+
 
 class JiraClient:
-    def __init__(self, url=None, user=None, api_token=None):
+    def __init__(self, url=None, user=None, api_token=None, rate_limit=None):
         self.url = url or os.getenv('JIRA_URL')
         self.user = user or os.getenv('JIRA_USER')
         self.api_token = api_token or os.getenv('JIRA_API_TOKEN')
@@ -60,11 +177,41 @@ class JiraClient:
         self.session = requests.Session()
         self.session.auth = (self.user, self.api_token)
         self.headers = {'Content-Type': 'application/json'}
+        self.bucket = bucket_for('jira', f'{self.url}|{self.user}', rate_limit)
+        self.retry = retry_policy(rate_limit)
 
-    def search_issues(self, jql):
-        resp = self.session.get(f'{self.url}/rest/api/2/search', params={'jql': jql})
-        resp.raise_for_status()
-        return resp.json().get('issues', [])
+    def _request(self, method, path, **kwargs):
+        return send_request('jira', self.session, self.bucket, self.retry, method, f'{self.url}{path}', **kwargs)
+
+    def search_issues(self, jql, fields=None, max_results=DEFAULT_PAGE_SIZE):
+        issues = []
+        for page in self.iter_issue_pages(jql, fields=fields, page_size=max_results):
+            issues.extend(page)
+        return issues
+
+    def iter_issue_pages(self, jql, fields=None, page_size=DEFAULT_PAGE_SIZE):
+        # A próxima página é buscada em segundo plano enquanto a atual é processada
+        def fetch(cursor):
+            return self._request('GET', '/rest/api/2/search', params=page_params(jql, fields, page_size, cursor)).json()
+
+        cursor = {'startAt': 0}
+        with ThreadPoolExecutor(max_workers=1) as prefetch:
+            pending = prefetch.submit(fetch, cursor)
+            while pending is not None:
+                data = pending.result()
+                cursor = next_cursor(data, cursor)
+                pending = prefetch.submit(fetch, cursor) if cursor is not None else None
+                issues = data.get('issues', [])
+                if issues:
+                    yield issues
+
+    def find_issues_by_trello_ids(self, project_key, customfield, card_ids, batch_size=DEFAULT_BATCH_SIZE):
+        found = {}
+        for batch in chunked(card_ids, batch_size):
+            jql = build_lookup_jql(project_key, customfield, batch)
+            issues = self.search_issues(jql, fields=[customfield], max_results=batch_size)
+            found.update(index_by_card(issues, customfield))
+        return found
 
     def create_issue(self, project_key, summary, description, issue_type='Task', duedate=None, custom_fields=None):
         payload = {'fields': {
@@ -77,36 +224,74 @@ class JiraClient:
             payload['fields']['duedate'] = duedate
         if custom_fields:
             payload['fields'].update(custom_fields)
-        resp = self.session.post(f'{self.url}/rest/api/2/issue', json=payload, headers=self.headers)
-        resp.raise_for_status()
+        resp = self._request('POST', '/rest/api/2/issue', json=payload, headers=self.headers)
         return resp.json()
 
     def update_issue(self, issue_key, fields):
         payload = {'fields': fields}
-        resp = self.session.put(f'{self.url}/rest/api/2/issue/{issue_key}', json=payload, headers=self.headers)
-        resp.raise_for_status()
-        return resp.json()
+        resp = self._request('PUT', f'/rest/api/2/issue/{issue_key}', json=payload, headers=self.headers)
+        # Jira responde 204 sem corpo
+        return resp.json() if resp.content else {}
 
     def add_comment(self, issue_key, body):
-        resp = self.session.post(f'{self.url}/rest/api/2/issue/{issue_key}/comment', json={'body': body}, headers=self.headers)
-        resp.raise_for_status()
+        resp = self._request('POST', f'/rest/api/2/issue/{issue_key}/comment', json={'body': body}, headers=self.headers)
         return resp.json()
 
     def get_comments(self, issue_key):
-        resp = self.session.get(f'{self.url}/rest/api/2/issue/{issue_key}/comment')
-        resp.raise_for_status()
+        resp = self._request('GET', f'/rest/api/2/issue/{issue_key}/comment')
         return resp.json().get('comments', [])
 
-    def create_subtask(self, parent_key, summary, description='', duedate=None, issue_type='Sub-task'):
-        payload = {'fields': {
-            'project': {'key': parent_key.split('-')[0]},
-            'parent': {'key': parent_key},
-            'summary': summary,
-            'description': description,
-            'issuetype': {'name': issue_type},
-        }}
-        if duedate:
-            payload['fields']['duedate'] = duedate
-        resp = self.session.post(f'{self.url}/rest/api/2/issue', json=payload, headers=self.headers)
-        resp.raise_for_status()
+    def create_subtask(self, parent_key, summary, description='', duedate=None, issue_type=SUBTASK_ISSUE_TYPE):
+        payload = {'fields': subtask_fields(parent_key, summary, description, duedate, issue_type)}
+        resp = self._request('POST', '/rest/api/2/issue', json=payload, headers=self.headers)
+        return resp.json()
+
+    def create_subtasks(self, parent_key, summaries, duedate=None, issue_type=SUBTASK_ISSUE_TYPE,
+                        concurrency=DEFAULT_SUBTASK_CONCURRENCY, on_created=None):
+        # Criação em lote (até 50 por requisição); o que o lote não criar é
+        # criado uma a uma, em paralelo. on_created recebe (índice, chave) a
+        # cada lote e a cada criação avulsa, para que uma falha adiante não
+        # perca o que já foi criado
+        keys = []
+        for batch in chunked(summaries, BULK_CREATE_LIMIT):
+            offset = len(keys)
+            fields = [subtask_fields(parent_key, summary, duedate=duedate, issue_type=issue_type) for summary in batch]
+            try:
+                resp = self._request('POST', '/rest/api/2/issue/bulk', json=bulk_payload(fields), headers=self.headers)
+                batch_keys = bulk_created_keys(len(batch), resp.json())
+            except requests.HTTPError as e:
+                logging.warning(f'Criação em lote recusada ({e.response.status_code}), criando subtarefas uma a uma')
+                batch_keys = [None] * len(batch)
+            if on_created:
+                on_created([(offset + index, key) for index, key in enumerate(batch_keys) if key is not None])
+            missing = [index for index, key in enumerate(batch_keys) if key is None]
+            if missing:
+                def create_one(index):
+                    return self.create_subtask(parent_key, batch[index], duedate=duedate, issue_type=issue_type)['key']
+
+                error = None
+                with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                    futures = {pool.submit(create_one, index): index for index in missing}
+                    for future in as_completed(futures):
+                        try:
+                            key = future.result()
+                        except Exception as e:
+                            error = error or e
+                            continue
+                        batch_keys[futures[future]] = key
+                        if on_created:
+                            on_created([(offset + futures[future], key)])
+                if error:
+                    raise error
+            keys.extend(batch_keys)
+        return keys
+
+    def add_attachment(self, issue_key, path, filename, content_type):
+        with MultipartFile(path, filename, content_type) as body:
+            headers = {'Content-Type': body.content_type, 'X-Atlassian-Token': 'no-check'}
+            resp = self._request('POST', f'/rest/api/2/issue/{issue_key}/attachments', data=body, headers=headers)
         return resp.json()
+
+    def get_subtasks(self, issue_key):
+        resp = self._request('GET', f'/rest/api/2/issue/{issue_key}', params={'fields': 'subtasks'})
+        return resp.json().get('fields', {}).get('subtasks', [])